@@ -0,0 +1,281 @@
+"""Asyncio Allegro REST API client built on aiohttp."""
+
+import asyncio
+from contextlib import aclosing
+from datetime import datetime
+from types import TracebackType
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, TypeVar
+
+import aiohttp
+
+from allegro_api.api import (
+    POOL_SIZE,
+    TIMEOUT,
+    AllegroEndpoints,
+    ApiWrapperBase,
+    RawResponse,
+    RequestObserver,
+    RetryPolicy,
+    complete_payments,
+    is_last_page,
+    page_batch,
+)
+from allegro_api.cache import ResponseCache
+from allegro_api.const import (
+    ALLEGRO_API_URL,
+    ORDERS_FETCH_CONCURRENCY,
+    ORDERS_PAGE_SIZE,
+)
+from allegro_api.get_order_result import GetOrdersResult, Order, Payment
+from allegro_api.get_user_info import GetUserInfoResult
+
+# Requests in flight per wrapper; further requests wait for a free slot
+CONCURRENCY = POOL_SIZE
+
+_T = TypeVar("_T")
+
+
+class AsyncApiWrapper(ApiWrapperBase):
+    """Asyncio HTTP request helper with pooled connections, retries and tracing.
+
+    Retry, caching and tracing behave as in :class:`~allegro_api.api.ApiWrapper`.
+    The aiohttp session is created on first use, inside the running event loop,
+    unless one is passed in; only a session created here is closed by
+    :meth:`close`.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        session: aiohttp.ClientSession | None = None,
+        *,
+        retry: RetryPolicy | None = None,
+        timeout: tuple[float, float] = TIMEOUT,
+        pool_size: int = POOL_SIZE,
+        concurrency: int = CONCURRENCY,
+        observer: RequestObserver | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        """Limit the wrapper to ``concurrency`` requests in flight."""
+        super().__init__(retry, observer, cache)
+        self._session = session
+        self._owns_session = session is None
+        self._timeout = aiohttp.ClientTimeout(
+            sock_connect=timeout[0], sock_read=timeout[1]
+        )
+        self._pool_size = pool_size
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the session, creating a pooled one on first use."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self._pool_size),
+                timeout=self._timeout,
+                headers={"Connection": "keep-alive"},
+            )
+        return self._session
+
+    async def get(
+        self, url: str, headers: dict[str, str] | None = None, auth: Any | None = None
+    ) -> Any:
+        """Run HTTP GET request."""
+        return await self.request("GET", url, headers=headers, auth=auth)
+
+    async def post(
+        self,
+        url: str,
+        data: Any | None = None,
+        headers: dict[str, str] | None = None,
+        auth: Any | None = None,
+    ) -> Any:
+        """Run HTTP POST request."""
+        return await self.request("POST", url, data=data, headers=headers, auth=auth)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        **request_kwargs: Any,
+    ) -> Any:
+        """Execute HTTP request, retrying transient failures, and return JSON."""
+        prepared, cached = await self._offload(
+            self._prepare, method, url, request_kwargs.pop("headers", None)
+        )
+        if prepared.hit:
+            return cached
+        session = self._get_session()
+        attempt = 0
+        while True:
+            try:
+                async with (
+                    self._slots,
+                    session.request(
+                        method, url, headers=prepared.headers, **request_kwargs
+                    ) as response,
+                ):
+                    delay, result = await self._offload(
+                        self._handle_response,
+                        prepared,
+                        attempt,
+                        RawResponse(
+                            response.status,
+                            response.headers,
+                            await response.read(),
+                            response.raise_for_status,
+                        ),
+                    )
+                    if delay is None:
+                        return result
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                delay = self._error_delay(
+                    prepared, attempt, exc, isinstance(exc, asyncio.TimeoutError)
+                )
+                if delay is None:
+                    raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _offload(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Call ``func``, in a worker thread if it may use the SQLite cache.
+
+        Cache lookups and writes block, so they are kept off the event loop.
+        """
+        if self._cache is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    async def close(self) -> None:
+        """Close the session if it was created by the wrapper."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "AsyncApiWrapper":
+        """Return the wrapper, closed on exit."""
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Close the session."""
+        await self.close()
+
+
+class AsyncAllegroApiClient(AllegroEndpoints):
+    """Asyncio counterpart of :class:`~allegro_api.api.AllegroApiClient`."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        cookie: str,
+        session: aiohttp.ClientSession | None = None,
+        *,
+        retry: RetryPolicy | None = None,
+        observer: RequestObserver | None = None,
+        base_url: str = ALLEGRO_API_URL,
+        cache: ResponseCache | None = None,
+        pool_size: int = POOL_SIZE,
+        concurrency: int = CONCURRENCY,
+    ) -> None:
+        """Create client on ``session`` or on a pooled session of its own."""
+        super().__init__(cookie, base_url)
+        self._api_wrapper = AsyncApiWrapper(
+            session,
+            retry=retry,
+            pool_size=pool_size,
+            concurrency=concurrency,
+            observer=observer,
+            cache=cache,
+        )
+
+    async def get_orders(
+        self, offset: int = 0, limit: int = ORDERS_PAGE_SIZE
+    ) -> GetOrdersResult:
+        """Get a single page of orders from API."""
+        get_orders_response = await self._api_wrapper.get(
+            self.orders_url(offset, limit), headers=self.get_standard_header(3)
+        )
+        return GetOrdersResult(get_orders_response)
+
+    async def iter_order_pages(
+        self,
+        since: datetime | None = None,
+        max_pages: int | None = None,
+        page_size: int = ORDERS_PAGE_SIZE,
+        concurrency: int = ORDERS_FETCH_CONCURRENCY,
+    ) -> AsyncGenerator[GetOrdersResult, None]:
+        """Yield order pages, newest first, fetching up to ``concurrency`` at once.
+
+        Stops like :meth:`AllegroApiClient.iter_order_pages`; requests of
+        pages past the last one are cancelled. Wrap the iterator in
+        :func:`contextlib.aclosing` when leaving the loop early, so pending
+        requests are cancelled before the client is closed.
+        """
+        fetched = 0
+        while max_pages is None or fetched < max_pages:
+            batch = page_batch(fetched, max_pages, concurrency)
+            tasks = [
+                asyncio.ensure_future(
+                    self.get_orders((fetched + i) * page_size, page_size)
+                )
+                for i in range(batch)
+            ]
+            fetched += batch
+            try:
+                for task in tasks:
+                    page = await task
+                    yield page
+                    if is_last_page(page, page_size, since):
+                        return
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def iter_orders(self, **page_kwargs: Any) -> AsyncIterator[Order]:
+        """Yield orders page by page, see :meth:`iter_order_pages`."""
+        async with aclosing(self.iter_order_pages(**page_kwargs)) as pages:
+            async for page in pages:
+                for order in page.orders:
+                    yield order
+
+    async def iter_payments(self, **page_kwargs: Any) -> AsyncIterator[Payment]:
+        """Yield payments page by page, see :meth:`iter_order_pages`.
+
+        Orders of the payment closing a page are held back until the next
+        page, so a payment split across a page boundary is yielded whole.
+        """
+        pending: list[Order] = []
+        async with aclosing(self.iter_order_pages(**page_kwargs)) as pages:
+            async for page in pages:
+                payments, pending = complete_payments(pending, page.orders)
+                for payment in payments:
+                    yield payment
+        for payment in Payment.from_orders(pending) if pending else []:
+            yield payment
+
+    async def get_user_info(self) -> GetUserInfoResult:
+        """Get info about current user."""
+        get_user_response = await self._api_wrapper.get(
+            self.users_url(), headers=self.get_standard_header(2)
+        )
+        return GetUserInfoResult(get_user_response)
+
+    async def close(self) -> None:
+        """Close the session if it was created by the client."""
+        await self._api_wrapper.close()
+
+    async def __aenter__(self) -> "AsyncAllegroApiClient":
+        """Return the client, closed on exit."""
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Close the session."""
+        await self.close()
@@ -1,27 +1,109 @@
 """Allegro REST API helper module."""
 
 import logging
-from typing import Any
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Iterator, Mapping
 
 import requests  # type: ignore[import-untyped]
+from requests.adapters import HTTPAdapter  # type: ignore[import-untyped]
 
-from allegro_api.const import ALLEGRO_API_URL
-from allegro_api.get_order_result import GetOrdersResult
+from allegro_api.cache import CacheEntry, ResponseCache
+from allegro_api.const import (
+    ALLEGRO_API_URL,
+    ORDERS_FETCH_CONCURRENCY,
+    ORDERS_PAGE_SIZE,
+)
+from allegro_api.fastjson import loads
+from allegro_api.get_order_result import GetOrdersResult, Order, Payment
 from allegro_api.get_user_info import GetUserInfoResult
 
-TIMEOUT = 10
+# Connect and read timeouts in seconds
+TIMEOUT = (5.0, 10.0)
+
+# Connections kept alive per host, enough for concurrent order page fetches
+POOL_SIZE = 10
 
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 
-class AllegroApiClient:
-    """Simplified Allegro API client."""
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retry settings for :class:`ApiWrapper` requests."""
 
-    def __init__(self, cookie: str, session: requests.Session) -> None:
-        """Create client bound to existing :class:`requests.Session`."""
+    total: int = 3
+    backoff_factor: float = 0.5
+    max_backoff: float = 60.0
+    max_retry_after: float = 300.0
+    honor_retry_after: bool = True
+    status_forcelist: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+    allowed_methods: frozenset[str] = frozenset(
+        {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+    )
+
+    def backoff(self, attempt: int, retry_after: str | None = None) -> float | None:
+        """Return seconds to wait before retry number ``attempt + 1``.
+
+        Uses exponential backoff with full jitter, capped at ``max_backoff``,
+        but never less than the server's ``Retry-After`` value. Returns
+        ``None`` when ``Retry-After`` exceeds ``max_retry_after``, as retrying
+        earlier than requested would be refused again.
+        """
+        delay = min(
+            random.uniform(0, self.backoff_factor * (2**attempt)), self.max_backoff
+        )
+        requested = _parse_retry_after(retry_after)
+        if requested is None or not self.honor_retry_after:
+            return delay
+        if requested > self.max_retry_after:
+            return None
+        return max(delay, requested)
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """Return the delay in seconds encoded in a ``Retry-After`` header."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+
+
+@dataclass(frozen=True)
+class RequestTrace:
+    """Outcome of a single :class:`ApiWrapper` request, including retries."""
+
+    method: str
+    url: str
+    status: int | None
+    latency: float
+    retries: int
+    size: int
+    # "hit", "revalidated" or "miss" for requests of a cached ApiWrapper
+    cache: str | None = None
+
+
+RequestObserver = Callable[[RequestTrace], None]
+
+
+class AllegroEndpoints:
+    """URLs and headers of the Allegro endpoints shared by the API clients."""
+
+    def __init__(self, cookie: str, base_url: str = ALLEGRO_API_URL) -> None:
+        """Store the session cookie and API base URL."""
         self._cookie = cookie
-        self._api_wrapper = ApiWrapper(session)
+        self._base_url = base_url.rstrip("/")
 
     def get_standard_header(self, api_ver: int = 1) -> dict[str, str]:
         """Return standard request header."""
@@ -31,30 +113,371 @@ class AllegroApiClient:
             "Referer": "https://allegro.pl/",
         }
 
-    def get_orders(self) -> GetOrdersResult:
-        """Get orders from API."""
-        headers = self.get_standard_header(3)
+    def orders_url(self, offset: int = 0, limit: int = ORDERS_PAGE_SIZE) -> str:
+        """Return the URL of a page of orders."""
+        return f"{self._base_url}/myorder-api/myorders?limit={limit}&offset={offset}"
+
+    def users_url(self) -> str:
+        """Return the URL of the current user's info."""
+        return f"{self._base_url}/users"
+
+
+class AllegroApiClient(AllegroEndpoints):
+    """Simplified Allegro API client."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        cookie: str,
+        session: requests.Session,
+        *,
+        retry: RetryPolicy | None = None,
+        observer: RequestObserver | None = None,
+        base_url: str = ALLEGRO_API_URL,
+        cache: ResponseCache | None = None,
+        pool_size: int = POOL_SIZE,
+    ) -> None:
+        """Create client bound to existing :class:`requests.Session`."""
+        super().__init__(cookie, base_url)
+        self._api_wrapper = ApiWrapper(
+            session, retry=retry, pool_size=pool_size, observer=observer, cache=cache
+        )
+
+    def get_orders(
+        self, offset: int = 0, limit: int = ORDERS_PAGE_SIZE
+    ) -> GetOrdersResult:
+        """Get a single page of orders from API."""
         get_orders_response = self._api_wrapper.get(
-            f"{ALLEGRO_API_URL}/myorder-api/myorders?limit=25",
-            headers=headers,
+            self.orders_url(offset, limit), headers=self.get_standard_header(3)
         )
         return GetOrdersResult(get_orders_response)
 
+    def iter_order_pages(
+        self,
+        since: datetime | None = None,
+        max_pages: int | None = None,
+        page_size: int = ORDERS_PAGE_SIZE,
+        concurrency: int = ORDERS_FETCH_CONCURRENCY,
+    ) -> Iterator[GetOrdersResult]:
+        """Yield order pages, newest first, fetching up to ``concurrency`` at once.
+
+        Iteration stops after the first page reaching orders older than
+        ``since``, after ``max_pages`` pages or when the history is exhausted.
+        """
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            while max_pages is None or fetched < max_pages:
+                batch = page_batch(fetched, max_pages, concurrency)
+                futures = [
+                    executor.submit(
+                        self.get_orders, (fetched + i) * page_size, page_size
+                    )
+                    for i in range(batch)
+                ]
+                fetched += batch
+                for future in futures:
+                    page = future.result()
+                    yield page
+                    if is_last_page(page, page_size, since):
+                        for pending in futures:
+                            pending.cancel()
+                        return
+
+    def iter_orders(self, **page_kwargs: Any) -> Iterator[Order]:
+        """Yield orders page by page, see :meth:`iter_order_pages`."""
+        for page in self.iter_order_pages(**page_kwargs):
+            yield from page.orders
+
+    def iter_payments(self, **page_kwargs: Any) -> Iterator[Payment]:
+        """Yield payments page by page, see :meth:`iter_order_pages`.
+
+        Orders of the payment closing a page are held back until the next
+        page, so a payment split across a page boundary is yielded whole.
+        """
+        pending: list[Order] = []
+        for page in self.iter_order_pages(**page_kwargs):
+            payments, pending = complete_payments(pending, page.orders)
+            yield from payments
+        if pending:
+            yield from Payment.from_orders(pending)
+
     def get_user_info(self) -> GetUserInfoResult:
         """Get info about current user."""
-        headers = self.get_standard_header(2)
         get_orders_response = self._api_wrapper.get(
-            f"{ALLEGRO_API_URL}/users",
-            headers=headers,
+            self.users_url(), headers=self.get_standard_header(2)
         )
         return GetUserInfoResult(get_orders_response)
 
 
-class ApiWrapper:
-    """HTTP request helper."""
+def page_batch(fetched: int, max_pages: int | None, concurrency: int) -> int:
+    """Return how many order pages to request in the next concurrent batch."""
+    batch = max(1, concurrency)
+    if max_pages is not None:
+        batch = min(batch, max_pages - fetched)
+    return batch
+
+
+def is_last_page(page: GetOrdersResult, page_size: int, since: datetime | None) -> bool:
+    """Return ``True`` if no page after ``page`` needs to be fetched."""
+    return len(page.orders) < page_size or _reaches(page, since)
+
+
+def complete_payments(
+    pending: list[Order], orders: list[Order]
+) -> tuple[list[Payment], list[Order]]:
+    """Return payments complete after ``orders`` and the orders held back.
+
+    Orders of the last payment may continue on the next page and stay pending.
+    """
+    orders = pending + orders
+    if not orders:
+        return [], []
+    last_payment_id = orders[-1].payment_id
+    return (
+        Payment.from_orders([o for o in orders if o.payment_id != last_payment_id]),
+        [o for o in orders if o.payment_id == last_payment_id],
+    )
+
+
+def _reaches(page: GetOrdersResult, since: datetime | None) -> bool:
+    """Return ``True`` if ``page`` contains orders placed before ``since``.
+
+    Order dates are in UTC, and so is a naive ``since``.
+    """
+    if since is None or not page.orders:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return min(order.order_date for order in page.orders) < since
+
 
-    def __init__(self, session: requests.Session) -> None:
+@dataclass
+class PreparedRequest:  # pylint: disable=too-many-instance-attributes
+    """State shared by all attempts of one :class:`ApiWrapper` request."""
+
+    method: str
+    url: str
+    headers: dict[str, str]
+    retries: int
+    started: float = field(default_factory=time.perf_counter)
+    cache_key: str | None = None
+    entry: CacheEntry | None = None
+    hit: bool = False
+
+
+@dataclass(frozen=True)
+class RawResponse:
+    """Status, headers and body of a response received by a wrapper."""
+
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+    raise_for_status: Callable[[], None]
+
+
+class ApiWrapperBase:  # pylint: disable=too-few-public-methods
+    """Retry, caching and tracing decisions shared by the sync and async wrappers.
+
+    Subclasses only perform the HTTP calls and sleep between attempts.
+    """
+
+    def __init__(
+        self,
+        retry: RetryPolicy | None = None,
+        observer: RequestObserver | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        """Store the retry policy, request observer and response cache."""
+        self._retry = retry or RetryPolicy()
+        self._observer = observer
+        self._cache = cache
+
+    def _prepare(
+        self, method: str, url: str, headers: dict[str, str] | None
+    ) -> tuple[PreparedRequest, Any]:
+        """Return the request state and the cached payload of a fresh hit.
+
+        The request has to be sent unless ``hit`` is set on the returned
+        state; stale cache entries add their validators to its headers.
+        """
+        prepared = PreparedRequest(
+            method,
+            url,
+            headers or {},
+            self._retry.total if method in self._retry.allowed_methods else 0,
+        )
+        cache = self._cache
+        if cache is None or method != "GET":
+            return prepared, None
+        prepared.cache_key = cache.key(method, url, prepared.headers)
+        prepared.entry = entry = cache.lookup(prepared.cache_key)
+        if entry is not None and entry.is_fresh():
+            cache.count("hit")
+            prepared.hit = True
+            self._trace(prepared, 200, 0, cache_result="hit")
+            return prepared, cache.decode(entry)
+        if entry is not None:
+            prepared.headers = {**prepared.headers, **entry.validators()}
+        return prepared, None
+
+    def _error_delay(
+        self, prepared: PreparedRequest, attempt: int, exc: Exception, timeout: bool
+    ) -> float | None:
+        """Return the backoff after a connection error and log the retry.
+
+        Returns ``None`` and traces the request if no attempts are left; the
+        caller then re-raises ``exc``.
+        """
+        if attempt >= prepared.retries:
+            self._trace(prepared, None, attempt)
+            if timeout:
+                _LOGGER.error(
+                    "Timeout error fetching information from %s - %s", prepared.url, exc
+                )
+            return None
+        delay = self._retry.backoff(attempt) or 0.0
+        _LOGGER.warning(
+            "%s %s failed (%s), retrying in %.2fs",
+            prepared.method,
+            prepared.url,
+            exc,
+            delay,
+        )
+        return delay
+
+    def _handle_response(
+        self, prepared: PreparedRequest, attempt: int, response: RawResponse
+    ) -> tuple[float | None, Any]:
+        """Return the backoff before retrying a response, or ``None`` and its JSON.
+
+        See :meth:`_status_delay` for retried responses and :meth:`_finish`
+        for final ones.
+        """
+        delay = self._status_delay(
+            prepared, attempt, response.status, response.headers.get("Retry-After")
+        )
+        if delay is not None:
+            return delay, None
+        return None, self._finish(prepared, attempt, response)
+
+    def _status_delay(
+        self,
+        prepared: PreparedRequest,
+        attempt: int,
+        status: int,
+        retry_after: str | None,
+    ) -> float | None:
+        """Return the backoff after ``status`` and log the retry.
+
+        Returns ``None`` if the response is final: its status is not retried,
+        no attempts are left or the server asks to wait longer than allowed.
+        """
+        if status not in self._retry.status_forcelist or attempt >= prepared.retries:
+            return None
+        delay = self._retry.backoff(attempt, retry_after)
+        if delay is None:
+            _LOGGER.warning(
+                "%s %s returned %s with Retry-After %s, not retrying",
+                prepared.method,
+                prepared.url,
+                status,
+                retry_after,
+            )
+            return None
+        _LOGGER.warning(
+            "%s %s returned %s, retrying in %.2fs",
+            prepared.method,
+            prepared.url,
+            status,
+            delay,
+        )
+        return delay
+
+    def _finish(
+        self, prepared: PreparedRequest, attempt: int, response: RawResponse
+    ) -> Any:
+        """Trace a final response and return its decoded JSON.
+
+        ``304 Not Modified`` answers are served from the cache, successful
+        responses are stored in it; ``raise_for_status`` raises for errors.
+        """
+        cache = self._cache if prepared.cache_key is not None else None
+        entry = prepared.entry
+        revalidated = entry is not None and response.status == 304
+        result = None
+        if cache is not None:
+            result = "revalidated" if revalidated else "miss"
+            cache.count(result)
+        self._trace(prepared, response.status, attempt, len(response.body), result)
+        if cache is not None and entry is not None and revalidated:
+            return cache.decode(cache.refresh(entry, prepared.url, response.headers))
+        response.raise_for_status()
+        if cache is not None and prepared.cache_key is not None:
+            stored = cache.store(
+                prepared.cache_key, prepared.url, response.headers, response.body
+            )
+            if stored is not None:
+                return cache.decode(stored)
+        return loads(response.body)
+
+    def _trace(
+        self,
+        prepared: PreparedRequest,
+        status: int | None,
+        retries: int,
+        size: int = 0,
+        cache_result: str | None = None,
+    ) -> None:
+        """Log latency, status and retry count of a finished request."""
+        trace = RequestTrace(
+            prepared.method,
+            prepared.url,
+            status,
+            time.perf_counter() - prepared.started,
+            retries,
+            size,
+            cache_result,
+        )
+        _LOGGER.debug(
+            "%s %s -> %s in %.3fs (retries: %d, %d bytes, cache: %s)",
+            trace.method,
+            trace.url,
+            status if status is not None else "error",
+            trace.latency,
+            retries,
+            size,
+            cache_result or "-",
+        )
+        if self._observer is not None:
+            self._observer(trace)
+
+
+class ApiWrapper(ApiWrapperBase):
+    """HTTP request helper with pooled connections, retries and tracing."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        session: requests.Session,
+        *,
+        retry: RetryPolicy | None = None,
+        timeout: tuple[float, float] = TIMEOUT,
+        pool_size: int = POOL_SIZE,
+        observer: RequestObserver | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        """Mount a tuned connection pool on ``session``.
+
+        ``observer`` is called with a :class:`RequestTrace` of every finished
+        request. GET responses are served from and stored in ``cache``.
+        """
+        super().__init__(retry, observer, cache)
         self._session = session
+        self._timeout = timeout
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.setdefault("Connection", "keep-alive")
 
     def get(
         self, url: str, headers: dict[str, str] | None = None, auth: Any | None = None
@@ -78,26 +501,44 @@ class ApiWrapper:
         url: str,
         **request_kwargs: Any,
     ) -> Any:
-        """Execute HTTP request and return response JSON."""
-        headers = request_kwargs.pop("headers", None) or {}
+        """Execute HTTP request, retrying transient failures, and return JSON."""
+        prepared, cached = self._prepare(
+            method, url, request_kwargs.pop("headers", None)
+        )
+        if prepared.hit:
+            return cached
         data = request_kwargs.pop("data", None)
         auth = request_kwargs.pop("auth", None)
-        try:
-            response = self._session.request(
-                method,
-                url,
-                headers=headers,
-                data=data,
-                auth=auth,
-                timeout=TIMEOUT,
-                **request_kwargs,
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.Timeout as exc:
-            _LOGGER.error(
-                "Timeout error fetching information from %s - %s",
-                url,
-                exc,
-            )
-            raise
+        attempt = 0
+        while True:
+            try:
+                response = self._session.request(
+                    method,
+                    url,
+                    headers=prepared.headers,
+                    data=data,
+                    auth=auth,
+                    timeout=self._timeout,
+                    **request_kwargs,
+                )
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                delay = self._error_delay(
+                    prepared, attempt, exc, isinstance(exc, requests.Timeout)
+                )
+                if delay is None:
+                    raise
+            else:
+                delay, result = self._handle_response(
+                    prepared,
+                    attempt,
+                    RawResponse(
+                        response.status_code,
+                        response.headers,
+                        response.content,
+                        response.raise_for_status,
+                    ),
+                )
+                if delay is None:
+                    return result
+            attempt += 1
+            time.sleep(delay)
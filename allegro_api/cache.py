@@ -0,0 +1,242 @@
+"""Persistent HTTP response cache used by :class:`~allegro_api.api.ApiWrapper`."""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Mapping
+from urllib.parse import urlsplit
+
+from allegro_api.fastjson import loads
+
+# Seconds a response stays fresh, by URL path prefix. Stale responses with an
+# ``ETag`` or ``Last-Modified`` header are revalidated with a conditional
+# request; paths without a TTL are cached only for revalidation.
+DEFAULT_TTLS: dict[str, float] = {
+    "/users": 24 * 3600.0,
+    "/myorder-api/myorders": 15 * 60.0,
+}
+
+# Entries and total body bytes kept on disk before evicting the least recently used
+MAX_ENTRIES = 2000
+MAX_BYTES = 64 * 1024 * 1024
+
+# Decoded payloads kept in memory, so unchanged responses are parsed once
+DECODED_ENTRIES = 64
+
+# Request headers selecting the representation, e.g. the API version
+_VARY_HEADERS = ("accept",)
+# Request headers identifying the account; only their hash is stored
+_CREDENTIAL_HEADERS = ("cookie", "authorization")
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """Stored response body with its validators."""
+
+    key: str
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+    expires_at: float
+
+    def is_fresh(self, now: float | None = None) -> bool:
+        """Return whether the entry can be used without asking the server."""
+        return (time.time() if now is None else now) < self.expires_at
+
+    def validators(self) -> dict[str, str]:
+        """Return headers turning a request into a conditional one."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:  # pylint: disable=too-many-instance-attributes
+    """SQLite-backed cache of GET responses with TTLs and LRU eviction.
+
+    Entries are keyed by method, URL, ``Accept`` header and a hash of the
+    credentials, so accounts sharing a cache file never see each other's
+    responses. Decoded payloads are shared between callers and must not be
+    modified. ``stats`` counts hits, misses, revalidations and evictions.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttls: Mapping[str, float] | None = None,
+        max_entries: int = MAX_ENTRIES,
+        max_bytes: int = MAX_BYTES,
+    ) -> None:
+        """Open or create the cache database at ``path``."""
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._decoded: OrderedDict[tuple[str, float], Any] = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                '''CREATE TABLE IF NOT EXISTS http_cache (
+                    key TEXT PRIMARY KEY,
+                    url TEXT,
+                    body BLOB,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL,
+                    expires_at REAL,
+                    used_at REAL,
+                    size INTEGER
+                )'''
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_http_cache_used_at "
+                "ON http_cache (used_at)"
+            )
+
+    def ttl(self, url: str) -> float:
+        """Return the TTL of the longest path prefix configured for ``url``."""
+        path = urlsplit(url).path
+        prefixes = [prefix for prefix in self.ttls if path.startswith(prefix)]
+        return self.ttls[max(prefixes, key=len)] if prefixes else 0.0
+
+    @staticmethod
+    def key(method: str, url: str, headers: Mapping[str, str]) -> str:
+        """Return the cache key of a request."""
+        lowered = {name.lower(): value for name, value in headers.items()}
+        parts = [method.upper(), url]
+        parts.extend(lowered.get(name, "") for name in _VARY_HEADERS)
+        parts.extend(
+            hashlib.sha256(lowered.get(name, "").encode()).hexdigest()
+            for name in _CREDENTIAL_HEADERS
+        )
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def lookup(self, key: str) -> CacheEntry | None:
+        """Return the entry stored under ``key`` and mark it as recently used."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, stored_at, expires_at "
+                "FROM http_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE http_cache SET used_at = ? WHERE key = ?", (time.time(), key)
+            )
+        return CacheEntry(key, *row)
+
+    def store(
+        self, key: str, url: str, headers: Mapping[str, str], body: bytes
+    ) -> CacheEntry | None:
+        """Store a successful response if it is cacheable and return it."""
+        if "no-store" in headers.get("Cache-Control", "").lower():
+            return None
+        ttl = self.ttl(url)
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if ttl <= 0 and not etag and not last_modified:
+            return None
+        now = time.time()
+        entry = CacheEntry(key, body, etag, last_modified, now, now + ttl)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache (key, url, body, etag, "
+                "last_modified, stored_at, expires_at, used_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    url,
+                    entry.body,
+                    etag,
+                    last_modified,
+                    now,
+                    entry.expires_at,
+                    now,
+                    len(entry.body),
+                ),
+            )
+            self._evict()
+        self.count("stored")
+        return entry
+
+    def refresh(
+        self, entry: CacheEntry, url: str, headers: Mapping[str, str]
+    ) -> CacheEntry:
+        """Extend ``entry`` after the server answered ``304 Not Modified``.
+
+        Validators sent with the ``304`` replace the stored ones.
+        """
+        etag = headers.get("ETag") or entry.etag
+        last_modified = headers.get("Last-Modified") or entry.last_modified
+        expires_at = time.time() + self.ttl(url)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE http_cache SET etag = ?, last_modified = ?, expires_at = ? "
+                "WHERE key = ?",
+                (etag, last_modified, expires_at, entry.key),
+            )
+        return CacheEntry(
+            entry.key,
+            entry.body,
+            etag,
+            last_modified,
+            entry.stored_at,
+            expires_at,
+        )
+
+    def decode(self, entry: CacheEntry) -> Any:
+        """Return the decoded JSON of ``entry``, parsing each body only once."""
+        memo_key = (entry.key, entry.stored_at)
+        with self._lock:
+            if memo_key in self._decoded:
+                self._decoded.move_to_end(memo_key)
+                return self._decoded[memo_key]
+        payload = loads(entry.body)
+        with self._lock:
+            self._decoded[memo_key] = payload
+            while len(self._decoded) > DECODED_ENTRIES:
+                self._decoded.popitem(last=False)
+        return payload
+
+    def _evict(self) -> None:
+        """Delete least recently used entries above the size limits."""
+        evicted = self._conn.execute(
+            "DELETE FROM http_cache WHERE key IN ("
+            "SELECT key FROM (SELECT key, ROW_NUMBER() OVER win AS position, "
+            "SUM(size) OVER win AS total FROM http_cache "
+            "WINDOW win AS (ORDER BY used_at DESC)) "
+            "WHERE position > ? OR total > ?)",
+            (self.max_entries, self.max_bytes),
+        ).rowcount
+        if evicted:
+            self.stats["evicted"] += evicted  # caller holds the lock
+            _LOGGER.debug("Evicted %d cached responses", evicted)
+
+    def count(self, result: str) -> None:
+        """Count a request answered with ``result``, e.g. ``hit`` or ``miss``."""
+        with self._lock:
+            self.stats[result] += 1
+
+    def clear(self) -> None:
+        """Delete all cached responses."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM http_cache")
+            self._decoded.clear()
+
+    def close(self) -> None:
+        """Close the cache database."""
+        self._conn.close()
@@ -1,3 +1,12 @@
 """Constants for allegro_integration."""
 
 ALLEGRO_API_URL = "https://api.allegro.pl"
+
+# Number of order groups requested per ``myorder-api/myorders`` page.
+ORDERS_PAGE_SIZE = 25
+
+# Maximum number of order pages fetched concurrently.
+ORDERS_FETCH_CONCURRENCY = 4
+
+# Days after the order date within which the bank charge is expected.
+MATCH_WINDOW_DAYS = 6
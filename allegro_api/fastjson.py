@@ -0,0 +1,18 @@
+"""JSON decoding using ``orjson`` when installed, the standard library otherwise."""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+HAS_ORJSON = orjson is not None
+
+
+def loads(data: bytes | str) -> Any:
+    """Decode a JSON document from raw response bytes or text."""
+    if orjson is not None:
+        return orjson.loads(data)  # pylint: disable=no-member
+    return json.loads(data)
@@ -3,42 +3,99 @@
 import hashlib
 import re
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Any, List
+from functools import lru_cache
+from typing import Any, Iterable, List, overload
 
 from fireflyiii_enricher_core.firefly_client import SimplifiedItem
 
+from allegro_api.const import MATCH_WINDOW_DAYS
+
 
 def short_id(id_str: str, length: int = 8) -> str:
     """Return a short, deterministic hash of ``id_str``."""
     return hashlib.sha1(id_str.encode()).hexdigest()[:length]
 
 
+class _LazyDetails:
+    """Offer descriptions of a :class:`SimplifiedPayment`, built on first access.
+
+    Used as a dataclass field, so ``details`` can still be given to
+    ``__init__``; the default ``None`` builds them from ``payment`` or
+    ``parts`` when first read.
+    """
+
+    @overload
+    def __get__(self, obj: None, owner: Any = None) -> None: ...
+
+    @overload
+    def __get__(self, obj: "SimplifiedPayment", owner: Any = None) -> str: ...
+
+    def __get__(self, obj: "SimplifiedPayment | None", owner: Any = None) -> Any:
+        if obj is None:
+            return None
+        details: str | None = obj.__dict__["_details"]
+        if details is None:
+            if obj.parts:
+                details = "\n".join(part.details for part in obj.parts)
+            else:
+                details = "" if obj.payment is None else obj.payment.print_offers()
+            obj.__dict__["_details"] = details
+        return details
+
+    def __set__(self, obj: "SimplifiedPayment", value: str | None) -> None:
+        obj.__dict__["_details"] = value
+
+
 @dataclass()
 class SimplifiedPayment(SimplifiedItem):  # type: ignore[misc]
     """Simplified representation of an Allegro payment."""
 
-    details: str
+    details: _LazyDetails = _LazyDetails()
+    payment_id: str = ""
+    payment: "Payment | None" = field(default=None, repr=False, compare=False)
+    parts: tuple["SimplifiedPayment", ...] = field(
+        default=(), repr=False, compare=False
+    )
+
+    @property
+    def payment_ids(self) -> List[str]:
+        """Return ids of the Allegro payments this payment stands for."""
+        if self.parts:
+            return [part.payment_id for part in self.parts]
+        return [self.payment_id]
 
     def compare(self, other: SimplifiedItem) -> bool:
         """Check whether ``other`` matches this payment within tolerance."""
         if not bool(super().compare_amount(other.amount)):
             return False
-        latest_acceptable_date = self.date + timedelta(days=6)
+        latest_acceptable_date = self.date + timedelta(days=MATCH_WINDOW_DAYS)
         return bool(self.date <= other.date <= latest_acceptable_date)
 
+    @classmethod
+    def combine(cls, parts: List["SimplifiedPayment"]) -> "SimplifiedPayment":
+        """Return a payment for ``parts`` charged in a single bank transaction."""
+        return cls(
+            date=min(part.date for part in parts),
+            amount=round(sum(part.amount for part in parts), 2),
+            payment_id="+".join(part.payment_id for part in parts),
+            parts=tuple(parts),
+        )
+
     @classmethod
     def from_payments(cls, payments: List["Payment"]) -> List["SimplifiedPayment"]:
         """Convert Allegro payment objects into simplified payments."""
         result: List["SimplifiedPayment"] = []
         for payment in payments:
-            date = payment.orders[0].order_date.date()
-            amount = payment.amount
-            offer_text = "\n".join(
-                f"{order.print_offers()}" for order in payment.orders
+            result.append(
+                cls(
+                    date=payment.orders[0].order_date.date(),
+                    amount=payment.amount,
+                    payment_id=payment.payment_id,
+                    payment=payment,
+                )
             )
-            result.append(cls(date=date, amount=amount, details=offer_text))
         return result
 
 
@@ -57,35 +114,55 @@ class GetOrdersResult:  # pylint: disable=too-few-public-methods
         return self.orders
 
 
-class Order:
+class Order:  # pylint: disable=too-many-instance-attributes
     """Single order item"""
 
+    __slots__ = (
+        "order_id",
+        "raw",
+        "seller",
+        "order_date",
+        "total_cost",
+        "payment_amount",
+        "payment_id",
+        "_offers",
+    )
+
     def __init__(self, order_id: str, items: dict[str, Any]) -> None:
         """Initialize order from API response ``items``."""
         self.order_id = order_id
+        self.raw = items
         self.seller = items["seller"]["login"]
-        self.offers = [Offer.from_dict(o) for o in items["offers"]]
-        self._order_date = items["orderDate"]
+        self.order_date = parse_order_date(items["orderDate"])
         self.total_cost = items["totalCost"]
         self.payment_amount = items["payment"]["amount"]
         self.payment_id = items["payment"]["id"]
+        self._offers: List[Offer] | None = None
+
+    @property
+    def offers(self) -> List["Offer"]:
+        """Return ordered offers, built from the raw response on first access."""
+        if self._offers is None:
+            self._offers = [Offer.from_dict(o) for o in self.raw["offers"]]
+        return self._offers
+
+    def simplified_titles(self) -> List[str]:
+        """Return simplified titles of all ordered offers."""
+        return simplify_titles(offer.title for offer in self.offers)
 
     def print_offers(self) -> str:
         """Return human readable representation of ordered offers."""
         return "\n".join(
-            f"{offer.get_simplified_title()} ({offer.unit_price} "
-            f"{offer.price_currency})"
-            for offer in self.offers
+            f"{title} ({offer.unit_price} {offer.price_currency})"
+            for title, offer in zip(self.simplified_titles(), self.offers)
         )
 
-    @property
-    def order_date(self) -> datetime:
-        """Return order date as ``datetime`` with timezone awareness."""
-        if self._order_date.endswith("Z"):
-            return datetime.fromisoformat(self._order_date[:-1]).replace(
-                tzinfo=timezone.utc
-            )
-        return datetime.fromisoformat(self._order_date)
+
+def parse_order_date(value: str) -> datetime:
+    """Return API order date as ``datetime`` with timezone awareness."""
+    if value.endswith("Z"):
+        return datetime.fromisoformat(value[:-1]).replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(value)
 
 
 @dataclass(slots=True)
@@ -115,30 +192,44 @@ class Offer:
 
     def get_simplified_title(self) -> str:
         """Create shortened title suitable for tagging."""
+        return simplify_title(self.title or "")
 
-        def format_word(title_word: str) -> str:
-            return "-".join(
-                w.capitalize() if len(w) > 2 else w.lower()
-                for w in title_word.split("-")
-            )
 
-        clean = re.sub(r"[^\w\s\-]", "", self.title or "", flags=re.UNICODE)
+_TITLE_UNWANTED = re.compile(r"[^\w\s\-]", flags=re.UNICODE)
 
-        words = clean.split()
-        result: List[str] = []
-        total_length = 0
+# Distinct offer titles kept by the ``simplify_title`` cache.
+TITLE_CACHE_SIZE = 4096
 
-        for word in words:
-            formatted = format_word(word)
-            extra = len(formatted) + (1 if result else 0)
 
-            if len(result) < 3 and total_length + extra <= 32:
-                result.append(formatted)
-                total_length += extra
-            else:
-                break
+def _format_title_word(title_word: str) -> str:
+    """Capitalize hyphenated parts longer than two characters."""
+    return "-".join(
+        w.capitalize() if len(w) > 2 else w.lower() for w in title_word.split("-")
+    )
+
 
-        return " ".join(result)
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def simplify_title(title: str) -> str:
+    """Return at most three formatted words of ``title``, up to 32 characters."""
+    result: List[str] = []
+    total_length = 0
+
+    for word in _TITLE_UNWANTED.sub("", title).split():
+        formatted = _format_title_word(word)
+        extra = len(formatted) + (1 if result else 0)
+
+        if len(result) < 3 and total_length + extra <= 32:
+            result.append(formatted)
+            total_length += extra
+        else:
+            break
+
+    return " ".join(result)
+
+
+def simplify_titles(titles: Iterable[str]) -> List[str]:
+    """Return :func:`simplify_title` of every title in ``titles``."""
+    return [simplify_title(title or "") for title in titles]
 
 
 @dataclass()
@@ -161,6 +252,10 @@ class Payment:
             return 0.0
         return float(self.orders[0].payment_amount["amount"])
 
+    def print_offers(self) -> str:
+        """Return offers of all orders in the payment, one per line."""
+        return "\n".join(order.print_offers() for order in self.orders)
+
     @property
     def is_balanced(self) -> bool:
         """Czy suma wartości zamówień zgadza się z kwotą płatności (z tolerancją)."""
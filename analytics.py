@@ -0,0 +1,230 @@
+"""Incremental Parquet export of the match log and aggregations over it.
+
+The worker appends new ``match_attempt`` rows and refreshed orders to
+month-partitioned Parquet datasets; the GUI aggregates them reading only the
+columns it needs instead of the whole SQLite log. pyarrow and pandas are
+imported on first use to keep them off the worker's import path.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timezone
+from typing import Any
+
+import log_db
+
+MATCHES = "matches"
+ORDERS = "orders"
+
+# Rows read from SQLite and written per Parquet file
+EXPORT_BATCH_ROWS = 50_000
+
+_MATCHES_QUERY = (
+    "SELECT a.id, a.tx_id, m.tx_date, m.tx_amount, a.matched_count, "
+    "a.applied, a.match_date FROM match_attempt a "
+    "LEFT JOIN matched_tx m ON m.tx_id = a.tx_id WHERE a.id > ? ORDER BY a.id"
+)
+_ORDERS_QUERY = (
+    "SELECT order_id, payment_id, order_date, raw, fetched_at FROM allegro_order "
+    "WHERE fetched_at > ? ORDER BY fetched_at"
+)
+
+
+def _schemas() -> dict[str, Any]:
+    """Return the Arrow schema of every exported dataset."""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+
+    return {
+        MATCHES: pa.schema(
+            [
+                ("attempt_id", pa.int64()),
+                ("tx_id", pa.string()),
+                ("tx_date", pa.date32()),
+                ("tx_amount", pa.float64()),
+                ("matched_count", pa.int32()),
+                ("applied", pa.bool_()),
+                ("match_date", pa.timestamp("us")),
+                ("month", pa.string()),
+            ]
+        ),
+        ORDERS: pa.schema(
+            [
+                ("order_id", pa.string()),
+                ("payment_id", pa.string()),
+                ("order_date", pa.timestamp("us", tz="UTC")),
+                ("seller", pa.string()),
+                ("amount", pa.float64()),
+                ("currency", pa.string()),
+                ("fetched_at", pa.timestamp("us", tz="UTC")),
+                ("month", pa.string()),
+            ]
+        ),
+    }
+
+
+def _write(directory: str, dataset: str, rows: list[dict[str, Any]]) -> None:
+    """Append ``rows`` as new files of the month partitions of ``dataset``."""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    pq.write_to_dataset(
+        pa.Table.from_pylist(rows, schema=_schemas()[dataset]),
+        root_path=os.path.join(directory, dataset),
+        partition_cols=["month"],
+        basename_template=f"part-{stamp}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def _match_row(row: tuple[Any, ...]) -> dict[str, Any]:
+    """Return a ``matches`` record of a ``match_attempt`` row."""
+    attempt_id, tx_id, tx_date, amount, count, applied, match_date = row
+    matched_at = datetime.fromisoformat(match_date)
+    return {
+        "attempt_id": attempt_id,
+        "tx_id": tx_id,
+        "tx_date": None if tx_date is None else date.fromisoformat(tx_date[:10]),
+        "tx_amount": amount,
+        "matched_count": count,
+        "applied": bool(applied),
+        "match_date": matched_at,
+        "month": matched_at.strftime("%Y-%m"),
+    }
+
+
+def _order_row(row: tuple[Any, ...]) -> dict[str, Any]:
+    """Return an ``orders`` record of an ``allegro_order`` row."""
+    order_id, payment_id, order_date, raw, fetched_at = row
+    items = json.loads(raw)
+    ordered_at = datetime.fromisoformat(order_date)
+    return {
+        "order_id": order_id,
+        "payment_id": payment_id,
+        "order_date": ordered_at,
+        "seller": items["seller"]["login"],
+        "amount": float(items["totalCost"]["amount"]),
+        "currency": items["totalCost"].get("currency"),
+        "fetched_at": datetime.fromisoformat(fetched_at),
+        "month": ordered_at.strftime("%Y-%m"),
+    }
+
+
+def _export(
+    conn: sqlite3.Connection,
+    directory: str,
+    dataset: str,
+    query: str,
+    after: Any,
+) -> tuple[int, Any]:
+    """Write rows of ``query`` after ``after`` and return their count and mark."""
+    convert, mark_of = (_match_row, 0) if dataset == MATCHES else (_order_row, 4)
+    cursor = conn.execute(query, (after,))
+    count, mark = 0, None
+    while rows := cursor.fetchmany(EXPORT_BATCH_ROWS):
+        _write(directory, dataset, [convert(row) for row in rows])
+        count += len(rows)
+        mark = rows[-1][mark_of]
+    return count, mark
+
+
+def export_history(conn: sqlite3.Connection, directory: str) -> dict[str, int]:
+    """Append rows added since the last export and return counts per dataset.
+
+    Match attempts are exported after the last exported ``id`` and orders
+    fetched after the last exported ``fetched_at``, so refreshed orders are
+    appended again; readers keep the newest copy. The high-water marks are
+    stored in ``worker_state`` once all files are written.
+    """
+    writer = log_db.LogWriter(conn)
+    matches, last_attempt = _export(
+        conn,
+        directory,
+        MATCHES,
+        _MATCHES_QUERY,
+        int(log_db.get_state(conn, "export_attempt_id") or 0),
+    )
+    orders, last_fetch = _export(
+        conn,
+        directory,
+        ORDERS,
+        _ORDERS_QUERY,
+        log_db.get_state(conn, "export_order_fetched_at") or "",
+    )
+    if last_attempt is not None:
+        writer.set_state("export_attempt_id", str(last_attempt))
+    if last_fetch is not None:
+        writer.set_state("export_order_fetched_at", last_fetch)
+    writer.flush()
+    return {MATCHES: matches, ORDERS: orders}
+
+
+def export_marks(conn: sqlite3.Connection) -> tuple[str | None, str | None]:
+    """Return the high-water marks of the last export, changed by every export."""
+    try:
+        return (
+            log_db.get_state(conn, "export_attempt_id"),
+            log_db.get_state(conn, "export_order_fetched_at"),
+        )
+    except sqlite3.OperationalError:
+        return None, None
+
+
+def _read(directory: str, dataset: str, columns: list[str]) -> Any:
+    """Return ``columns`` of an exported dataset as a ``DataFrame``, or ``None``."""
+    import pyarrow.dataset as ds  # pylint: disable=import-outside-toplevel
+
+    path = os.path.join(directory, dataset)
+    if not os.path.isdir(path):
+        return None
+    return (
+        ds.dataset(path, format="parquet", partitioning="hive")
+        .to_table(columns=columns)
+        .to_pandas()
+    )
+
+
+def match_rates(directory: str) -> Any:
+    """Return match, ambiguity and apply rates per transaction month.
+
+    Each transaction counts once, in its latest logged state.
+    """
+    df = _read(
+        directory,
+        MATCHES,
+        ["attempt_id", "tx_id", "tx_date", "matched_count", "applied"],
+    )
+    if df is None or df.empty:
+        return None
+    df = df.sort_values("attempt_id").drop_duplicates("tx_id", keep="last")
+    df = df.dropna(subset=["tx_date"])
+    df["month"] = df["tx_date"].map(lambda value: value.strftime("%Y-%m"))
+    df["matched"] = df["matched_count"] > 0
+    df["ambiguous"] = df["matched_count"] > 1
+    return (
+        df.groupby("month")
+        .agg(
+            transactions=("tx_id", "size"),
+            match_rate=("matched", "mean"),
+            ambiguity_rate=("ambiguous", "mean"),
+            applied_rate=("applied", "mean"),
+        )
+        .sort_index()
+    )
+
+
+def spend_by_seller(directory: str, limit: int = 20) -> Any:
+    """Return order count and spend of the ``limit`` largest sellers."""
+    df = _read(
+        directory, ORDERS, ["order_id", "seller", "amount", "currency", "fetched_at"]
+    )
+    if df is None or df.empty:
+        return None
+    df = df.sort_values("fetched_at").drop_duplicates("order_id", keep="last")
+    return (
+        df.groupby(["seller", "currency"], as_index=False)
+        .agg(orders=("order_id", "size"), spend=("amount", "sum"))
+        .sort_values("spend", ascending=False)
+        .head(limit)
+    )
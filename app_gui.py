@@ -1,14 +1,17 @@
 """Streamlit user interface for matching Allegro payments with Firefly III."""
 
 import os
+import sqlite3
+import uuid
 
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
 from fireflyiii_enricher_core.firefly_client import FireflyClient
 
+import analytics
 import log_db  # moduł z load_matched_log
-from processor_gui import TransactionProcessorGUI
+from processor_gui import TransactionProcessorGUI, TxMatchResult
 
 load_dotenv()
 
@@ -21,58 +24,187 @@ COOKIE = os.environ["QXLSESSID"]
 TAG = os.environ["TAG"]
 DESCRIPTION_FILTER = os.environ['DESCRIPTION_FILTER']
 ALLEGRO_COOKIE = os.environ["QXLSESSID"]
+# Katalog eksportu Parquet workera (pusty wyłącza analitykę)
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "")
 
-# Inicjalizacja
-if "firefly" not in st.session_state:
-    st.session_state["firefly"] = FireflyClient(FIREFLY_URL, FIREFLY_TOKEN)
-    st.session_state["processor"] = TransactionProcessorGUI(
-        st.session_state["firefly"], TAG
+# Liczba wierszy na stronie tabel
+PAGE_SIZES = [50, 100, 500]
+
+
+@st.cache_resource
+def get_processor() -> TransactionProcessorGUI:
+    """Return the Firefly III processor shared by all sessions."""
+    return TransactionProcessorGUI(FireflyClient(FIREFLY_URL, FIREFLY_TOKEN), TAG)
+
+
+def get_log_conn() -> sqlite3.Connection:
+    """Return the log database connection of the current session.
+
+    Sessions never share it. Reruns of a session run one at a time, though
+    not always on the same thread.
+    """
+    if "log_conn" not in st.session_state:
+        st.session_state["log_conn"] = sqlite3.connect(
+            log_db.DB_FILE, check_same_thread=False
+        )
+    conn: sqlite3.Connection = st.session_state["log_conn"]
+    return conn
+
+
+@st.cache_data(max_entries=20)
+def transactions_frame(
+    _transactions: list[TxMatchResult],
+    fetch_id: str,
+    exclude_tagged: bool,
+    description: str,
+) -> pd.DataFrame:
+    """Return fetched transactions matching the filters as a ``DataFrame``.
+
+    Cached per ``fetch_id`` and filters; the transaction list itself is not
+    hashed. The cache is shared by all sessions, so every fetch needs an id
+    unique across them.
+    """
+    del fetch_id  # tylko klucz cache
+    needle = description.lower()
+    return pd.DataFrame(
+        [
+            {
+                "ID": tx.tx.id,
+                "Data": tx.tx.date,
+                "Kwota": tx.tx.amount,
+                "Opis": tx.tx.description,
+                "Notes": tx.tx.notes,
+                "Matches": len(tx.matches),
+            }
+            for tx in _transactions
+            if not (exclude_tagged and TAG in tx.tx.tags)
+            and needle in tx.tx.description.lower()
+        ],
+        columns=["ID", "Data", "Kwota", "Opis", "Notes", "Matches"],
     )
+
+
+@st.cache_data(max_entries=50)
+def matched_log_page(
+    version: int, after: log_db.LogCursor | None, limit: int
+) -> tuple[pd.DataFrame | None, log_db.LogCursor | None]:
+    """Return a match history page, cached per log database version."""
+    del version  # tylko klucz cache
+    return log_db.load_matched_log_page(after, limit, conn=get_log_conn())
+
+
+@st.cache_data(max_entries=5)
+def run_metrics(last_run: str | None, runs: int = 50) -> pd.DataFrame | None:
+    """Return recent run metrics, cached until the next worker run."""
+    del last_run  # tylko klucz cache
+    return log_db.load_run_metrics(runs, conn=get_log_conn())
+
+
+@st.cache_data(max_entries=5)
+def history_analytics(
+    export_marks: tuple[str | None, str | None],
+) -> tuple[pd.DataFrame | None, pd.DataFrame | None]:
+    """Return monthly match rates and top sellers from the Parquet export."""
+    del export_marks  # tylko klucz cache
+    return analytics.match_rates(EXPORT_DIR), analytics.spend_by_seller(EXPORT_DIR)
+
+
+def page_slice(frame: pd.DataFrame, key: str, size: int) -> pd.DataFrame:
+    """Render a page selector and return the selected page of ``frame``."""
+    pages = max(1, -(-len(frame) // size))
+    page = st.number_input(f"Strona (z {pages})", min_value=1, value=1, key=key)
+    start = (min(int(page), pages) - 1) * size
+    return frame.iloc[start : start + size]
+
+
+# Inicjalizacja
+if "firefly_tx" not in st.session_state:
     st.session_state["firefly_tx"] = []
+    st.session_state["fetch_id"] = ""
     st.session_state["matches"] = []
+    st.session_state["log_cursors"] = [None]
 
 # Sidebar z filtrami
 with st.sidebar:
     st.header("🔍 Filtry")
     filter_tagged = st.checkbox("Wyklucz już otagowane", True)
     name_filter = st.text_input("Opis zawiera", "")
+    page_size = st.selectbox("Wierszy na stronie", PAGE_SIZES)
 
 # 1) Pobranie Firefly
 st.subheader("📥 Krok 1: Pobierz z Firefly")
 if st.button("Pobierz transakcje"):
-    st.session_state["firefly_tx"] = st.session_state[
-        "processor"
-    ].fetch_unmatched_transactions(DESCRIPTION_FILTER, exact_match=False)
-    st.success("Transakcje pobrane")
-    df = pd.DataFrame(
-        [
-            {
-                "ID": tx.tx.id,
-                "Data": tx.tx.date,
-                "Kwota": tx.tx.amount,
-                "Opis": tx.tx.description,
-                "Notes": tx.tx.notes,
-                "Matches": len(tx.matches),
-            }
-            for tx in st.session_state["firefly_tx"]
-        ]
+    st.session_state["firefly_tx"] = get_processor().fetch_unmatched_transactions(
+        DESCRIPTION_FILTER, exact_match=False
     )
-
-    dataframe = st.table(df)
+    st.session_state["fetch_id"] = uuid.uuid4().hex
+    st.success("Transakcje pobrane")
 
 # 2) Filtrowanie lokalne
-filtered = []
-for tx in st.session_state["firefly_tx"]:
-    if filter_tagged and TAG in tx.tx.tags:
-        continue
-    if name_filter and name_filter.lower() not in tx.tx.description.lower():
-        continue
-    filtered.append(tx)
+filtered = transactions_frame(
+    st.session_state["firefly_tx"],
+    st.session_state["fetch_id"],
+    filter_tagged,
+    name_filter,
+)
+if not filtered.empty:
+    st.caption(f"{len(filtered)} transakcji")
+    st.dataframe(
+        page_slice(filtered, "tx_page", page_size),
+        use_container_width=True,
+        hide_index=True,
+    )
 
 # 5) Diagnostyka logów
 st.subheader("📄 Historia dopasowań")
-df_log = log_db.load_matched_log(limit=50)
+cursors = st.session_state["log_cursors"]
+df_log, next_cursor = matched_log_page(
+    log_db.get_log_version(get_log_conn()), cursors[-1], page_size
+)
 if df_log is not None and not df_log.empty:
-    st.dataframe(df_log, use_container_width=True)
+    st.dataframe(df_log, use_container_width=True, hide_index=True)
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    if prev_col.button("⬅️ Nowsze", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    page_col.caption(f"Strona {len(cursors)}")
+    if next_col.button("Starsze ➡️", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
 else:
     st.info("Brak zapisanych dopasowań w bazie.")
+
+# 6) Metryki workera
+st.subheader("📈 Metryki workera")
+df_metrics = run_metrics(log_db.last_run_started_at(get_log_conn()))
+if df_metrics is not None and not df_metrics.empty:
+    durations = df_metrics[df_metrics["metric"] == "stage_duration_seconds"].pivot(
+        index="run_started_at", columns="labels", values="value"
+    )
+    durations.columns = [c.removeprefix("stage=") for c in durations.columns]
+    st.caption("Czas etapów [s]")
+    st.line_chart(durations)
+    outcomes = df_metrics[df_metrics["metric"] == "match_outcomes"].pivot(
+        index="run_started_at", columns="labels", values="value"
+    )
+    outcomes.columns = [c.removeprefix("outcome=") for c in outcomes.columns]
+    st.caption("Liczba dopasowań na transakcję (0 / 1 / wiele)")
+    st.bar_chart(outcomes)
+else:
+    st.info("Brak zapisanych metryk workera.")
+
+# 7) Analityka historii
+st.subheader("📊 Analityka")
+if EXPORT_DIR:
+    rates, sellers = history_analytics(analytics.export_marks(get_log_conn()))
+    if rates is not None:
+        st.caption("Odsetek dopasowanych, niejednoznacznych i zastosowanych transakcji")
+        st.line_chart(rates[["match_rate", "ambiguity_rate", "applied_rate"]])
+        st.dataframe(rates, use_container_width=True)
+    if sellers is not None:
+        st.caption("Wydatki według sprzedawcy")
+        st.dataframe(sellers, use_container_width=True, hide_index=True)
+    if rates is None and sellers is None:
+        st.info("Brak wyeksportowanych danych w EXPORT_DIR.")
+else:
+    st.info("Ustaw EXPORT_DIR, aby worker eksportował historię do Parquet.")
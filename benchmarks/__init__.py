@@ -0,0 +1 @@
+"""Offline benchmarks for allegro-fireflyiii."""
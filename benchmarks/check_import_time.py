@@ -0,0 +1,83 @@
+"""Fail if importing the worker gets slower than a budget or pulls heavy modules.
+
+Run with ``python -m benchmarks.check_import_time [--budget-ms N]``; exits with
+status 1 on regression. Parses ``python -X importtime`` output of a fresh
+interpreter, keeping the best of several runs to damp noise.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+# Modules that must stay off the worker's cold start path
+FORBIDDEN = ("pandas", "numpy", "streamlit", "pyarrow")
+
+DUMMY_ENV = {
+    "TAG": "allegro_done",
+    "DESCRIPTION_FILTER": "allegro",
+    "QXLSESSID": "dummy",
+    "FIREFLY_URL": "http://localhost",
+    "FIREFLY_TOKEN": "dummy",
+}
+
+
+def measure(module: str) -> tuple[float, set[str]]:
+    """Return cumulative import time of ``module`` in ms and all imported names."""
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, **DUMMY_ENV}
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [repo_root, os.environ.get("PYTHONPATH")])
+    )
+    # Run from a scratch directory so the worker's log file lands there
+    with tempfile.TemporaryDirectory() as workdir:
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    total_us = 0
+    imported: set[str] = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        imported.add(name.strip())
+        if name.strip() == module:
+            total_us = int(cumulative)
+    return total_us / 1000, imported
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Check the import budget and return the process exit status."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="worker")
+    parser.add_argument("--budget-ms", type=float, default=500.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    best_ms = min(ms for ms, _ in runs)
+    imported = set().union(*(names for _, names in runs))
+    heavy = sorted(name for name in imported if name.split(".")[0] in FORBIDDEN)
+    print(f"import {args.module}: {best_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if best_ms > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+    if heavy:
+        roots = sorted({name.split(".")[0] for name in heavy})
+        print(f"FAIL: heavy modules imported: {', '.join(roots)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
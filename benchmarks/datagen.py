@@ -0,0 +1,275 @@
+"""Synthetic Allegro and Firefly III payloads for offline benchmarks."""
+
+import json
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+_WORDS = [
+    "kabel",
+    "ładowarka",
+    "etui",
+    "słuchawki",
+    "żarówka",
+    "filtr",
+    "zestaw",
+    "usb-c",
+    "szybka",
+    "bezprzewodowa",
+    "magnetyczny",
+    "czarny",
+    "2m",
+    "100w",
+    "łóżko",
+    "części",
+    "gąbka",
+    "ściereczka",
+    "żółty",
+    "wąż",
+    "ogrodowy",
+    "ręcznik",
+    "świeca",
+    "pościel",
+]
+
+# Share of legacy log rows repeating an ambiguous transaction
+LEGACY_RECURRING = 0.7
+
+# Currency and its share among generated offers
+_CURRENCIES = [("PLN", 0.9), ("EUR", 0.07), ("CZK", 0.03)]
+
+
+def _currency(rng: random.Random) -> str:
+    """Return a random currency weighted by ``_CURRENCIES``."""
+    return rng.choices(
+        [name for name, _ in _CURRENCIES], [share for _, share in _CURRENCIES]
+    )[0]
+
+
+def offer(rng: random.Random, index: int, currency: str = "PLN") -> dict[str, Any]:
+    """Return a single ``offers`` entry of an order."""
+    title = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 9)))
+    return {
+        "id": f"{10_000_000 + index}",
+        "title": f"{title.capitalize()}!",
+        "unitPrice": {"amount": f"{rng.uniform(5, 300):.2f}", "currency": currency},
+        "friendlyUrl": f"https://allegro.pl/oferta/{index}",
+        "quantity": rng.randint(1, 3),
+        "imageUrl": f"https://a.allegroimg.com/{index}.jpg",
+    }
+
+
+def orders_payload(
+    count: int, seed: int = 0, start: datetime | None = None
+) -> dict[str, Any]:
+    """Return a ``myorder-api/myorders`` payload with ``count`` order groups.
+
+    Orders are newest first; about a third of the payments cover several
+    orders and a few use a foreign currency.
+    """
+    rng = random.Random(seed)
+    when = start or datetime(2025, 1, 1, tzinfo=timezone.utc)
+    groups: list[dict[str, Any]] = []
+    index = 0
+    while len(groups) < count:
+        orders_in_payment = min(rng.choice([1, 1, 1, 2, 3]), count - len(groups))
+        payment_id = f"pay-{index:08d}"
+        currency = _currency(rng)
+        costs = [round(rng.uniform(5, 500), 2) for _ in range(orders_in_payment)]
+        for cost in costs:
+            groups.append(
+                {
+                    "groupId": f"grp-{index:08d}",
+                    "myorders": [
+                        {
+                            "seller": {"login": f"seller{rng.randint(1, 200)}"},
+                            "offers": [
+                                offer(rng, index * 10 + i, currency)
+                                for i in range(rng.randint(1, 4))
+                            ],
+                            "orderDate": when.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                            "totalCost": {
+                                "amount": f"{cost:.2f}",
+                                "currency": currency,
+                            },
+                            "payment": {
+                                "id": payment_id,
+                                "amount": {
+                                    "amount": f"{sum(costs):.2f}",
+                                    "currency": currency,
+                                },
+                            },
+                        }
+                    ],
+                }
+            )
+            index += 1
+        when -= timedelta(minutes=rng.randint(10, 24 * 60))
+    return {"orderGroups": groups}
+
+
+def firefly_transactions(
+    orders: dict[str, Any],
+    seed: int = 0,
+    noise: float = 0.2,
+    description: str = "ALLEGRO.PL zakup",
+    combined: float = 0.02,
+) -> list[dict[str, Any]]:
+    """Return Firefly III withdrawals charged for the payments in ``orders``.
+
+    Each payment is booked zero to six days after its order date; about a
+    ``combined`` share of consecutive payments is charged together. ``noise``
+    adds that share of unrelated withdrawals, some of them categorized.
+    """
+    rng = random.Random(seed)
+    payments: dict[str, tuple[str, str]] = {}
+    for group in orders["orderGroups"]:
+        order = group["myorders"][0]
+        payment = order["payment"]
+        payments.setdefault(
+            payment["id"], (order["orderDate"][:10], payment["amount"]["amount"])
+        )
+    rows: list[tuple[str, str, str, str | None]] = [
+        (booked, amount, description, None)
+        for booked, amount in _charges(rng, list(payments.values()), combined)
+    ]
+    for _ in range(int(len(payments) * noise)):
+        booked_date, _amount = rng.choice(list(payments.values()))
+        rows.append(
+            (
+                booked_date,
+                f"{rng.uniform(1, 800):.2f}",
+                rng.choice([description, "Biedronka", "Orlen", "Przelew"]),
+                rng.choice([None, None, "Zakupy"]),
+            )
+        )
+    rows.sort(reverse=True)
+    return [
+        _firefly_transaction(100_000 + index, row) for index, row in enumerate(rows)
+    ]
+
+
+def _charges(
+    rng: random.Random, payments: list[tuple[str, str]], combined: float
+) -> list[tuple[str, str]]:
+    """Return ``(booking date, amount)`` of the withdrawals paying ``payments``."""
+    charges = [(date.fromisoformat(day), amount) for day, amount in payments]
+    rows = []
+    index = 0
+    while index < len(charges):
+        day, amount = charges[index]
+        index += 1
+        booked = day + timedelta(days=rng.randint(0, 6))
+        # Charge together with the next, older payment if it is at most a day older
+        if (
+            index < len(charges)
+            and day - charges[index][0] <= timedelta(days=1)
+            and rng.random() < combined
+        ):
+            amount = f"{float(amount) + float(charges[index][1]):.2f}"
+            booked = day + timedelta(days=rng.randint(0, 5))
+            index += 1
+        rows.append((booked.isoformat(), amount))
+    return rows
+
+
+def _firefly_transaction(
+    tx_id: int, row: tuple[str, str, str, str | None]
+) -> dict[str, Any]:
+    """Return the Firefly III withdrawal of a ``firefly_transactions`` row."""
+    booked, amount, description, category = row
+    return {
+        "type": "transactions",
+        "id": str(tx_id),
+        "attributes": {
+            "transactions": [
+                {
+                    "date": f"{booked}T00:00:00+01:00",
+                    "amount": amount,
+                    "description": description,
+                    "category_name": category,
+                    "tags": [],
+                    "notes": None,
+                }
+            ]
+        },
+    }
+
+
+def firefly_page(
+    transactions: list[dict[str, Any]], page: int, limit: int
+) -> dict[str, Any]:
+    """Return one ``/api/v1/transactions`` response page."""
+    total_pages = max(1, -(-len(transactions) // limit))
+    return {
+        "data": transactions[(page - 1) * limit : page * limit],
+        "meta": {
+            "pagination": {
+                "total": len(transactions),
+                "count": len(transactions[(page - 1) * limit : page * limit]),
+                "per_page": limit,
+                "current_page": page,
+                "total_pages": total_pages,
+            }
+        },
+    }
+
+
+def legacy_log_rows(
+    runs: int,
+    per_run: int,
+    seed: int = 0,
+    interval: timedelta = timedelta(hours=1),
+    end: datetime | None = None,
+) -> list[tuple[Any, ...]]:
+    """Return ``matched_tx`` rows of the pre-upsert schema for ``runs`` runs.
+
+    Every run logs ``per_run`` transactions; a ``LEGACY_RECURRING`` share of
+    them is drawn from a small pool of ambiguous transactions logged again and
+    again, with ``details`` listing the full offer text of every candidate.
+    The last run is logged at ``end``, by default now.
+    """
+    rng = random.Random(seed)
+    pool = _ambiguous_pool(rng, max(1, per_run * 10))
+    rows = []
+    next_id = 600_000
+    last = end or datetime.now()
+    for logged_at in (last - run * interval for run in range(runs - 1, -1, -1)):
+        for _ in range(per_run):
+            if rng.random() < LEGACY_RECURRING:
+                tx_id, details, amount = rng.choice(pool)
+                applied = 0
+            else:
+                tx_id, details, amount = str(next_id), [_candidate(rng)], "0"
+                next_id += 1
+                applied = 1
+            rows.append(
+                (
+                    tx_id,
+                    (logged_at - timedelta(days=rng.randint(0, 6))).date().isoformat(),
+                    float(amount) or round(rng.uniform(5, 300), 2),
+                    len(details),
+                    applied,
+                    logged_at.isoformat(),
+                    json.dumps(details),
+                )
+            )
+    return rows
+
+
+def _ambiguous_pool(rng: random.Random, size: int) -> list[tuple[str, list[str], str]]:
+    """Return ``(tx_id, details, amount)`` of transactions with many candidates."""
+    return [
+        (
+            str(500_000 + index),
+            [_candidate(rng) for _ in range(rng.randint(2, 4))],
+            f"{rng.uniform(5, 300):.2f}",
+        )
+        for index in range(size)
+    ]
+
+
+def _candidate(rng: random.Random) -> str:
+    """Return the offer text of a random candidate payment."""
+    title = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 9)))
+    return f"{title.capitalize()}! ({rng.randint(1, 3)} szt.)"
@@ -0,0 +1,455 @@
+"""Offline benchmark suite writing JSON results comparable between commits.
+
+Run with ``python -m benchmarks.run --output bench_results.json``; compare two
+result files with ``python -m benchmarks.run --compare old.json new.json``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+
+import pandas as pd
+import requests
+from fireflyiii_enricher_core.firefly_client import simplify_transactions
+
+import log_db
+from allegro_api import fastjson
+from allegro_api.aio import AsyncAllegroApiClient
+from allegro_api.api import AllegroApiClient
+from allegro_api.get_order_result import GetOrdersResult, SimplifiedPayment
+from benchmarks.datagen import firefly_transactions, legacy_log_rows, orders_payload
+from benchmarks.standin import StandIn
+from processor_gui import TxMatchResult, match_transactions
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+PARSE_SIZES = (1_000, 10_000)
+MATCH_SIZES = (1_000, 10_000, 100_000)
+LOG_SIZES = (1_000, 10_000)
+WORKER_ORDERS = 2_000
+# A year of hourly runs logging 20 transactions each
+HISTORY_RUNS = 365 * 24
+HISTORY_ROWS_PER_RUN = 20
+HISTORY_RETENTION_DAYS = 90
+# Order pages requested at once by the sync and asyncio clients
+HTTP_CONCURRENCY = (1, 10, 50)
+HTTP_REQUESTS = 200
+HTTP_LATENCY = 0.02
+
+
+def measure(func: Callable[[], Any], repeat: int) -> dict[str, float]:
+    """Return best and median wall-clock seconds of ``repeat`` calls."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {"best": timings[0], "median": timings[len(timings) // 2]}
+
+
+def result(name: str, size: int, timings: dict[str, float]) -> dict[str, Any]:
+    """Return a result record with throughput derived from the best timing."""
+    return {
+        "name": name,
+        "size": size,
+        **timings,
+        "per_second": size / timings["best"] if timings["best"] else None,
+    }
+
+
+def bench_parsing(repeat: int) -> list[dict[str, Any]]:
+    """Benchmark payload decoding, ``GetOrdersResult`` and ``from_payments``.
+
+    ``decode[stdlib]`` is the ``json`` baseline of ``fastjson``, and
+    ``get_orders_result[offers]`` also builds the lazily parsed offers.
+    """
+    results = []
+    for size in PARSE_SIZES:
+        raw = json.dumps(orders_payload(size)).encode()
+        decoded = fastjson.loads(raw)
+        for name, func in (
+            ("decode", partial(fastjson.loads, raw)),
+            ("decode[stdlib]", partial(json.loads, raw)),
+            ("get_orders_result", partial(GetOrdersResult, decoded)),
+            ("get_orders_result[offers]", partial(_parse_offers, decoded)),
+            (
+                "from_payments",
+                partial(
+                    SimplifiedPayment.from_payments, GetOrdersResult(decoded).payments
+                ),
+            ),
+        ):
+            results.append(result(name, size, measure(func, repeat)))
+    return results
+
+
+def _parse_offers(payload: dict[str, Any]) -> list[Any]:
+    """Return the offers of every order in ``payload``, parsing them."""
+    return [order.offers for order in GetOrdersResult(payload).orders]
+
+
+def _match(
+    transactions: list[Any], payments: list[SimplifiedPayment], batch: bool
+) -> None:
+    """Match fresh results of ``transactions`` with ``payments``."""
+    match_transactions(
+        [TxMatchResult(tx=tx, matches=[]) for tx in transactions],
+        payments,
+        batch=batch,
+    )
+
+
+def bench_matching(repeat: int, sizes: tuple[int, ...]) -> list[dict[str, Any]]:
+    """Benchmark indexed and batch ``match_transactions`` by transaction count."""
+    results = []
+    for size in sizes:
+        orders = orders_payload(size)
+        payments = SimplifiedPayment.from_payments(GetOrdersResult(orders).payments)
+        transactions = simplify_transactions(firefly_transactions(orders))[:size]
+        for mode, batch in (("indexed", False), ("batch", True)):
+            run = partial(_match, transactions, payments, batch)
+            results.append(
+                result(f"match_transactions[{mode}]", size, measure(run, repeat))
+            )
+    return results
+
+
+def bench_log_db(repeat: int) -> list[dict[str, Any]]:
+    """Benchmark ``LogWriter`` throughput for one flushed run."""
+    orders = orders_payload(max(LOG_SIZES))
+    transactions = [
+        TxMatchResult(tx=tx, matches=[])
+        for tx in simplify_transactions(firefly_transactions(orders))
+    ]
+    details = ["Kabel usb-c 2m 100w czarny (1 szt.)"]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in LOG_SIZES:
+            conn = log_db.connect(os.path.join(tmp, f"log-{size}.db"))
+            log_db.init_db(conn)
+
+            def write(conn: Any = conn, size: int = size) -> None:
+                writer = log_db.LogWriter(conn)
+                for index, txr in enumerate(transactions[:size]):
+                    writer.add(txr, 1, True, details)
+                    writer.checkpoint(txr.tx.id, f"{index:040x}")
+                writer.flush()
+
+            results.append(result("log_db_write", size, measure(write, repeat)))
+            conn.close()
+    return results
+
+
+def _vacuumed_size(path: str) -> int:
+    """Return the size of the database at ``path`` after ``VACUUM``."""
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def bench_log_history(repeat: int, runs: int) -> list[dict[str, Any]]:
+    """Benchmark size and history queries of a year of logged runs.
+
+    The legacy per-attempt table is migrated by ``log_db.init_db`` and then
+    pruned to ``HISTORY_RETENTION_DAYS``.
+    """
+    rows = legacy_log_rows(runs, HISTORY_ROWS_PER_RUN)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "legacy.db")
+        _write_legacy_log(legacy, rows)
+        legacy_bytes = _vacuumed_size(legacy)
+        compact = os.path.join(tmp, "compact.db")
+        migrate = result(
+            "log_history_migrate", len(rows), _migrate(legacy, compact, repeat)
+        )
+        migrate["legacy_bytes"] = legacy_bytes
+        migrate["compact_bytes"] = _vacuumed_size(compact)
+        conn = log_db.connect(compact)
+        migrate["pruned_rows"] = sum(
+            log_db.prune_log(conn, HISTORY_RETENTION_DAYS, vacuum_ratio=0.0).values()
+        )
+        conn.close()
+        migrate["pruned_bytes"] = os.path.getsize(compact)
+        results.append(migrate)
+        for name, func in (
+            ("log_history_page[legacy]", partial(_legacy_page, legacy)),
+            ("log_history_latest[legacy]", partial(_legacy_latest, legacy)),
+            ("log_history_page[compact]", partial(_compact_page, compact)),
+        ):
+            results.append(result(name, len(rows), measure(func, repeat)))
+    return results
+
+
+def _write_legacy_log(path: str, rows: list[tuple[Any, ...]]) -> None:
+    """Create a legacy per-attempt log database at ``path`` holding ``rows``."""
+    conn = sqlite3.connect(path)
+    conn.executescript(log_db.LEGACY_SCHEMA)
+    with conn:
+        conn.executemany(
+            "INSERT INTO matched_tx (tx_id, tx_date, tx_amount, matched_count, "
+            "applied, match_date, details) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    conn.close()
+
+
+def _migrate(legacy: str, compact: str, repeat: int) -> dict[str, float]:
+    """Return timings of migrating copies of ``legacy``, the last one at ``compact``."""
+    timings = []
+    for _ in range(repeat):
+        shutil.copyfile(legacy, compact)
+        conn = log_db.connect(compact)
+        started = time.perf_counter()
+        log_db.init_db(conn)
+        timings.append(time.perf_counter() - started)
+        conn.close()
+    timings.sort()
+    return {"best": timings[0], "median": timings[len(timings) // 2]}
+
+
+def _legacy_page(path: str) -> None:
+    """Read the newest history page of a legacy log."""
+    with sqlite3.connect(path) as db:
+        pd.read_sql(
+            "SELECT * FROM matched_tx ORDER BY match_date DESC, id DESC LIMIT 51", db
+        )
+
+
+def _legacy_latest(path: str) -> None:
+    """Read the latest state of each transaction, which the compact log stores."""
+    with sqlite3.connect(path) as db:
+        pd.read_sql(
+            "SELECT * FROM matched_tx WHERE id IN ("
+            "SELECT MAX(id) FROM matched_tx GROUP BY tx_id) "
+            "ORDER BY match_date DESC LIMIT 51",
+            db,
+        )
+
+
+def _compact_page(path: str) -> None:
+    """Read the newest history page of a migrated log."""
+    with sqlite3.connect(path) as db:
+        log_db.load_matched_log_page(limit=50, conn=db)
+
+
+def bench_worker(
+    repeat: int, latency: float, error_rate: float
+) -> list[dict[str, Any]]:
+    """Benchmark cold and warm ``worker.main`` runs against the stand-in."""
+    results = []
+    with (
+        StandIn.synthetic(
+            WORKER_ORDERS, latency=latency, error_rate=error_rate
+        ) as standin,
+        tempfile.TemporaryDirectory() as tmp,
+    ):
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(
+                filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])
+            ),
+            "ALLEGRO_API_URL": standin.url,
+            "FIREFLY_URL": standin.url,
+            "FIREFLY_TOKEN": "benchmark",
+            "QXLSESSID": "benchmark",
+            "TAG": "allegro",
+            "DESCRIPTION_FILTER": "allegro",
+            "ALLEGRO_MAX_PAGES": str(WORKER_ORDERS),
+            "APPLY_RATE_LIMIT": "0",
+            # Synthetic orders are dated from 2025, keep all of them open
+            "OPEN_ORDER_LOOKBACK_DAYS": "36500",
+        }
+        command = [sys.executable, "-c", "import worker; worker.main()"]
+        for name in ("worker_main[cold]", "worker_main[warm]"):
+
+            def run() -> None:
+                subprocess.run(
+                    command,
+                    cwd=tmp,
+                    env=env,
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                )
+
+            # The cold run starts from an empty database every time
+            runs = repeat if name.endswith("[warm]") else 1
+            results.append(result(name, WORKER_ORDERS, measure(run, runs)))
+        results[-1]["requests"] = standin.requests
+        results[-1]["injected_errors"] = standin.errors
+    return results
+
+
+def bench_http_concurrency(repeat: int, latency: float) -> list[dict[str, Any]]:
+    """Benchmark ``get_orders`` fan-out with threads and with asyncio.
+
+    The sync client runs ``HTTP_REQUESTS`` calls on a thread pool, the asyncio
+    client gathers them on one event loop; both keep ``concurrency`` requests
+    in flight over a pool of as many connections.
+    """
+    results = []
+    offsets = [i * 25 for i in range(HTTP_REQUESTS)]
+    with StandIn.synthetic(WORKER_ORDERS, latency=latency or HTTP_LATENCY) as standin:
+        for concurrency in HTTP_CONCURRENCY:
+            with requests.Session() as session:
+                client = AllegroApiClient(
+                    "benchmark", session, base_url=standin.url, pool_size=concurrency
+                )
+                results.append(
+                    result(
+                        f"http_threads[{concurrency}]",
+                        HTTP_REQUESTS,
+                        measure(
+                            partial(_thread_orders, client, offsets, concurrency),
+                            repeat,
+                        ),
+                    )
+                )
+            results.append(
+                result(
+                    f"http_asyncio[{concurrency}]",
+                    HTTP_REQUESTS,
+                    measure(
+                        partial(_gather_orders, standin.url, offsets, concurrency),
+                        repeat,
+                    ),
+                )
+            )
+    return results
+
+
+def _thread_orders(
+    client: AllegroApiClient, offsets: list[int], concurrency: int
+) -> None:
+    """Fetch order pages at ``offsets`` on a pool of ``concurrency`` threads."""
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client.get_orders, offsets))
+
+
+def _gather_orders(url: str, offsets: list[int], concurrency: int) -> None:
+    """Fetch order pages at ``offsets`` from ``url`` on a new event loop."""
+
+    async def gather() -> None:
+        async with AsyncAllegroApiClient(
+            "benchmark", base_url=url, pool_size=concurrency, concurrency=concurrency
+        ) as client:
+            await asyncio.gather(*map(client.get_orders, offsets))
+
+    asyncio.run(gather())
+
+
+def git_commit() -> str | None:
+    """Return the checked out commit hash, if available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_file: str, new_file: str) -> None:
+    """Print the relative change of best timings between two result files."""
+    with open(old_file, encoding="utf-8") as handle:
+        old = {(r["name"], r["size"]): r for r in json.load(handle)["results"]}
+    with open(new_file, encoding="utf-8") as handle:
+        new = json.load(handle)["results"]
+    for record in new:
+        before = old.get((record["name"], record["size"]))
+        change = (
+            f"{(record['best'] / before['best'] - 1) * 100:+7.1f}%"
+            if before and before["best"]
+            else "    new"
+        )
+        print(
+            f"{record['name']:<30} {record['size']:>8} "
+            f"{record['best'] * 1000:10.1f} ms {change}"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the selected benchmarks and write their results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=[
+            "parsing",
+            "matching",
+            "log_db",
+            "log_history",
+            "worker",
+            "http_concurrency",
+        ],
+        help="run only the selected benchmarks",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="skip the 100k matching case and log a month instead of a year",
+    )
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    match_sizes = MATCH_SIZES[:-1] if args.quick else MATCH_SIZES
+    suites: dict[str, Callable[[], list[dict[str, Any]]]] = {
+        "parsing": lambda: bench_parsing(args.repeat),
+        "matching": lambda: bench_matching(args.repeat, match_sizes),
+        "log_db": lambda: bench_log_db(args.repeat),
+        "log_history": lambda: bench_log_history(
+            args.repeat, HISTORY_RUNS // 12 if args.quick else HISTORY_RUNS
+        ),
+        "worker": lambda: bench_worker(args.repeat, args.latency, args.error_rate),
+        "http_concurrency": lambda: bench_http_concurrency(args.repeat, args.latency),
+    }
+    results: list[dict[str, Any]] = []
+    for name, suite in suites.items():
+        if args.only and name not in args.only:
+            continue
+        for record in suite():
+            print(
+                f"{record['name']:<30} {record['size']:>8} "
+                f"{record['best'] * 1000:10.1f} ms"
+            )
+            results.append(record)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "orjson": fastjson.HAS_ORJSON,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Local HTTP stand-in for the Allegro and Firefly III APIs used by benchmarks.
+
+Run with ``python -m benchmarks.standin --orders 2000`` and point the worker
+at it with ``ALLEGRO_API_URL`` and ``FIREFLY_URL``.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.datagen import firefly_page, firefly_transactions, orders_payload
+
+_TX_PATH = re.compile(r"^/api/v1/transactions/(\d+)$")
+
+
+class StandIn:  # pylint: disable=too-many-instance-attributes
+    """Serve synthetic ``myorder-api`` and Firefly III transaction endpoints.
+
+    Every request is delayed by ``latency`` seconds and answered with
+    ``503 Service Unavailable`` with probability ``error_rate``.
+    """
+
+    def __init__(
+        self,
+        orders: dict[str, Any],
+        transactions: list[dict[str, Any]],
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        """Bind the stand-in to synthetic ``orders`` and ``transactions``."""
+        self.orders = orders["orderGroups"]
+        self.transactions = transactions
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self._by_id = {tx["id"]: tx for tx in transactions}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    @classmethod
+    def synthetic(cls, orders: int, seed: int = 0, **kwargs: Any) -> "StandIn":
+        """Create a stand-in serving ``orders`` generated order groups."""
+        payload = orders_payload(orders, seed=seed)
+        return cls(payload, firefly_transactions(payload, seed=seed), **kwargs)
+
+    @property
+    def url(self) -> str:
+        """Return the base URL of the running server."""
+        if self._server is None:
+            raise RuntimeError("Stand-in is not running")
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "StandIn":
+        """Start serving in a background thread."""
+        self._server = _Server((host, port), _handler(self))
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """Shut the server down."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    def count_not_modified(self) -> None:
+        """Count a conditional request answered with ``304 Not Modified``."""
+        with self._lock:
+            self.not_modified += 1
+
+    def should_fail(self) -> bool:
+        """Count a request and return ``True`` if it gets an injected error."""
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.error_rate
+            self.errors += fail
+            return fail
+
+    def orders_page(self, query: dict[str, list[str]]) -> dict[str, Any]:
+        """Return a ``myorder-api/myorders`` page for ``limit`` and ``offset``."""
+        limit = int(query.get("limit", ["25"])[0])
+        offset = int(query.get("offset", ["0"])[0])
+        return {"orderGroups": self.orders[offset : offset + limit]}
+
+    def transactions_page(self, query: dict[str, list[str]]) -> dict[str, Any]:
+        """Return a Firefly III transaction page filtered by ``start``/``end``."""
+        start = query.get("start", [""])[0]
+        end = query.get("end", ["9999"])[0]
+        selected = [
+            tx
+            for tx in self.transactions
+            if start <= tx["attributes"]["transactions"][0]["date"][:10] <= end
+        ]
+        return firefly_page(
+            selected,
+            int(query.get("page", ["1"])[0]),
+            int(query.get("limit", ["50"])[0]),
+        )
+
+    def transaction(self, tx_id: str) -> Any:
+        """Return a single Firefly III transaction response."""
+        tx = self._by_id.get(tx_id)
+        return None if tx is None else {"data": tx}
+
+    def update_transaction(self, tx_id: str, body: dict[str, Any]) -> Any:
+        """Apply the tags and notes of a Firefly III update and return it."""
+        tx = self._by_id.get(tx_id)
+        if tx is None:
+            return None
+        split = tx["attributes"]["transactions"][0]
+        for change in body.get("transactions", []):
+            for key in ("tags", "notes"):
+                if key in change:
+                    split[key] = change[key]
+        return {"data": tx}
+
+
+class _Server(ThreadingHTTPServer):
+    """Threading server accepting bursts of concurrent connections."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def _handler(standin: StandIn) -> type[BaseHTTPRequestHandler]:
+    """Return a request handler class bound to ``standin``."""
+
+    class Handler(BaseHTTPRequestHandler):
+        """Route requests to the stand-in."""
+
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; avoid delayed-ACK stalls
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args: Any) -> None:  # pylint: disable=arguments-differ
+            """Keep benchmark output quiet."""
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """Serve order and transaction reads."""
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if self._injected_error():
+                return
+            if url.path == "/myorder-api/myorders":
+                self._send(standin.orders_page(query), etag=True)
+            elif url.path == "/users":
+                self._send({"accounts": {"allegro": {"login": "benchmark"}}}, etag=True)
+            elif url.path == "/api/v1/transactions":
+                self._send(standin.transactions_page(query))
+            elif match := _TX_PATH.match(url.path):
+                self._send(standin.transaction(match[1]))
+            else:
+                self._send(None)
+
+        def do_PUT(self) -> None:  # pylint: disable=invalid-name
+            """Serve transaction updates."""
+            length = int(self.headers.get("Content-Length", "0"))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self._injected_error():
+                return
+            match = _TX_PATH.match(urlsplit(self.path).path)
+            self._send(
+                None if match is None else standin.update_transaction(match[1], body)
+            )
+
+        def do_POST(self) -> None:  # pylint: disable=invalid-name
+            """Serve transaction updates sent with POST."""
+            self.do_PUT()
+
+        def _injected_error(self) -> bool:
+            """Sleep for the configured latency and maybe answer with 503."""
+            if standin.latency:
+                time.sleep(standin.latency)
+            if not standin.should_fail():
+                return False
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return True
+
+        def _send(self, payload: Any, etag: bool = False) -> None:
+            """Write ``payload`` as JSON, or 404 if it is ``None``.
+
+            With ``etag`` set the response carries an ``ETag`` and a matching
+            ``If-None-Match`` is answered with ``304 Not Modified``.
+            """
+            body = json.dumps(payload).encode()
+            tag = f'"{hashlib.sha1(body).hexdigest()}"' if etag else None
+            if tag is not None and self.headers.get("If-None-Match") == tag:
+                standin.count_not_modified()
+                self.send_response(304)
+                self.send_header("ETag", tag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(404 if payload is None else 200)
+            if tag is not None:
+                self.send_header("ETag", tag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def main() -> None:
+    """Serve a synthetic data set until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    standin = StandIn.synthetic(
+        args.orders, seed=args.seed, latency=args.latency, error_rate=args.error_rate
+    ).start(port=args.port)
+    print(f"Serving {args.orders} orders on {standin.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
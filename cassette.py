@@ -0,0 +1,219 @@
+"""Record and replay HTTP traffic to reproduce worker runs offline.
+
+A cassette is a gzip-compressed JSON Lines file with one request/response
+pair per line. Cookies, tokens and the Allegro session id are removed before
+anything is written.
+"""
+
+import base64
+import gzip
+import json
+import re
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+import requests  # type: ignore[import-untyped]
+from requests.adapters import HTTPAdapter  # type: ignore[import-untyped]
+from requests.structures import CaseInsensitiveDict  # type: ignore[import-untyped]
+
+RECORD = "record"
+REPLAY = "replay"
+
+# Headers never written to a cassette
+SENSITIVE_HEADERS = frozenset({"authorization", "cookie", "set-cookie", "x-api-key"})
+
+_SESSION_ID = re.compile(r"(QXLSESSID=)[^;\s\"']+")
+_BEARER = re.compile(r"(Bearer\s+)[\w.~+/=-]+", re.IGNORECASE)
+
+
+@dataclass
+class _Active:
+    """Cassette of the enclosing :func:`use_cassette` block."""
+
+    cassette: "Cassette | None" = None
+
+
+_ACTIVE = _Active()
+
+
+class CassetteMiss(requests.RequestException):  # type: ignore[misc]
+    """Raised in replay mode for a request missing from the cassette."""
+
+
+def sanitize(text: str) -> str:
+    """Mask session ids and bearer tokens in ``text``."""
+    return _BEARER.sub(r"\1***", _SESSION_ID.sub(r"\1***", text))
+
+
+def _headers(headers: Any) -> dict[str, str]:
+    """Return ``headers`` without credentials."""
+    return {
+        key: sanitize(str(value))
+        for key, value in (headers or {}).items()
+        if key.lower() not in SENSITIVE_HEADERS
+    }
+
+
+def _encode(body: bytes | str | None) -> dict[str, str] | None:
+    """Return a JSON friendly form of a request or response body."""
+    if body is None:
+        return None
+    if isinstance(body, str):
+        return {"text": sanitize(body)}
+    try:
+        return {"text": sanitize(body.decode("utf-8"))}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+def _decode(body: dict[str, str] | None) -> bytes:
+    """Return the bytes of a body stored by :func:`_encode`."""
+    if not body:
+        return b""
+    if "base64" in body:
+        return base64.b64decode(body["base64"])
+    return body["text"].encode("utf-8")
+
+
+class Cassette:  # pylint: disable=too-many-instance-attributes
+    """HTTP traffic recorder and player hooked into ``requests`` adapters.
+
+    Replay matches requests by method and URL, answering repeated requests
+    in recorded order and with the last response once they run out, so runs
+    of code changed since the recording still replay. A replayed cassette
+    keeps the time of its first recorded request in ``recorded_at``.
+    """
+
+    def __init__(self, path: str, mode: str) -> None:
+        """Open ``path`` for ``mode`` (:data:`RECORD` or :data:`REPLAY`)."""
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.interactions = 0
+        self.recorded_at: datetime | None = None
+        self._lock = threading.Lock()
+        self._responses: dict[tuple[str, str], deque[dict[str, Any]]] = defaultdict(
+            deque
+        )
+        self._last: dict[tuple[str, str], dict[str, Any]] = {}
+        self._file: Any = None
+        if mode == RECORD:
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+        else:
+            self._load()
+
+    def _load(self) -> None:
+        """Read recorded interactions into per-request queues."""
+        with gzip.open(self.path, "rt", encoding="utf-8") as handle:
+            for line in handle:
+                entry = json.loads(line)
+                if self.recorded_at is None:
+                    self.recorded_at = datetime.fromisoformat(entry["recorded_at"])
+                request = entry["request"]
+                self._responses[(request["method"], request["url"])].append(
+                    entry["response"]
+                )
+                self.interactions += 1
+
+    def record(self, request: Any, response: Any) -> None:
+        """Append a finished request and its response to the cassette."""
+        entry = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "request": {
+                "method": request.method,
+                "url": sanitize(request.url),
+                "headers": _headers(request.headers),
+                "body": _encode(request.body),
+            },
+            "response": {
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": _headers(response.headers),
+                "body": _encode(response.content),
+                "elapsed": response.elapsed.total_seconds(),
+            },
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.interactions += 1
+
+    def play(self, request: Any) -> Any:
+        """Return the recorded response for ``request``."""
+        key = (request.method, sanitize(request.url))
+        with self._lock:
+            queue = self._responses.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            recorded = self._last.get(key)
+        if recorded is None:
+            raise CassetteMiss(
+                f"{request.method} {request.url} not found in {self.path}",
+                request=request,
+            )
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded["reason"]
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response._content = _decode(  # pylint: disable=protected-access
+            recorded["body"]
+        )
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def snapshot_path(self, name: str) -> str:
+        """Return the path of the log database snapshot of profile ``name``.
+
+        Recorded runs save the database they start from next to the cassette,
+        so replays start from the same state.
+        """
+        return f"{self.path}.{name}.db"
+
+    def close(self) -> None:
+        """Flush and close a cassette being recorded."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+@contextmanager
+def use_cassette(path: str, mode: str) -> Iterator[Cassette]:
+    """Record or replay all ``requests`` traffic in the block."""
+    cassette = Cassette(path, mode)
+    original_send = HTTPAdapter.send
+
+    def send(adapter: HTTPAdapter, request: Any, *args: Any, **kwargs: Any) -> Any:
+        if cassette.mode == REPLAY:
+            return cassette.play(request)
+        response = original_send(adapter, request, *args, **kwargs)
+        cassette.record(request, response)
+        return response
+
+    setattr(HTTPAdapter, "send", send)
+    _ACTIVE.cassette = cassette
+    try:
+        yield cassette
+    finally:
+        _ACTIVE.cassette = None
+        setattr(HTTPAdapter, "send", original_send)
+        cassette.close()
+
+
+def active_cassette() -> Cassette | None:
+    """Return the cassette recording or replaying traffic, if any."""
+    return _ACTIVE.cassette
+
+
+def now() -> datetime:
+    """Return the current UTC time, frozen at the recording while replaying."""
+    cassette = _ACTIVE.cassette
+    if cassette is not None and cassette.recorded_at is not None:
+        return cassette.recorded_at
+    return datetime.now(timezone.utc)
@@ -1,75 +1,587 @@
 """Utility functions for persisting and retrieving matching logs in SQLite."""
 
+import hashlib
 import json
+import os
 import sqlite3
-from datetime import datetime
-from typing import Any
+import zlib
+from datetime import datetime, timedelta, timezone
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, Iterable
 
-import pandas as pd
-
-from processor_gui import TxMatchResult
+if TYPE_CHECKING:
+    from processor_gui import TxMatchResult
 
 DB_FILE = "log.db"
 
+# Version of the schema created by init_db, stored in ``PRAGMA user_version``
+SCHEMA_VERSION = 3
+
+_UPSERT_MATCHED_TX = (
+    "INSERT INTO matched_tx (tx_id, tx_date, tx_amount, matched_count, "
+    "applied, match_date, details_hash, attempts, first_seen) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?) "
+    "ON CONFLICT(tx_id) DO UPDATE SET tx_date = excluded.tx_date, "
+    "tx_amount = excluded.tx_amount, matched_count = excluded.matched_count, "
+    "applied = excluded.applied, match_date = excluded.match_date, "
+    "details_hash = excluded.details_hash, attempts = attempts + 1"
+)
+# Attempts repeating the latest state only bump ``matched_tx.attempts``
+_INSERT_MATCH_ATTEMPT = (
+    "INSERT INTO match_attempt (tx_id, match_date, matched_count, applied, "
+    "details_hash) SELECT :tx_id, :match_date, :matched_count, :applied, "
+    ":details_hash WHERE NOT EXISTS (SELECT 1 FROM matched_tx WHERE "
+    "tx_id = :tx_id AND matched_count = :matched_count AND applied = :applied "
+    "AND details_hash = :details_hash)"
+)
+_INSERT_MATCH_DETAIL = "INSERT OR IGNORE INTO match_detail (hash, body) VALUES (?, ?)"
+_UPSERT_CHECKPOINT = (
+    "INSERT INTO tx_checkpoint (tx_id, fingerprint, evaluated_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(tx_id) DO UPDATE SET fingerprint = excluded.fingerprint, "
+    "evaluated_at = excluded.evaluated_at"
+)
+_UPSERT_STATE = (
+    "INSERT INTO worker_state (key, value) VALUES (?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+)
+_INSERT_APPLIED_PAYMENT = (
+    "INSERT OR REPLACE INTO applied_payment (payment_id, tx_id, applied_at) "
+    "VALUES (?, ?, ?)"
+)
+_BUMP_LOG_VERSION = (
+    "INSERT INTO worker_state (key, value) VALUES ('log_version', '1') "
+    "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+)
+
+# Per-attempt ``matched_tx`` table of the original log, migrated by init_db
+LEGACY_SCHEMA = """
+CREATE TABLE matched_tx (id INTEGER PRIMARY KEY, tx_id TEXT, tx_date TEXT,
+    tx_amount REAL, matched_count INTEGER, applied INTEGER, match_date TEXT,
+    details TEXT);
+CREATE INDEX idx_matched_tx_match_date ON matched_tx (match_date);
+CREATE INDEX idx_matched_tx_tx_id ON matched_tx (tx_id);
+"""
+
+# Cursor of a match history page: ``(match_date, id)`` of its last row
+LogCursor = tuple[str, int]
+
+
+def connect(db_file: str | None = None) -> sqlite3.Connection:
+    """Open a long-lived connection to the log database in WAL mode."""
+    conn = sqlite3.connect(db_file or DB_FILE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def copy_db(source: str, target: str) -> None:
+    """Copy the log database ``source`` to ``target`` if ``source`` exists.
 
-def init_db() -> None:
-    """Create the SQLite database and ``matched_tx`` table if they do not exist."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+    The SQLite backup API copies a consistent state even while the source is
+    written in WAL mode.
+    """
+    if not os.path.exists(source):
+        return
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def init_db(conn: sqlite3.Connection | None = None) -> None:
+    """Create missing tables of the log database, migrating older schemas."""
+    db = conn or connect()
+    try:
+        _create_tables(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        if conn is None:
+            db.close()
+
+
+def _create_tables(db: sqlite3.Connection) -> None:
+    """Create missing tables, migrating older ``matched_tx`` and ``match_attempt``."""
+    legacy = _has_legacy_log(db)
+    rowid_attempts = _has_rowid_attempts(db)
+    if legacy or rowid_attempts:
+        # DDL does not open a transaction implicitly, the migration is atomic
+        db.execute("BEGIN IMMEDIATE")
+    if legacy:
+        db.execute("ALTER TABLE matched_tx RENAME TO matched_tx_legacy")
+        db.execute("DROP INDEX IF EXISTS idx_matched_tx_match_date")
+        db.execute("DROP INDEX IF EXISTS idx_matched_tx_tx_id")
+    if rowid_attempts:
+        db.execute("ALTER TABLE match_attempt RENAME TO match_attempt_v2")
+        db.execute("DROP INDEX IF EXISTS idx_match_attempt_tx_id")
+    c = db.cursor()
+    # Latest state of every logged transaction
     c.execute(
         '''CREATE TABLE IF NOT EXISTS matched_tx (
             id INTEGER PRIMARY KEY,
-            tx_id TEXT,
+            tx_id TEXT UNIQUE,
             tx_date TEXT,
             tx_amount REAL,
             matched_count INTEGER,
             applied INTEGER,
             match_date TEXT,
-            details TEXT
+            details_hash BLOB,
+            attempts INTEGER,
+            first_seen TEXT
+        )'''
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_matched_tx_match_date "
+        "ON matched_tx (match_date)"
+    )
+    # Changes of the logged state, details are stored once in match_detail;
+    # ids are never reused, exports resume after the last exported one
+    c.execute(
+        '''CREATE TABLE IF NOT EXISTS match_attempt (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_id TEXT,
+            match_date TEXT,
+            matched_count INTEGER,
+            applied INTEGER,
+            details_hash BLOB
+        )'''
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_match_attempt_tx_id "
+        "ON match_attempt (tx_id, match_date)"
+    )
+    c.execute(
+        '''CREATE TABLE IF NOT EXISTS match_detail (
+            hash BLOB PRIMARY KEY,
+            body BLOB
+        ) WITHOUT ROWID'''
+    )
+    c.execute(
+        '''CREATE TABLE IF NOT EXISTS tx_checkpoint (
+            tx_id TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            evaluated_at TEXT
+        )'''
+    )
+    c.execute(
+        '''CREATE TABLE IF NOT EXISTS worker_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
         )'''
     )
-    conn.commit()
-    conn.close()
+    c.execute(
+        '''CREATE TABLE IF NOT EXISTS applied_payment (
+            payment_id TEXT PRIMARY KEY,
+            tx_id TEXT,
+            applied_at TEXT
+        )'''
+    )
+    c.execute(
+        '''CREATE TABLE IF NOT EXISTS run_metric (
+            run_started_at TEXT,
+            metric TEXT,
+            labels TEXT,
+            value REAL
+        )'''
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_run_metric_run_started_at "
+        "ON run_metric (run_started_at)"
+    )
+    if legacy:
+        _migrate_legacy_log(db)
+    if rowid_attempts:
+        # Keep rowids as ids, export marks stay valid
+        db.execute(
+            "INSERT INTO match_attempt (id, tx_id, match_date, matched_count, "
+            "applied, details_hash) SELECT rowid, tx_id, match_date, "
+            "matched_count, applied, details_hash FROM match_attempt_v2 "
+            "ORDER BY rowid"
+        )
+        db.execute("DROP TABLE match_attempt_v2")
+    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _has_legacy_log(db: sqlite3.Connection) -> bool:
+    """Return whether ``matched_tx`` still has one row per attempt."""
+    columns = {row[1] for row in db.execute("PRAGMA table_info(matched_tx)")}
+    return "details" in columns
+
+
+def _has_rowid_attempts(db: sqlite3.Connection) -> bool:
+    """Return whether ``match_attempt`` predates its ``id`` column."""
+    columns = {row[1] for row in db.execute("PRAGMA table_info(match_attempt)")}
+    return bool(columns) and "id" not in columns
+
+
+def _migrate_legacy_log(db: sqlite3.Connection) -> None:
+    """Fold the per-attempt ``matched_tx_legacy`` rows into the current tables."""
+    rows = db.execute(
+        "SELECT tx_id, tx_date, tx_amount, matched_count, applied, match_date, "
+        "details FROM matched_tx_legacy ORDER BY id"
+    )
+    details: dict[bytes, bytes | str] = {}
+    for tx_id, tx_date, amount, count, applied, match_date, raw in rows:
+        text = _normalize_details(raw)
+        digest = _details_hash(text)
+        if digest not in details:
+            details[digest] = _compress(text)
+        db.execute(
+            _INSERT_MATCH_ATTEMPT, _attempt(tx_id, match_date, count, applied, digest)
+        )
+        db.execute(
+            _UPSERT_MATCHED_TX,
+            (tx_id, tx_date, amount, count, applied, match_date, digest, match_date),
+        )
+    db.executemany(_INSERT_MATCH_DETAIL, details.items())
+    db.execute("DROP TABLE matched_tx_legacy")
+
+
+def _normalize_details(text: str | None) -> str:
+    """Return legacy ``details`` JSON re-encoded like :class:`LogWriter` does."""
+    try:
+        return json.dumps(json.loads(text or "null"), ensure_ascii=False)
+    except ValueError:
+        return text or "null"
+
+
+def _attempt(
+    tx_id: str, match_date: str, matched_count: int, applied: int, details_hash: bytes
+) -> dict[str, Any]:
+    """Return parameters of :data:`_INSERT_MATCH_ATTEMPT`."""
+    return {
+        "tx_id": tx_id,
+        "match_date": match_date,
+        "matched_count": matched_count,
+        "applied": applied,
+        "details_hash": details_hash,
+    }
+
+
+def _details_hash(text: str) -> bytes:
+    """Return the content hash ``details`` are deduplicated by."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _compress(text: str) -> bytes | str:
+    """Return ``details`` JSON compressed, or as is if that is not smaller."""
+    raw = text.encode("utf-8")
+    packed = zlib.compress(raw, 6)
+    return packed if len(packed) < len(raw) else text
+
+
+def decompress_details(body: bytes | str | None) -> str | None:
+    """Return the ``details`` JSON stored by :class:`LogWriter`."""
+    if isinstance(body, bytes):
+        return zlib.decompress(body).decode("utf-8")
+    return body
+
+
+def _log_row(
+    tx: "TxMatchResult", match_count: int, applied: bool, details_hash: bytes
+) -> tuple[Any, ...]:
+    """Return ``matched_tx`` column values for a processed transaction."""
+    now = datetime.now().isoformat()
+    return (
+        str(tx.tx.id),
+        tx.tx.date.isoformat(),
+        tx.tx.amount,
+        match_count,
+        1 if applied else 0,
+        now,
+        details_hash,
+        now,
+    )
+
+
+class LogWriter:
+    """Buffer log rows and commit them in a single transaction.
+
+    Each transaction keeps one ``matched_tx`` row with its latest state and
+    attempt count, and a ``match_attempt`` row whenever that state changes;
+    ``details`` are stored once per distinct content, compressed.
+
+    Usable as a context manager; pending rows are flushed on exit and the
+    connection is closed if the writer opened it.
+    """
+
+    def __init__(
+        self, conn: sqlite3.Connection | None = None, db_file: str | None = None
+    ) -> None:
+        """Bind the writer to ``conn`` or open a new connection to ``db_file``."""
+        self._owns_conn = conn is None
+        self.conn = conn or connect(db_file)
+        self._pending: list[tuple[Any, ...]] = []
+        self._details: dict[bytes, bytes | str] = {}
+        self._checkpoints: list[tuple[str, str, str]] = []
+        self._applied: list[tuple[str, str, str]] = []
+        self._state: dict[str, str] = {}
+
+    def add(
+        self, tx: "TxMatchResult", match_count: int, applied: bool, details: Any
+    ) -> None:
+        """Queue a processed transaction for the next :meth:`flush`."""
+        text = json.dumps(details, ensure_ascii=False)
+        digest = _details_hash(text)
+        if digest not in self._details:
+            self._details[digest] = _compress(text)
+        self._pending.append(_log_row(tx, match_count, applied, digest))
+
+    def checkpoint(self, tx_id: Any, fingerprint: str) -> None:
+        """Queue the fingerprint ``tx_id`` was evaluated with in this run."""
+        self._checkpoints.append((str(tx_id), fingerprint, datetime.now().isoformat()))
+
+    def consume(self, payment_id: str, tx_id: Any) -> None:
+        """Queue ``payment_id`` as applied to transaction ``tx_id``."""
+        self._applied.append((payment_id, str(tx_id), datetime.now().isoformat()))
+
+    def set_state(self, key: str, value: str) -> None:
+        """Queue a ``worker_state`` entry for the next :meth:`flush`."""
+        self._state[key] = value
+
+    def flush(self) -> int:
+        """Write everything queued in one transaction and return the log rows."""
+        rows, self._pending = self._pending, []
+        details, self._details = self._details, {}
+        checkpoints, self._checkpoints = self._checkpoints, []
+        state, self._state = self._state, {}
+        applied, self._applied = self._applied, []
+        if rows or checkpoints or state or applied:
+            with self.conn:
+                self.conn.executemany(_INSERT_MATCH_DETAIL, details.items())
+                self.conn.executemany(
+                    _INSERT_MATCH_ATTEMPT,
+                    (
+                        _attempt(tx_id, match_date, count, applied, digest)
+                        for tx_id, _, _, count, applied, match_date, digest, _ in rows
+                    ),
+                )
+                self.conn.executemany(_UPSERT_MATCHED_TX, rows)
+                self.conn.executemany(_UPSERT_CHECKPOINT, checkpoints)
+                self.conn.executemany(_INSERT_APPLIED_PAYMENT, applied)
+                self.conn.executemany(_UPSERT_STATE, state.items())
+                if rows:
+                    self.conn.execute(_BUMP_LOG_VERSION)
+        return len(rows)
+
+    def close(self) -> None:
+        """Flush pending rows and close an owned connection."""
+        self.flush()
+        if self._owns_conn:
+            self.conn.close()
+
+    def __enter__(self) -> "LogWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+def load_checkpoints(conn: sqlite3.Connection) -> dict[str, str]:
+    """Return the last evaluated fingerprint of every checkpointed transaction."""
+    return dict(conn.execute("SELECT tx_id, fingerprint FROM tx_checkpoint"))
+
+
+def load_applied_payments(conn: sqlite3.Connection) -> set[str]:
+    """Return ids of payments already applied to a Firefly III transaction."""
+    return {row[0] for row in conn.execute("SELECT payment_id FROM applied_payment")}
+
+
+def get_state(conn: sqlite3.Connection, key: str) -> str | None:
+    """Return a ``worker_state`` value or ``None`` if it was never stored."""
+    row = conn.execute(
+        "SELECT value FROM worker_state WHERE key = ?", (key,)
+    ).fetchone()
+    return None if row is None else str(row[0])
+
+
+def prune_log(
+    conn: sqlite3.Connection, retention_days: int, vacuum_ratio: float = 0.25
+) -> dict[str, int]:
+    """Delete log rows older than ``retention_days`` and return deleted counts.
+
+    Attempts, latest states not updated since the cutoff and run metrics are
+    removed together with details no longer referenced. Checkpoints of
+    unapplied transactions whose latest state is removed go with it, so the
+    next run evaluates and logs them again; other checkpoints and applied
+    payments are kept. The file is vacuumed when at least ``vacuum_ratio`` of
+    its pages are free.
+    """
+    now = datetime.now()
+    cutoff = (now - timedelta(days=retention_days)).isoformat()
+    metrics_cutoff = (
+        datetime.now(timezone.utc) - timedelta(days=retention_days)
+    ).isoformat()
+    deleted: dict[str, int] = {}
+    with conn:
+        deleted["tx_checkpoint"] = conn.execute(
+            "DELETE FROM tx_checkpoint WHERE tx_id IN (SELECT tx_id FROM "
+            "matched_tx WHERE match_date < ? AND applied = 0)",
+            (cutoff,),
+        ).rowcount
+        for table, column, bound in (
+            ("match_attempt", "match_date", cutoff),
+            ("matched_tx", "match_date", cutoff),
+            ("run_metric", "run_started_at", metrics_cutoff),
+        ):
+            deleted[table] = conn.execute(
+                f"DELETE FROM {table} WHERE {column} < ?", (bound,)
+            ).rowcount
+        deleted["match_detail"] = conn.execute(
+            "DELETE FROM match_detail WHERE hash NOT IN ("
+            "SELECT details_hash FROM matched_tx "
+            "UNION SELECT details_hash FROM match_attempt)"
+        ).rowcount
+        conn.execute(_UPSERT_STATE, ("last_prune", now.isoformat()))
+        if deleted["matched_tx"] or deleted["match_attempt"]:
+            conn.execute(_BUMP_LOG_VERSION)
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if pages and free / pages >= vacuum_ratio:
+        conn.execute("VACUUM")
+        deleted["vacuumed_pages"] = free
+    return deleted
+
+
+def log_matched_transactions(
+    entries: Iterable[tuple["TxMatchResult", int, bool, Any]],
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    """Persist many processed transactions in a single transaction."""
+    with LogWriter(conn) as writer:
+        for tx, match_count, applied, details in entries:
+            writer.add(tx, match_count, applied, details)
+        return writer.flush()
 
 
 def log_matched_transaction(
-    tx: TxMatchResult, match_count: int, applied: bool, details: Any
+    tx: "TxMatchResult", match_count: int, applied: bool, details: Any
 ) -> None:
     """Persist information about a processed transaction in the log database."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        (
-            "INSERT INTO matched_tx (tx_id, tx_date, tx_amount, matched_count, "
-            "applied, match_date, details) VALUES (?, ?, ?, ?, ?, ?, ?)"
-        ),
+    log_matched_transactions([(tx, match_count, applied, details)])
+
+
+def log_run_metrics(
+    conn: sqlite3.Connection,
+    run_started_at: str,
+    samples: Iterable[tuple[str, dict[str, str], float]],
+) -> None:
+    """Persist ``(metric, labels, value)`` samples of one worker run."""
+    rows = [
         (
-            tx.tx.id,
-            tx.tx.date.isoformat(),
-            tx.tx.amount,
-            match_count,
-            1 if applied else 0,
-            datetime.now().isoformat(),
-            json.dumps(details),
-        ),
-    )
-    conn.commit()
-    conn.close()
+            run_started_at,
+            metric,
+            ",".join(f"{key}={val}" for key, val in sorted(labels.items())),
+            value,
+        )
+        for metric, labels, value in samples
+    ]
+    with conn:
+        conn.executemany(
+            "INSERT INTO run_metric (run_started_at, metric, labels, value) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
 
 
-def load_matched_log(limit: int = 50) -> Any:
-    """Return recent matching records as a pandas ``DataFrame``."""
+def get_log_version(conn: sqlite3.Connection | None = None) -> int:
+    """Return a counter increased whenever the match history changes.
+
+    Readers use it to invalidate cached query results. Checkpoints, state
+    and run metrics written without new ``matched_tx`` or ``match_attempt``
+    rows leave it unchanged.
+    """
+    db = conn or sqlite3.connect(DB_FILE)
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = None
+        row = db.execute(
+            "SELECT value FROM worker_state WHERE key = 'log_version'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        if conn is None:
+            db.close()
+    return 0 if row is None else int(row[0])
+
+
+def last_run_started_at(conn: sqlite3.Connection) -> str | None:
+    """Return the start time of the newest run with stored metrics."""
+    try:
+        row = conn.execute("SELECT MAX(run_started_at) FROM run_metric").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return None if row[0] is None else str(row[0])
+
+
+def load_run_metrics(runs: int = 50, conn: sqlite3.Connection | None = None) -> Any:
+    """Return samples of the last ``runs`` worker runs as a pandas ``DataFrame``."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    try:
+        db = conn or sqlite3.connect(DB_FILE)
         try:
-            df = pd.read_sql(
-                "SELECT * FROM matched_tx ORDER BY match_date DESC LIMIT ?",
-                conn,
-                params=(limit,),
+            return pd.read_sql(
+                "SELECT * FROM run_metric WHERE run_started_at IN ("
+                "SELECT DISTINCT run_started_at FROM run_metric "
+                "ORDER BY run_started_at DESC LIMIT ?) ORDER BY run_started_at",
+                db,
+                params=(runs,),
             )
         finally:
-            conn.close()
-        return df
-    except ValueError:
+            if conn is None:
+                db.close()
+    except (ValueError, pd.errors.DatabaseError):
         return None
+
+
+def load_matched_log_page(
+    after: LogCursor | None = None,
+    limit: int = 50,
+    conn: sqlite3.Connection | None = None,
+) -> tuple[Any, LogCursor | None]:
+    """Return a page of matching records, newest first, and the next cursor.
+
+    Pages are read with keyset pagination starting after the ``after``
+    cursor, so deep pages cost the same as the first one. The returned
+    cursor is ``None`` on the last page.
+    """
+    # pandas is only needed by the GUI, keep it off the worker's import path
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    db = conn or sqlite3.connect(DB_FILE)
+    where = "" if after is None else "WHERE (m.match_date, m.id) < (?, ?) "
+    try:
+        df = pd.read_sql(
+            "SELECT m.id, m.tx_id, m.tx_date, m.tx_amount, m.matched_count, "
+            "m.applied, m.match_date, m.attempts, m.first_seen, d.body AS details "
+            "FROM matched_tx m LEFT JOIN match_detail d ON d.hash = m.details_hash "
+            f"{where}ORDER BY m.match_date DESC, m.id DESC LIMIT ?",
+            db,
+            params=(*(after or ()), limit + 1),
+        )
+    except (ValueError, pd.errors.DatabaseError):
+        return None, None
+    finally:
+        if conn is None:
+            db.close()
+    df["details"] = df["details"].map(decompress_details)
+    if len(df) <= limit:
+        return df, None
+    df = df.iloc[:limit]
+    last = df.iloc[-1]
+    return df, (str(last["match_date"]), int(last["id"]))
+
+
+def load_matched_log(limit: int = 50) -> Any:
+    """Return recent matching records as a pandas ``DataFrame``."""
+    return load_matched_log_page(limit=limit)[0]
@@ -0,0 +1,380 @@
+"""Index-backed matching of Firefly transactions against Allegro payments."""
+
+import hashlib
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Sequence
+
+from fireflyiii_enricher_core.firefly_client import SimplifiedItem
+
+from allegro_api.const import MATCH_WINDOW_DAYS
+from allegro_api.get_order_result import SimplifiedPayment
+
+# Widest amount difference, in cents, accepted by ``compare_amount``.
+AMOUNT_TOLERANCE_CENTS = 1
+
+# Number of transactions above which the vectorized batch matcher is used.
+# It saves about 2 us per transaction over the index, which pays for the
+# ~75 ms NumPy import from about 40k transactions; with NumPy already
+# imported it is faster from a few hundred.
+BATCH_MATCH_THRESHOLD = 40_000
+BATCH_MATCH_THRESHOLD_LOADED = 300
+
+# Closest payments searched for a combined charge of one transaction.
+SUBSET_MAX_CANDIDATES = 20
+
+# Most payments accepted in one combined charge.
+SUBSET_MAX_SIZE = 3
+
+# Widest difference, in cents, between a combined charge and its payments.
+# Exact sums keep coincidental combinations rare.
+SUBSET_TOLERANCE_CENTS = 0
+
+# Seconds spent searching combined charges for one transaction.
+SUBSET_TIME_LIMIT = 0.05
+
+
+def to_cents(amount: float) -> int:
+    """Return absolute ``amount`` rounded to whole cents."""
+    return abs(round(amount * 100))
+
+
+def match_fingerprint(
+    tx: SimplifiedItem,
+    matches: Sequence[SimplifiedPayment],
+    resolved: SimplifiedPayment | None = None,
+) -> str:
+    """Return a digest of ``tx``, its candidates and the payment resolved for it.
+
+    Equal fingerprints across runs mean the matching inputs did not change.
+    """
+    parts = [f"{tx.date.isoformat()}|{to_cents(tx.amount)}"]
+    parts.extend(
+        sorted(
+            f"{p.payment_id}|{p.date.isoformat()}|{to_cents(p.amount)}" for p in matches
+        )
+    )
+    if resolved is not None:
+        parts.append(f"=>{resolved.payment_id}")
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+class PaymentIndex:
+    """Payments bucketed by amount in cents and sorted by date in each bucket.
+
+    :meth:`match` returns the same payments, in the same order, as
+    ``TransactionMatcher.match`` run over the full payment list.
+    """
+
+    def __init__(self, payments: Sequence[SimplifiedPayment]) -> None:
+        """Build the index over ``payments``."""
+        self._payments = list(payments)
+        buckets: dict[int, list[tuple[date, int]]] = defaultdict(list)
+        for position, payment in enumerate(self._payments):
+            buckets[to_cents(payment.amount)].append((payment.date, position))
+        self._dates: dict[int, list[date]] = {}
+        self._positions: dict[int, list[int]] = {}
+        for cents, entries in buckets.items():
+            entries.sort()
+            self._dates[cents] = [entry[0] for entry in entries]
+            self._positions[cents] = [entry[1] for entry in entries]
+
+    def __len__(self) -> int:
+        return len(self._payments)
+
+    def candidates(self, tx: SimplifiedItem) -> list[int]:
+        """Return sorted positions of payments close to ``tx`` in amount and date."""
+        cents = to_cents(tx.amount)
+        earliest = tx.date - timedelta(days=MATCH_WINDOW_DAYS)
+        positions: list[int] = []
+        for key in range(
+            cents - AMOUNT_TOLERANCE_CENTS, cents + AMOUNT_TOLERANCE_CENTS + 1
+        ):
+            dates = self._dates.get(key)
+            if not dates:
+                continue
+            start = bisect_left(dates, earliest)
+            end = bisect_right(dates, tx.date)
+            positions.extend(self._positions[key][start:end])
+        positions.sort()
+        return positions
+
+    def match(self, tx: SimplifiedItem) -> list[SimplifiedPayment]:
+        """Return payments matching ``tx``, as ``SimplifiedPayment.compare`` would."""
+        found = (self._payments[position] for position in self.candidates(tx))
+        return [payment for payment in found if payment.compare(tx)]
+
+
+def batch_match(  # pylint: disable=too-many-locals
+    transactions: Sequence[SimplifiedItem],
+    payments: Sequence[SimplifiedPayment],
+) -> list[list[SimplifiedPayment]]:
+    """Match many transactions at once with NumPy.
+
+    Payments are sorted by amount in cents, then by date, so the candidates
+    of every transaction are a few contiguous runs found by binary search.
+    Returns one list of matches per transaction, identical to
+    :meth:`PaymentIndex.match` for the same inputs.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    results: list[list[SimplifiedPayment]] = [[] for _ in transactions]
+    if not transactions or not payments:
+        return results
+
+    pay_cents = np.fromiter(
+        (to_cents(p.amount) for p in payments), dtype=np.int64, count=len(payments)
+    )
+    pay_days = np.fromiter(
+        (p.date.toordinal() for p in payments), dtype=np.int64, count=len(payments)
+    )
+    tx_cents = np.fromiter(
+        (to_cents(t.amount) for t in transactions),
+        dtype=np.int64,
+        count=len(transactions),
+    )
+    tx_days = np.fromiter(
+        (t.date.toordinal() for t in transactions),
+        dtype=np.int64,
+        count=len(transactions),
+    )
+
+    # One sortable key per payment: amount buckets of ``span`` days each
+    span = int(max(pay_days.max(), tx_days.max())) + 1
+    pay_order = np.argsort(pay_cents * span + pay_days, kind="stable")
+    sorted_keys = (pay_cents * span + pay_days)[pay_order]
+
+    hit_rows = []
+    hit_cols = []
+    for offset in range(-AMOUNT_TOLERANCE_CENTS, AMOUNT_TOLERANCE_CENTS + 1):
+        bucket = (tx_cents + offset) * span
+        first = np.searchsorted(
+            sorted_keys, bucket + tx_days - MATCH_WINDOW_DAYS, side="left"
+        )
+        last = np.searchsorted(sorted_keys, bucket + tx_days, side="right")
+        counts = last - first
+        total = int(counts.sum())
+        if not total:
+            continue
+        # Expand every [first, last) run into the sorted positions it covers
+        run_starts = np.repeat(first - np.cumsum(counts) + counts, counts)
+        hit_rows.append(np.repeat(np.arange(len(transactions)), counts))
+        hit_cols.append(pay_order[np.arange(total) + run_starts])
+    if not hit_rows:
+        return results
+
+    rows = np.concatenate(hit_rows)
+    cols = np.concatenate(hit_cols)
+    # Ascending positions keep matches in payment list order
+    order = np.lexsort((cols, rows))
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        payment = payments[col]
+        if payment.compare(transactions[row]):
+            results[row].append(payment)
+    return results
+
+
+@dataclass(frozen=True)
+class Resolution:
+    """Payment assigned to a transaction by :func:`resolve_one_to_one`."""
+
+    payment: SimplifiedPayment
+    forced: bool
+
+
+def resolve_one_to_one(  # pylint: disable=too-many-locals
+    transactions: Sequence[SimplifiedItem],
+    candidates: Sequence[Sequence[SimplifiedPayment]],
+    prefer_closest: bool = True,
+) -> list[Resolution | None]:
+    """Assign each transaction at most one of its candidates, one-to-one.
+
+    A transaction left with a single free candidate is forced to it and the
+    payment is removed from every other transaction, repeatedly. With
+    ``prefer_closest`` the rest is then swept by ascending date gap, pairing
+    a transaction and a payment when each is the other's strictly closest
+    free option. Transactions sharing a sole candidate or tied on the gap
+    are left unassigned (``None``), and so are the payments they compete for.
+    Combined payments found by :class:`SubsetMatcher` are never marked
+    forced, as coincidental sums are much more likely than coincidental
+    single amounts.
+    """
+    options: list[set[int]] = []
+    payments: list[SimplifiedPayment] = []
+    keys: dict[int, int] = {}
+    users: dict[int, set[int]] = defaultdict(set)
+    for row, found in enumerate(candidates):
+        row_options = set()
+        for payment in found:
+            key = keys.setdefault(id(payment), len(payments))
+            if key == len(payments):
+                payments.append(payment)
+            row_options.add(key)
+            users[key].add(row)
+        options.append(row_options)
+
+    assigned: list[int | None] = [None] * len(transactions)
+    blocked: set[int] = set()
+    blocked_payments: set[int] = set()
+
+    def take(row: int, key: int, queue: list[int]) -> None:
+        assigned[row] = key
+        for other in users.pop(key, set()):
+            options[other].discard(key)
+            if other != row and len(options[other]) == 1:
+                queue.append(other)
+
+    def eliminate(queue: list[int]) -> None:
+        while queue:
+            row = queue.pop()
+            if assigned[row] is not None or row in blocked or len(options[row]) != 1:
+                continue
+            (key,) = options[row]
+            if key in blocked_payments:
+                blocked.add(row)
+                continue
+            rivals = {
+                other
+                for other in users[key]
+                if assigned[other] is None and options[other] == {key}
+            }
+            if len(rivals) > 1:
+                blocked.update(rivals)
+                blocked_payments.add(key)
+                continue
+            take(row, key, queue)
+
+    eliminate([row for row, found in enumerate(options) if len(found) == 1])
+    # Only pairs found before any preference is applied are forced
+    forced = {row for row, key in enumerate(assigned) if key is not None}
+    if not prefer_closest:
+        return _resolutions(assigned, forced, payments)
+
+    def gap(row: int, key: int) -> int:
+        return int((transactions[row].date - payments[key].date).days)
+
+    edges = sorted(
+        (gap(row, key), row, key)
+        for row, found in enumerate(options)
+        if assigned[row] is None and row not in blocked
+        for key in found
+    )
+    queue: list[int] = []
+    for days, row, key in edges:
+        if assigned[row] is not None or row in blocked or key not in users:
+            continue
+        # Every closer free option of the transaction was taken by others
+        contested_by = [
+            other
+            for other in users[key]
+            if other != row and assigned[other] is None and gap(other, key) <= days
+        ]
+        tied_payments = [k for k in options[row] if k != key and gap(row, k) == days]
+        if key in blocked_payments or contested_by or tied_payments:
+            blocked.update([row, *contested_by])
+            blocked_payments.update([key, *tied_payments])
+            continue
+        take(row, key, queue)
+    eliminate(queue)
+    return _resolutions(assigned, forced, payments)
+
+
+def _resolutions(
+    assigned: list[int | None], forced: set[int], payments: list[SimplifiedPayment]
+) -> list[Resolution | None]:
+    """Return :class:`Resolution` objects for assigned payment keys."""
+    return [
+        (
+            None
+            if key is None
+            else Resolution(payments[key], row in forced and not payments[key].parts)
+        )
+        for row, key in enumerate(assigned)
+    ]
+
+
+class SubsetMatcher:
+    """Find payments charged together in one transaction by subset-sum search.
+
+    The search runs meet-in-the-middle in integer cents over at most
+    ``max_candidates`` payments closest to the transaction date, and gives up
+    after ``time_limit`` seconds.
+    """
+
+    def __init__(
+        self,
+        payments: Sequence[SimplifiedPayment],
+        max_candidates: int = SUBSET_MAX_CANDIDATES,
+        max_size: int = SUBSET_MAX_SIZE,
+        time_limit: float = SUBSET_TIME_LIMIT,
+    ) -> None:
+        """Index ``payments`` by date."""
+        self._payments = sorted(payments, key=lambda payment: payment.date)
+        self._dates = [payment.date for payment in self._payments]
+        self.max_candidates = max_candidates
+        self.max_size = max_size
+        self.time_limit = time_limit
+
+    def candidates(self, tx: SimplifiedItem) -> list[SimplifiedPayment]:
+        """Return the payments closest to ``tx`` that may be part of its charge."""
+        cents = to_cents(tx.amount)
+        start = bisect_left(self._dates, tx.date - timedelta(days=MATCH_WINDOW_DAYS))
+        end = bisect_right(self._dates, tx.date)
+        found = [
+            payment
+            for payment in self._payments[start:end]
+            if 0 < to_cents(payment.amount) <= cents + SUBSET_TOLERANCE_CENTS
+        ]
+        # Newest first, so a cap keeps the smallest date gaps
+        found.reverse()
+        return found[: self.max_candidates]
+
+    def find(  # pylint: disable=too-many-locals
+        self, tx: SimplifiedItem, limit: int = 2
+    ) -> list[list[SimplifiedPayment]]:
+        """Return up to ``limit`` sets of two or more payments summing to ``tx``.
+
+        An empty list is also returned when the time limit is exceeded.
+        """
+        deadline = time.perf_counter() + self.time_limit
+        found = self.candidates(tx)
+        cents = [to_cents(payment.amount) for payment in found]
+        half = len(cents) // 2
+        left = _subset_sums(cents[:half], 0, deadline)
+        right = _subset_sums(cents[half:], half, deadline)
+        if left is None or right is None:
+            return []
+        right.sort()
+        right_sums = [total for total, _ in right]
+        target = to_cents(tx.amount)
+        results: list[list[SimplifiedPayment]] = []
+        for total, mask in left:
+            start = bisect_left(right_sums, target - total - SUBSET_TOLERANCE_CENTS)
+            end = bisect_right(right_sums, target - total + SUBSET_TOLERANCE_CENTS)
+            for _, other in right[start:end]:
+                size = (mask | other).bit_count()
+                if 2 <= size <= self.max_size:
+                    combined = mask | other
+                    results.append(
+                        [p for bit, p in enumerate(found) if combined >> bit & 1]
+                    )
+                    if len(results) >= limit:
+                        return results
+            if time.perf_counter() > deadline:
+                return []
+        return results
+
+
+def _subset_sums(
+    cents: list[int], offset: int, deadline: float
+) -> list[tuple[int, int]] | None:
+    """Return ``(sum, bitmask)`` of every subset, or ``None`` past ``deadline``."""
+    sums = [(0, 0)]
+    for bit, value in enumerate(cents, start=offset):
+        sums += [(total + value, mask | 1 << bit) for total, mask in sums]
+        if time.perf_counter() > deadline:
+            return None
+    return sums
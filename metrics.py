@@ -0,0 +1,174 @@
+"""Per-run instrumentation of the worker pipeline with OpenMetrics export."""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterator, Sequence
+from urllib.parse import urlsplit
+
+from allegro_api.api import RequestTrace
+
+METRIC_PREFIX = "allegro_firefly"
+
+
+@dataclass
+class StageStats:
+    """Accumulated timings of one pipeline stage."""
+
+    calls: int = 0
+    seconds: float = 0.0
+    items: int = 0
+
+
+class StageTimer:  # pylint: disable=too-few-public-methods
+    """Handle yielded by :meth:`RunMetrics.stage` to report processed items."""
+
+    def __init__(self) -> None:
+        self.items = 0
+
+
+class RunMetrics:  # pylint: disable=too-many-instance-attributes
+    """Thread-safe collector of stage timings, HTTP traffic and match outcomes."""
+
+    def __init__(self) -> None:
+        """Start collecting metrics for a new run."""
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._finished: float | None = None
+        self._lock = threading.Lock()
+        self.stages: dict[str, StageStats] = defaultdict(StageStats)
+        self.http_requests: dict[tuple[str, str], int] = defaultdict(int)
+        self.http_bytes: dict[str, int] = defaultdict(int)
+        self.http_retries: dict[str, int] = defaultdict(int)
+        self.http_cache: dict[tuple[str, str], int] = defaultdict(int)
+        self.match_outcomes: dict[str, int] = {"0": 0, "1": 0, "many": 0}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageTimer]:
+        """Time the wrapped block as one call of stage ``name``."""
+        timer = StageTimer()
+        started = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            self.observe(name, time.perf_counter() - started, timer.items)
+
+    def observe(self, name: str, seconds: float, items: int = 0) -> None:
+        """Record one call of stage ``name``."""
+        with self._lock:
+            stats = self.stages[name]
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.items += items
+
+    def observe_request(self, trace: RequestTrace) -> None:
+        """Record an HTTP request traced by ``ApiWrapper``."""
+        host = urlsplit(trace.url).hostname or ""
+        status = "error" if trace.status is None else str(trace.status)
+        with self._lock:
+            if trace.cache is not None:
+                self.http_cache[(host, trace.cache)] += 1
+                if trace.cache == "hit":
+                    return
+            self.http_requests[(host, status)] += 1
+            self.http_bytes[host] += trace.size
+            self.http_retries[host] += trace.retries
+
+    def observe_matches(self, match_counts: Sequence[int]) -> None:
+        """Record how many transactions had zero, one or many matches."""
+        with self._lock:
+            for count in match_counts:
+                key = "0" if count == 0 else "1" if count == 1 else "many"
+                self.match_outcomes[key] += 1
+
+    def finish(self) -> None:
+        """Mark the run as finished."""
+        self._finished = time.perf_counter()
+
+    @property
+    def duration(self) -> float:
+        """Return run duration in seconds, up to now if still running."""
+        end = self._finished if self._finished is not None else time.perf_counter()
+        return end - self._started
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        """Return ``(metric, labels, value)`` samples of this run."""
+        with self._lock:
+            result: list[tuple[str, dict[str, str], float]] = [
+                ("run_duration_seconds", {}, self.duration),
+                ("last_run_timestamp_seconds", {}, self.started_at.timestamp()),
+            ]
+            for name, stats in sorted(self.stages.items()):
+                labels = {"stage": name}
+                result.append(("stage_duration_seconds", labels, stats.seconds))
+                result.append(("stage_calls", labels, float(stats.calls)))
+                result.append(("stage_items", labels, float(stats.items)))
+            for (host, status), count in sorted(self.http_requests.items()):
+                result.append(
+                    ("http_requests", {"host": host, "status": status}, float(count))
+                )
+            for host, size in sorted(self.http_bytes.items()):
+                result.append(("http_response_bytes", {"host": host}, float(size)))
+            for host, retries in sorted(self.http_retries.items()):
+                result.append(("http_retries", {"host": host}, float(retries)))
+            for (host, cache_result), count in sorted(self.http_cache.items()):
+                result.append(
+                    (
+                        "http_cache_requests",
+                        {"host": host, "result": cache_result},
+                        float(count),
+                    )
+                )
+            for outcome, count in self.match_outcomes.items():
+                result.append(("match_outcomes", {"outcome": outcome}, float(count)))
+            return result
+
+    def to_openmetrics(self) -> str:
+        """Render the run in the Prometheus/OpenMetrics text format."""
+        families: dict[str, list[str]] = defaultdict(list)
+        for metric, labels, value in self.samples():
+            name = f"{METRIC_PREFIX}_{metric}"
+            label_text = ",".join(
+                f'{key}="{_escape(val)}"' for key, val in labels.items()
+            )
+            families[metric].append(
+                f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}"
+            )
+        lines: list[str] = []
+        for metric, samples in families.items():
+            name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {_HELP[metric]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """Atomically write the run for node_exporter's textfile collector."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.write(self.to_openmetrics())
+        os.replace(tmp_path, path)
+
+
+_HELP = {
+    "run_duration_seconds": "Wall-clock duration of the last worker run.",
+    "last_run_timestamp_seconds": "Start time of the last worker run.",
+    "stage_duration_seconds": "Time spent in a worker stage during the last run.",
+    "stage_calls": "Number of times a worker stage ran during the last run.",
+    "stage_items": "Items processed by a worker stage during the last run.",
+    "http_requests": "HTTP requests made during the last run.",
+    "http_response_bytes": "HTTP response bytes received during the last run.",
+    "http_retries": "HTTP request retries during the last run.",
+    "http_cache_requests": "Cached GET requests by hit, revalidated or miss.",
+    "match_outcomes": "Transactions by number of matching payments.",
+}
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,176 @@
+"""SQLite-backed store of Allegro orders persisted across worker runs."""
+
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterable
+
+import log_db
+from allegro_api.get_order_result import Order, Payment
+
+_UPSERT_ORDER = (
+    "INSERT INTO allegro_order (order_id, payment_id, order_date, raw, fetched_at) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(order_id) DO UPDATE SET payment_id = excluded.payment_id, "
+    "order_date = excluded.order_date, raw = excluded.raw, "
+    "fetched_at = excluded.fetched_at"
+)
+_UPSERT_PAYMENT = (
+    "INSERT INTO allegro_payment (payment_id, amount, currency, payment_date, "
+    "order_count) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(payment_id) DO UPDATE SET amount = excluded.amount, "
+    "currency = excluded.currency, payment_date = excluded.payment_date, "
+    "order_count = excluded.order_count"
+)
+
+
+def _utc_iso(value: datetime) -> str:
+    """Return ``value`` as a sortable UTC ISO string."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+class OrderStore:
+    """Orders keyed by ``order_id`` and payments keyed by ``payment_id``."""
+
+    def __init__(self, conn: sqlite3.Connection | None = None) -> None:
+        """Bind the store to ``conn`` or open the log database."""
+        self.conn = conn or log_db.connect()
+
+    def init(self) -> None:
+        """Create store tables if they do not exist."""
+        with self.conn:
+            self.conn.execute(
+                '''CREATE TABLE IF NOT EXISTS allegro_order (
+                    order_id TEXT PRIMARY KEY,
+                    payment_id TEXT NOT NULL,
+                    order_date TEXT NOT NULL,
+                    raw TEXT NOT NULL,
+                    fetched_at TEXT
+                )'''
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_allegro_order_payment_id "
+                "ON allegro_order (payment_id)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_allegro_order_order_date "
+                "ON allegro_order (order_date)"
+            )
+            self.conn.execute(
+                '''CREATE TABLE IF NOT EXISTS allegro_payment (
+                    payment_id TEXT PRIMARY KEY,
+                    amount REAL,
+                    currency TEXT,
+                    payment_date TEXT,
+                    order_count INTEGER
+                )'''
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_allegro_payment_payment_date "
+                "ON allegro_payment (payment_date)"
+            )
+
+    def upsert_orders(self, orders: Iterable[Order]) -> int:
+        """Insert or refresh ``orders`` and their payments in one transaction."""
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        rows = [
+            (
+                order.order_id,
+                order.payment_id,
+                _utc_iso(order.order_date),
+                json.dumps(order.raw),
+                fetched_at,
+            )
+            for order in orders
+        ]
+        if not rows:
+            return 0
+        payment_ids = sorted({row[1] for row in rows})
+        with self.conn:
+            self.conn.executemany(_UPSERT_ORDER, rows)
+            payments = Payment.from_orders(self._select_orders_of(payment_ids))
+            self.conn.executemany(
+                _UPSERT_PAYMENT,
+                [
+                    (
+                        payment.payment_id,
+                        payment.amount,
+                        payment.orders[0].payment_amount.get("currency"),
+                        _utc_iso(payment.orders[0].order_date),
+                        len(payment.orders),
+                    )
+                    for payment in payments
+                ],
+            )
+        return len(rows)
+
+    def newest_order_date(self) -> datetime | None:
+        """Return the date of the newest stored order."""
+        row = self.conn.execute("SELECT MAX(order_date) FROM allegro_order").fetchone()
+        return None if row[0] is None else datetime.fromisoformat(row[0])
+
+    def oldest_open_order_date(self, since: datetime) -> datetime | None:
+        """Return the date of the oldest order since ``since`` not applied yet.
+
+        Orders count as applied once their payment is in ``applied_payment``.
+        """
+        row = self.conn.execute(
+            "SELECT MIN(order_date) FROM allegro_order WHERE order_date >= ? "
+            "AND payment_id NOT IN (SELECT payment_id FROM applied_payment)",
+            (_utc_iso(since),),
+        ).fetchone()
+        return None if row[0] is None else datetime.fromisoformat(row[0])
+
+    def load_orders(self, since: datetime | None = None) -> list[Order]:
+        """Return stored orders placed at or after ``since``, newest first."""
+        query = "SELECT order_id, raw FROM allegro_order"
+        params: tuple[str, ...] = ()
+        if since is not None:
+            query += " WHERE order_date >= ?"
+            params = (_utc_iso(since),)
+        query += " ORDER BY order_date DESC"
+        return [
+            Order(order_id, json.loads(raw))
+            for order_id, raw in self.conn.execute(query, params)
+        ]
+
+    def load_payments(self, since: datetime | None = None) -> list[Payment]:
+        """Return stored payments whose newest order was placed since ``since``.
+
+        Payments are selected by their ``allegro_payment`` date and come with
+        all their orders, including ones placed before ``since``.
+        """
+        query = (
+            "SELECT o.order_id, o.raw FROM allegro_order AS o "
+            "JOIN allegro_payment AS p ON p.payment_id = o.payment_id"
+        )
+        params: tuple[str, ...] = ()
+        if since is not None:
+            query += " WHERE p.payment_date >= ?"
+            params = (_utc_iso(since),)
+        query += " ORDER BY o.order_date DESC"
+        return Payment.from_orders(
+            [
+                Order(order_id, json.loads(raw))
+                for order_id, raw in self.conn.execute(query, params)
+            ]
+        )
+
+    def _select_orders_of(self, payment_ids: list[str]) -> list[Order]:
+        """Return all stored orders belonging to ``payment_ids``."""
+        orders: list[Order] = []
+        # Stay below SQLite's default bound parameter limit
+        for start in range(0, len(payment_ids), 500):
+            chunk = payment_ids[start : start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            orders.extend(
+                Order(order_id, json.loads(raw))
+                for order_id, raw in self.conn.execute(
+                    "SELECT order_id, raw FROM allegro_order "
+                    f"WHERE payment_id IN ({placeholders}) ORDER BY order_date DESC",
+                    chunk,
+                )
+            )
+        return orders
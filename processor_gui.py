@@ -1,20 +1,46 @@
 """Helper utilities for matching transactions within the Streamlit GUI."""
 
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
 from dataclasses import dataclass
-from typing import Any, List, cast
+from datetime import date
+from time import perf_counter
+from typing import Any, Callable, Iterable, Iterator, List
+from urllib.parse import urlencode
 
+import requests  # type: ignore[import-untyped]
 from fireflyiii_enricher_core.firefly_client import (
     FireflyClient,
-    SimplifiedItem,
     SimplifiedTx,
     filter_by_description,
     filter_single_part,
     filter_without_category,
     simplify_transactions,
 )
-from fireflyiii_enricher_core.matcher import TransactionMatcher
 
+from allegro_api.api import ApiWrapper, RequestObserver, RetryPolicy
 from allegro_api.get_order_result import SimplifiedPayment
+from matching import (
+    BATCH_MATCH_THRESHOLD,
+    BATCH_MATCH_THRESHOLD_LOADED,
+    PaymentIndex,
+    Resolution,
+    SubsetMatcher,
+    batch_match,
+    resolve_one_to_one,
+)
+from throttle import TokenBucket
+
+# Default number of transactions updated in parallel by ``apply_matches``.
+APPLY_CONCURRENCY = 4
+
+# Default Firefly III request rate (requests per second) for ``apply_matches``.
+APPLY_RATE_LIMIT = 20.0
+
+# Transactions requested per Firefly III API page.
+FIREFLY_PAGE_SIZE = 500
 
 
 @dataclass
@@ -25,52 +51,223 @@ class TxMatchResult:
     matches: List[SimplifiedPayment]
 
 
+def use_batch_matching(firefly_tx: List[TxMatchResult]) -> bool:
+    """Return ``True`` if ``firefly_tx`` is large enough for batch matching.
+
+    The threshold is lower once NumPy is imported, e.g. by pandas in the GUI.
+    """
+    if "numpy" in sys.modules:
+        return len(firefly_tx) > BATCH_MATCH_THRESHOLD_LOADED
+    return len(firefly_tx) > BATCH_MATCH_THRESHOLD
+
+
 def match_transactions(
     firefly_tx: List[TxMatchResult],
     allegro_orders: List[SimplifiedPayment],
+    batch: bool | None = None,
 ) -> List[TxMatchResult]:
-    """Match Firefly transactions with Allegro payments using ``TransactionMatcher``."""
+    """Match Firefly transactions with Allegro payments.
 
+    Uses a ``PaymentIndex`` per transaction, or the vectorized ``batch_match``
+    when ``batch`` is set; by default :func:`use_batch_matching` decides.
+    """
+
+    if batch is None:
+        batch = use_batch_matching(firefly_tx)
+    if batch:
+        all_matches = batch_match([tx.tx for tx in firefly_tx], allegro_orders)
+        for tx, matches in zip(firefly_tx, all_matches):
+            tx.matches = matches
+        return firefly_tx
+
+    index = PaymentIndex(allegro_orders)
     for tx in firefly_tx:
-        # Cast list of payments to list of items for matching
-        records: List[SimplifiedItem] = cast(List[SimplifiedItem], allegro_orders)
-        raw_matches: List[SimplifiedItem] = TransactionMatcher.match(tx.tx, records)
-        # Cast matches back to payments
-        matches: List[SimplifiedPayment] = cast(List[SimplifiedPayment], raw_matches)
-        tx.matches = matches
+        tx.matches = index.match(tx.tx)
     return firefly_tx
 
 
+def match_combined_payments(
+    firefly_tx: List[TxMatchResult], allegro_orders: List[SimplifiedPayment]
+) -> int:
+    """Match transactions without a direct match to payments charged together.
+
+    Only payments no transaction matched directly are searched. A set of
+    payments is used when it is the only one found for the transaction and
+    no other transaction claims any of them. Returns the number matched.
+    """
+    direct = {id(payment) for tx in firefly_tx for payment in tx.matches}
+    matcher = SubsetMatcher([p for p in allegro_orders if id(p) not in direct])
+    found: list[tuple[TxMatchResult, list[SimplifiedPayment]]] = []
+    claims: dict[int, int] = defaultdict(int)
+    for tx in firefly_tx:
+        if tx.matches:
+            continue
+        subsets = matcher.find(tx.tx)
+        if len(subsets) == 1:
+            found.append((tx, subsets[0]))
+            for payment in subsets[0]:
+                claims[id(payment)] += 1
+    matched = 0
+    for tx, parts in found:
+        if all(claims[id(payment)] == 1 for payment in parts):
+            tx.matches = [SimplifiedPayment.combine(parts)]
+            matched += 1
+    return matched
+
+
+def resolve_matches(
+    firefly_tx: List[TxMatchResult], prefer_closest: bool = True
+) -> List[Resolution | None]:
+    """Resolve matched transactions to distinct payments, see ``resolve_one_to_one``."""
+    return resolve_one_to_one(
+        [tx.tx for tx in firefly_tx],
+        [tx.matches for tx in firefly_tx],
+        prefer_closest=prefer_closest,
+    )
+
+
 class TransactionProcessorGUI:
     """High level logic for fetching and updating Firefly transactions."""
 
-    def __init__(self, firefly_client: FireflyClient, tag: str):
-        """Store a client and tag used when updating transactions."""
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        firefly_client: FireflyClient,
+        tag: str,
+        *,
+        http_observer: RequestObserver | None = None,
+        retry: RetryPolicy | None = None,
+        host_slots: AbstractContextManager[Any] | None = None,
+        session: requests.Session | None = None,
+    ):
+        """Store a client and tag used when updating transactions.
+
+        ``host_slots``, e.g. a semaphore shared with other processors, is
+        held during every Firefly III request. Transaction pages are fetched
+        with ``session``, which the caller closes; without one the processor
+        opens its own, released by :meth:`close`.
+        """
         self.firefly_client = firefly_client
         self.tag = tag
+        self.http_observer = http_observer
+        self.retry = retry
+        self.host_slots = host_slots
+        self._own_session: requests.Session | None = None
+        if session is None:
+            session = self._own_session = requests.Session()
+        self._api = ApiWrapper(session, retry=retry, observer=http_observer)
+
+    def close(self) -> None:
+        """Close the HTTP session opened by the processor, if any."""
+        if self._own_session is not None:
+            self._own_session.close()
+
+    def iter_transaction_pages(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        page_size: int = FIREFLY_PAGE_SIZE,
+    ) -> Iterator[list[dict[str, Any]]]:
+        """Yield raw Firefly III withdrawals between ``start`` and ``end`` by page.
+
+        ``FireflyClient`` only lists all transactions at once, so pages are
+        requested directly using its ``base_url`` and ``headers`` attributes.
+        """
+        params: dict[str, Any] = {"type": "withdrawal", "limit": page_size}
+        if start is not None:
+            params["start"] = start.isoformat()
+        if end is not None:
+            params["end"] = end.isoformat()
+        page = 1
+        while True:
+            params["page"] = page
+            with self._slot():
+                response = self._api.get(
+                    f"{self.firefly_client.base_url}/api/v1/transactions?"
+                    f"{urlencode(params)}",
+                    headers=self.firefly_client.headers,
+                )
+            yield response["data"]
+            total_pages = response["meta"]["pagination"]["total_pages"]
+            if page >= total_pages:
+                return
+            page += 1
+
+    def iter_unmatched_transactions(
+        self,
+        description_filter: str,
+        exact_match: bool = True,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> Iterator[TxMatchResult]:
+        """Yield transactions not yet tagged in Firefly III, filtering page by page."""
+        for raw in self.iter_transaction_pages(start, end):
+            non_categorized = filter_without_category(filter_single_part(raw))
+            allegro_txs = filter_by_description(
+                non_categorized, description_filter, exact_match
+            )
+            for tx in simplify_transactions(allegro_txs):
+                if self.tag not in tx.tags:
+                    yield TxMatchResult(tx=tx, matches=[])
 
     def fetch_unmatched_transactions(
-        self, description_filter: str, exact_match: bool = True
+        self,
+        description_filter: str,
+        exact_match: bool = True,
+        start: date | None = None,
+        end: date | None = None,
     ) -> List[TxMatchResult]:
         """Retrieve transactions not yet tagged in Firefly III."""
-
-        raw = self.firefly_client.fetch_transactions()
-        non_categorized = filter_without_category(filter_single_part(raw))
-        allegro_txs = filter_by_description(
-            non_categorized, description_filter, exact_match
+        return list(
+            self.iter_unmatched_transactions(
+                description_filter, exact_match, start=start, end=end
+            )
         )
 
-        allegro_simplified = simplify_transactions(allegro_txs)
-        allegro_not_processed: list[SimplifiedTx] = []
-        for tx in allegro_simplified:
-            if self.tag not in tx.tags:
-                allegro_not_processed.append(tx)
-        results: List[TxMatchResult] = []
-        for tx in allegro_not_processed:
-            results.append(TxMatchResult(tx=tx, matches=[]))
-        return results
-
-    def apply_match(self, tx_id: int, details: str) -> Any:
+    def apply_match(
+        self, tx_id: int, details: str, limiter: TokenBucket | None = None
+    ) -> Any:
         """Update a Firefly transaction with matching details and tag."""
-        self.firefly_client.update_transaction_notes(tx_id, details)
-        self.firefly_client.add_tag_to_transaction(tx_id, self.tag)
+        if limiter is not None:
+            limiter.acquire()
+        with self._slot():
+            self.firefly_client.update_transaction_notes(tx_id, details)
+        if limiter is not None:
+            limiter.acquire()
+        with self._slot():
+            self.firefly_client.add_tag_to_transaction(tx_id, self.tag)
+
+    def _slot(self) -> AbstractContextManager[Any]:
+        """Return the context held during a single Firefly III request."""
+        return self.host_slots if self.host_slots is not None else nullcontext()
+
+    def apply_matches(
+        self,
+        matches: Iterable[tuple[int, str]],
+        max_workers: int = APPLY_CONCURRENCY,
+        rate_limit: float | None = APPLY_RATE_LIMIT,
+        on_result: Callable[[int, float, Exception | None], None] | None = None,
+    ) -> dict[int, Exception | None]:
+        """Apply many ``(tx_id, details)`` matches concurrently.
+
+        At most ``max_workers`` transactions are updated at once and Firefly
+        requests are throttled to ``rate_limit`` per second. Returns the error
+        raised for each transaction, or ``None`` if it was applied.
+        ``on_result`` is called with the id, duration and error of each one.
+        """
+        limiter = TokenBucket(rate_limit) if rate_limit else None
+
+        def apply_one(match: tuple[int, str]) -> Exception | None:
+            started = perf_counter()
+            error: Exception | None = None
+            try:
+                self.apply_match(match[0], match[1], limiter)
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                error = exc
+            if on_result is not None:
+                on_result(match[0], perf_counter() - started, error)
+            return error
+
+        items = list(matches)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            errors = list(executor.map(apply_one, items))
+        return {tx_id: error for (tx_id, _), error in zip(items, errors)}
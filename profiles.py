@@ -0,0 +1,113 @@
+"""Account profiles reconciled by the worker, from the environment or a TOML file."""
+
+import os
+import re
+import tomllib
+from dataclasses import dataclass, fields
+from typing import Any
+
+import processor_gui
+from allegro_api.const import ALLEGRO_API_URL
+
+TRUE_VALUES = ("1", "true", "yes")
+
+# ``$VAR`` or ``${VAR}`` reference, or ``$$`` standing for a literal ``$``
+_VARIABLE = re.compile(r"\$(?:\$|(\w+)|\{(\w+)\})")
+
+
+@dataclass(frozen=True)
+class Profile:  # pylint: disable=too-many-instance-attributes
+    """Allegro account, Firefly III instance and settings of one reconciliation."""
+
+    name: str
+    tag: str
+    description_filter: str
+    allegro_cookie: str
+    firefly_url: str
+    firefly_token: str
+    allegro_api_url: str = ALLEGRO_API_URL
+    db_file: str = "log.db"
+    max_pages: int = 40
+    apply_concurrency: int = processor_gui.APPLY_CONCURRENCY
+    apply_rate_limit: float = processor_gui.APPLY_RATE_LIMIT
+    auto_apply_closest: bool = False
+    metrics_textfile: str = ""
+    log_retention_days: int = 365
+    export_dir: str = ""
+    allegro_cache: str = ""
+
+    @classmethod
+    def from_env(cls, name: str = "default") -> "Profile":
+        """Return the single profile configured by environment variables."""
+        env = os.environ
+        return cls(
+            name=name,
+            tag=env["TAG"],
+            description_filter=env["DESCRIPTION_FILTER"],
+            allegro_cookie=env["QXLSESSID"],
+            firefly_url=env["FIREFLY_URL"],
+            firefly_token=env["FIREFLY_TOKEN"],
+            allegro_api_url=env.get("ALLEGRO_API_URL", ALLEGRO_API_URL),
+            max_pages=int(env.get("ALLEGRO_MAX_PAGES", "40")),
+            apply_concurrency=int(
+                env.get("APPLY_CONCURRENCY", processor_gui.APPLY_CONCURRENCY)
+            ),
+            apply_rate_limit=float(
+                env.get("APPLY_RATE_LIMIT", processor_gui.APPLY_RATE_LIMIT)
+            ),
+            auto_apply_closest=env.get("AUTO_APPLY_CLOSEST", "").lower() in TRUE_VALUES,
+            metrics_textfile=env.get("METRICS_TEXTFILE", ""),
+            log_retention_days=int(env.get("LOG_RETENTION_DAYS", "365")),
+            export_dir=env.get("EXPORT_DIR", ""),
+            allegro_cache=env.get("ALLEGRO_CACHE", ""),
+        )
+
+
+def load_profiles(path: str) -> list[Profile]:
+    """Return the profiles of a TOML config file.
+
+    Every ``[profiles.<name>]`` table is merged over the optional
+    ``[defaults]`` table; ``$VAR`` and ``${VAR}`` in string values are
+    replaced from the environment so secrets can stay out of the file, and a
+    variable that is not set raises ``ValueError``. ``$$`` stands for ``$``;
+    any other ``$`` is kept as is. Each profile logs to ``log-<name>.db``
+    unless ``db_file`` is set.
+    """
+    with open(path, "rb") as handle:
+        config = tomllib.load(handle)
+    known = {field.name for field in fields(Profile)} - {"name"}
+    defaults = config.get("defaults", {})
+    profiles = []
+    for name, table in config.get("profiles", {}).items():
+        values: dict[str, Any] = {"db_file": f"log-{name}.db", **defaults, **table}
+        unknown = set(values) - known
+        if unknown:
+            raise ValueError(
+                f"Unknown settings in profile {name}: {', '.join(sorted(unknown))}"
+            )
+        values = {
+            key: _expand(name, key, value) if isinstance(value, str) else value
+            for key, value in values.items()
+        }
+        profiles.append(Profile(name=name, **values))
+    if not profiles:
+        raise ValueError(f"No [profiles.<name>] tables in {path}")
+    return profiles
+
+
+def _expand(profile: str, key: str, value: str) -> str:
+    """Return ``value`` with environment variables replaced."""
+
+    def replace(match: re.Match[str]) -> str:
+        variable = match[1] or match[2]
+        if variable is None:
+            return "$"
+        if variable not in os.environ:
+            raise ValueError(
+                f"Environment variable {variable} used by {key} "
+                f"of profile {profile} is not set"
+            )
+        return os.environ[variable]
+
+    # Substituted values are not scanned again, so secrets may contain ``$``
+    return _VARIABLE.sub(replace, value)
@@ -0,0 +1,190 @@
+"""Asyncio Allegro client compared with the synchronous one."""
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator
+
+import aiohttp
+import pytest
+import requests  # type: ignore[import-untyped]
+
+from allegro_api.aio import AsyncAllegroApiClient
+from allegro_api.api import AllegroApiClient, RetryPolicy
+from allegro_api.cache import ResponseCache
+from benchmarks.standin import StandIn
+
+# Retries without waiting, enough to get through injected errors
+FAST_RETRY = RetryPolicy(total=10, backoff_factor=0.0)
+
+
+@pytest.fixture(name="standin")
+def fixture_standin() -> Iterator[StandIn]:
+    """Serve 300 synthetic order groups, a dozen pages."""
+    with StandIn.synthetic(300) as standin:
+        yield standin
+
+
+def sync_pages(url: str, **kwargs: Any) -> list[list[str]]:
+    """Return order ids of every page yielded by the synchronous client."""
+    with requests.Session() as session:
+        client = AllegroApiClient("cookie", session, base_url=url)
+        return [
+            [order.order_id for order in page.orders]
+            for page in client.iter_order_pages(**kwargs)
+        ]
+
+
+def async_pages(url: str, **kwargs: Any) -> list[list[str]]:
+    """Return order ids of every page yielded by the asyncio client."""
+
+    async def collect() -> list[list[str]]:
+        async with AsyncAllegroApiClient("cookie", base_url=url) as client:
+            return [
+                [order.order_id for order in page.orders]
+                async for page in client.iter_order_pages(**kwargs)
+            ]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_pages_match_sync_client(standin: StandIn, concurrency: int) -> None:
+    """Both clients yield the same pages in the same, newest first, order."""
+    pages = async_pages(standin.url, concurrency=concurrency)
+    assert pages == sync_pages(standin.url, concurrency=concurrency)
+    # The last page is full, so an empty page ends the history
+    assert [len(page) for page in pages] == [25] * 12 + [0]
+    ids = [order_id for page in pages for order_id in page]
+    assert len(ids) == len(set(ids)) == len(standin.orders)
+    assert async_pages(standin.url, max_pages=3, concurrency=concurrency) == pages[:3]
+
+
+def test_since_stops_after_first_older_page(standin: StandIn) -> None:
+    """Fetching stops with the first page reaching orders older than ``since``."""
+    with requests.Session() as session:
+        orders = list(
+            AllegroApiClient("cookie", session, base_url=standin.url).iter_orders()
+        )
+    since = orders[110].order_date
+    pages = async_pages(standin.url, since=since, concurrency=4)
+    assert pages == sync_pages(standin.url, since=since, concurrency=4)
+    # Order 110 is on the fifth page, which still has older orders
+    assert len(pages) == 5
+    assert orders[124].order_id == pages[-1][-1]
+
+
+def test_payments_match_sync_client(standin: StandIn) -> None:
+    """Payments split across page boundaries are yielded whole by both clients."""
+
+    async def collect() -> list[tuple[str, int]]:
+        async with AsyncAllegroApiClient("cookie", base_url=standin.url) as client:
+            return [
+                (payment.payment_id, len(payment.orders))
+                async for payment in client.iter_payments(concurrency=3)
+            ]
+
+    with requests.Session() as session:
+        client = AllegroApiClient("cookie", session, base_url=standin.url)
+        expected = [
+            (payment.payment_id, len(payment.orders))
+            for payment in client.iter_payments(concurrency=3)
+        ]
+    assert asyncio.run(collect()) == expected
+    assert len({payment_id for payment_id, _ in expected}) == len(expected)
+
+
+def test_transient_errors_are_retried() -> None:
+    """Injected ``503`` answers are retried until every page arrives."""
+
+    async def fetch(url: str) -> list[int]:
+        async with AsyncAllegroApiClient(
+            "cookie", base_url=url, retry=FAST_RETRY
+        ) as client:
+            pages = await asyncio.gather(
+                *(client.get_orders(offset) for offset in range(0, 300, 25))
+            )
+            return [len(page.orders) for page in pages]
+
+    with StandIn.synthetic(300, error_rate=0.3, seed=1) as standin:
+        assert asyncio.run(fetch(standin.url)) == [25] * 12
+        assert standin.errors > 0
+        assert standin.requests == 12 + standin.errors
+
+
+class _TooManyRequests(BaseHTTPRequestHandler):
+    """Answer every request with ``429`` and a long ``Retry-After``."""
+
+    requests = 0
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Refuse the request."""
+        type(self).requests += 1
+        self.send_response(429)
+        self.send_header("Retry-After", "3600")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args: Any) -> None:  # pylint: disable=arguments-differ
+        """Keep test output quiet."""
+
+
+@pytest.fixture(name="refusing_url")
+def fixture_refusing_url() -> Iterator[str]:
+    """Serve ``429 Too Many Requests`` and return the server URL."""
+    _TooManyRequests.requests = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _TooManyRequests)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_retry_after_over_budget_gives_up(refusing_url: str) -> None:
+    """A ``Retry-After`` beyond ``max_retry_after`` fails without retrying."""
+
+    async def fetch() -> None:
+        async with AsyncAllegroApiClient("cookie", base_url=refusing_url) as client:
+            await client.get_orders()
+
+    with pytest.raises(aiohttp.ClientResponseError) as raised:
+        asyncio.run(fetch())
+    assert raised.value.status == 429
+    assert _TooManyRequests.requests == 1
+    with requests.Session() as session, pytest.raises(requests.HTTPError):
+        AllegroApiClient("cookie", session, base_url=refusing_url).get_orders()
+    assert _TooManyRequests.requests == 2
+
+
+def test_cache_is_used_off_the_event_loop(
+    standin: StandIn, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """SQLite cache lookups run in worker threads and serve repeated requests."""
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    lookup = cache.lookup
+    threads: set[str] = set()
+
+    def tracked_lookup(key: str) -> Any:
+        threads.add(threading.current_thread().name)
+        return lookup(key)
+
+    monkeypatch.setattr(cache, "lookup", tracked_lookup)
+
+    async def fetch() -> tuple[int, int]:
+        async with AsyncAllegroApiClient(
+            "cookie", base_url=standin.url, cache=cache
+        ) as client:
+            first = await client.get_orders()
+            second = await client.get_orders()
+            return len(first.orders), len(second.orders)
+
+    try:
+        assert asyncio.run(fetch()) == (25, 25)
+    finally:
+        cache.close()
+    assert standin.requests == 1
+    assert cache.stats["hit"] == 1
+    assert threads and threading.main_thread().name not in threads
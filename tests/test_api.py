@@ -0,0 +1,128 @@
+"""Retry delays and order pagination of the Allegro client."""
+
+from typing import Iterable, Iterator
+
+import pytest
+import requests  # type: ignore[import-untyped]
+
+from allegro_api.api import AllegroApiClient, RetryPolicy, complete_payments
+from allegro_api.get_order_result import GetOrdersResult, Payment
+from benchmarks.datagen import orders_payload
+from benchmarks.standin import StandIn
+
+
+def test_backoff_is_capped_without_retry_after() -> None:
+    """Jittered exponential backoff never exceeds ``max_backoff``."""
+    policy = RetryPolicy(backoff_factor=10.0, max_backoff=2.0)
+    assert all(0 <= (policy.backoff(attempt) or 0) <= 2.0 for attempt in range(10))
+
+
+def test_retry_after_is_honoured_beyond_max_backoff() -> None:
+    """A server asking for a longer wait than ``max_backoff`` gets it."""
+    policy = RetryPolicy(backoff_factor=0.0, max_backoff=60.0)
+    assert policy.backoff(0, "120") == 120.0
+
+
+def test_retry_after_over_budget_gives_up() -> None:
+    """``None`` ends the retries instead of retrying too early."""
+    policy = RetryPolicy(max_retry_after=300.0)
+    assert policy.backoff(0, "301") is None
+    assert policy.backoff(0, "300") == 300.0
+
+
+def test_retry_after_can_be_ignored() -> None:
+    """Replayed runs retry immediately whatever the recorded header says."""
+    policy = RetryPolicy(backoff_factor=0.0, honor_retry_after=False)
+    assert policy.backoff(0, "3600") == 0.0
+
+
+@pytest.fixture(name="client")
+def fixture_client() -> Iterator[tuple[AllegroApiClient, StandIn]]:
+    """Return a client of a stand-in serving 300 synthetic orders."""
+    with StandIn.synthetic(300) as standin, requests.Session() as session:
+        yield AllegroApiClient("cookie", session, base_url=standin.url), standin
+
+
+def order_ids(pages: Iterable[GetOrdersResult]) -> list[list[str]]:
+    """Return order ids of each page."""
+    return [[order.order_id for order in page.orders] for page in pages]
+
+
+@pytest.mark.parametrize("concurrency", [2, 4, 5])
+def test_concurrent_pages_keep_order(
+    client: tuple[AllegroApiClient, StandIn], concurrency: int
+) -> None:
+    """Pages fetched concurrently are yielded in history order, newest first."""
+    api, standin = client
+    serial = order_ids(api.iter_order_pages(concurrency=1))
+    assert [len(page) for page in serial] == [25] * 12 + [0]
+    before = standin.requests
+    assert order_ids(api.iter_order_pages(concurrency=concurrency)) == serial
+    # The batch holding the first short page is the last one requested
+    assert standin.requests - before == -(-13 // concurrency) * concurrency
+    dates = [order.order_date for order in api.iter_orders(concurrency=concurrency)]
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_max_pages_limits_requests(client: tuple[AllegroApiClient, StandIn]) -> None:
+    """No more than ``max_pages`` pages are requested, whatever the batch size."""
+    api, standin = client
+    assert len(list(api.iter_order_pages(max_pages=3, concurrency=4))) == 3
+    assert standin.requests == 3
+
+
+def test_naive_since_is_taken_as_utc(client: tuple[AllegroApiClient, StandIn]) -> None:
+    """A naive ``since`` stops at the same page as the equivalent UTC one."""
+    api, _ = client
+    orders = list(api.iter_orders())
+    since = orders[100].order_date
+    aware = order_ids(api.iter_order_pages(since=since))
+    naive = order_ids(api.iter_order_pages(since=since.replace(tzinfo=None)))
+    assert naive == aware
+    assert len(aware) == 5
+
+
+def test_payments_split_across_pages_are_whole(
+    client: tuple[AllegroApiClient, StandIn],
+) -> None:
+    """A payment whose orders straddle a page boundary is yielded once, whole."""
+    api, _ = client
+    orders = list(api.iter_orders())
+    expected = {
+        payment.payment_id: [order.order_id for order in payment.orders]
+        for payment in Payment.from_orders(orders)
+    }
+    # Seven orders per page split several multi-order payments
+    split = [
+        orders[i].payment_id
+        for i in range(6, len(orders) - 1, 7)
+        if orders[i].payment_id == orders[i + 1].payment_id
+    ]
+    assert split
+    payments = list(api.iter_payments(page_size=7, concurrency=3))
+    assert len(payments) == len(expected)
+    assert {
+        payment.payment_id: [order.order_id for order in payment.orders]
+        for payment in payments
+    } == expected
+
+
+def test_complete_payments_holds_back_last_payment() -> None:
+    """Orders of the payment closing a page wait for the next page."""
+    orders = GetOrdersResult(orders_payload(30)).orders
+    cut = next(
+        i
+        for i in range(1, len(orders))
+        if orders[i - 1].payment_id == orders[i].payment_id
+    )
+    payments, pending = complete_payments([], orders[:cut])
+    assert {o.payment_id for o in pending} == {orders[cut].payment_id}
+    assert orders[cut].payment_id not in {p.payment_id for p in payments}
+    rest, pending = complete_payments(pending, orders[cut:])
+    (whole,) = [
+        p
+        for p in rest + Payment.from_orders(pending)
+        if p.payment_id == orders[cut].payment_id
+    ]
+    assert orders[cut - 1] in whole.orders and orders[cut] in whole.orders
+    assert complete_payments([], []) == ([], [])
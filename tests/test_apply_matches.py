@@ -0,0 +1,96 @@
+"""Concurrent ``apply_matches`` against the Firefly III stand-in."""
+
+from time import perf_counter
+from typing import Any, Iterator
+
+import pytest
+from fireflyiii_enricher_core.firefly_client import FireflyClient
+
+from benchmarks.standin import StandIn
+from processor_gui import TransactionProcessorGUI
+
+LATENCY = 0.03
+
+
+@pytest.fixture(name="standin")
+def fixture_standin() -> Iterator[StandIn]:
+    """Serve a small synthetic data set with a fixed request latency."""
+    with StandIn.synthetic(100, latency=LATENCY) as standin:
+        yield standin
+
+
+def processor(standin: StandIn) -> TransactionProcessorGUI:
+    """Return a processor tagging transactions of ``standin``."""
+    return TransactionProcessorGUI(FireflyClient(standin.url, "test"), "allegro")
+
+
+def matches(standin: StandIn, count: int) -> list[tuple[int, str]]:
+    """Return ``(tx_id, details)`` pairs for the first ``count`` transactions."""
+    return [(int(tx["id"]), "details") for tx in standin.transactions[:count]]
+
+
+def timed(func: Any, *args: Any, **kwargs: Any) -> tuple[Any, float]:
+    """Return the result of ``func`` and the seconds it took."""
+    started = perf_counter()
+    value = func(*args, **kwargs)
+    return value, perf_counter() - started
+
+
+def test_concurrent_apply_is_faster_than_serial(standin: StandIn) -> None:
+    """Updating eight transactions at once beats one at a time."""
+    items = matches(standin, 12)
+    serial, serial_time = timed(
+        processor(standin).apply_matches, items, max_workers=1, rate_limit=None
+    )
+    concurrent, concurrent_time = timed(
+        processor(standin).apply_matches, items, max_workers=8, rate_limit=None
+    )
+    assert serial == concurrent == {tx_id: None for tx_id, _ in items}
+    assert concurrent_time < serial_time / 2
+    # Every applied transaction carries the tag
+    for tx in standin.transactions[:12]:
+        assert "allegro" in tx["attributes"]["transactions"][0]["tags"]
+
+
+def test_rate_limit_is_respected(standin: StandIn) -> None:
+    """Requests beyond the initial burst wait for the token bucket."""
+    standin.latency = 0.0
+    rate = 20.0
+    items = matches(standin, 15)
+    requests_before = standin.requests
+    errors, elapsed = timed(
+        processor(standin).apply_matches, items, max_workers=8, rate_limit=rate
+    )
+    assert not any(errors.values())
+    # Two requests per transaction, the bucket starts with ``rate`` tokens
+    throttled = 2 * len(items) - rate
+    assert standin.requests - requests_before >= 2 * len(items)
+    assert elapsed >= throttled / rate * 0.9
+
+
+def test_errors_are_reported_per_transaction(
+    standin: StandIn, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A failing transaction does not stop or hide the others."""
+    items = matches(standin, 6)
+    failing = items[2][0]
+    gui = processor(standin)
+    add_tag = gui.firefly_client.add_tag_to_transaction
+
+    def flaky_add_tag(tx_id: int, tag: str) -> Any:
+        if tx_id == failing:
+            raise RuntimeError(f"cannot tag {tx_id}")
+        return add_tag(tx_id, tag)
+
+    monkeypatch.setattr(gui.firefly_client, "add_tag_to_transaction", flaky_add_tag)
+    reported: dict[int, Exception | None] = {}
+    errors = gui.apply_matches(
+        items,
+        max_workers=4,
+        rate_limit=None,
+        on_result=lambda tx_id, _seconds, error: reported.update({tx_id: error}),
+    )
+    assert set(errors) == {tx_id for tx_id, _ in items}
+    assert isinstance(errors[failing], RuntimeError)
+    assert all(error is None for tx_id, error in errors.items() if tx_id != failing)
+    assert reported == errors
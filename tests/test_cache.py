@@ -0,0 +1,145 @@
+"""On-disk response cache of the Allegro client."""
+
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Iterator
+
+import pytest
+import requests  # type: ignore[import-untyped]
+
+from allegro_api import cache as cache_module
+from allegro_api.api import AllegroApiClient
+from allegro_api.cache import ResponseCache
+from benchmarks.standin import StandIn
+
+URL = "https://allegro.example/myorder-api/myorders?limit=25&offset=0"
+BODY = json.dumps({"orderGroups": []}).encode()
+
+
+class FakeClock:  # pylint: disable=too-few-public-methods
+    """Wall clock advanced by hand."""
+
+    def __init__(self) -> None:
+        """Start at an arbitrary time."""
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        """Return the current fake time."""
+        return self.now
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    """Replace the clock of the cache module."""
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture(name="cache")
+def fixture_cache(tmp_path: Path) -> Iterator[ResponseCache]:
+    """Return an empty cache, closed afterwards."""
+    cache = ResponseCache(str(tmp_path / "cache.db"), ttls={"/myorder-api": 60.0})
+    try:
+        yield cache
+    finally:
+        cache.close()
+
+
+def test_entries_expire_after_ttl(cache: ResponseCache, clock: FakeClock) -> None:
+    """Entries are fresh for the TTL of the longest matching path prefix."""
+    cache.ttls["/myorder-api/myorders"] = 900.0
+    assert cache.ttl(URL) == 900.0
+    assert cache.ttl("https://allegro.example/users") == 0.0
+    entry = cache.store("key", URL, {}, BODY)
+    assert entry is not None and entry.is_fresh()
+    clock.now += 899
+    assert entry.is_fresh()
+    clock.now += 1
+    assert not entry.is_fresh()
+    stored = cache.lookup("key")
+    assert stored is not None and not stored.is_fresh()
+
+
+def test_uncacheable_responses_are_not_stored(cache: ResponseCache) -> None:
+    """``no-store`` and responses without TTL or validators are skipped."""
+    assert cache.store("a", URL, {"Cache-Control": "no-store"}, BODY) is None
+    assert cache.store("b", "https://allegro.example/other", {}, BODY) is None
+    assert cache.lookup("a") is None and cache.lookup("b") is None
+
+
+def test_304_refreshes_expiry_and_validators(
+    cache: ResponseCache, clock: FakeClock
+) -> None:
+    """Revalidation keeps the body and takes the validators of the ``304``."""
+    old_date = "Mon, 03 Mar 2025 10:00:00 GMT"
+    new_date = "Tue, 04 Mar 2025 10:00:00 GMT"
+    entry = cache.store("key", URL, {"ETag": '"v1"', "Last-Modified": old_date}, BODY)
+    assert entry is not None
+    assert entry.validators() == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": old_date,
+    }
+    clock.now += 120
+    refreshed = cache.refresh(entry, URL, {"Last-Modified": new_date})
+    assert refreshed.body == BODY and refreshed.is_fresh()
+    assert refreshed.validators() == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": new_date,
+    }
+    assert cache.lookup("key") == refreshed
+
+
+def test_least_recently_used_entries_are_evicted(
+    tmp_path: Path, clock: FakeClock
+) -> None:
+    """Above ``max_entries`` the entry used longest ago goes first."""
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_entries=2)
+    try:
+        for key in ("a", "b"):
+            cache.store(key, URL, {"ETag": key}, BODY)
+            clock.now += 1
+        cache.lookup("a")
+        clock.now += 1
+        cache.store("c", URL, {"ETag": "c"}, BODY)
+        assert cache.lookup("b") is None
+        assert cache.lookup("a") is not None and cache.lookup("c") is not None
+        assert cache.stats["evicted"] == 1
+    finally:
+        cache.close()
+
+
+def test_entries_are_separated_by_credentials() -> None:
+    """Accounts sharing a cache file never see each other's responses."""
+    anna = ResponseCache.key("GET", URL, {"Cookie": "QXLSESSID=anna"})
+    assert anna == ResponseCache.key("get", URL, {"cookie": "QXLSESSID=anna"})
+    assert anna != ResponseCache.key("GET", URL, {"Cookie": "QXLSESSID=jan"})
+    assert anna != ResponseCache.key(
+        "GET", URL, {"Cookie": "QXLSESSID=anna", "Authorization": "Bearer x"}
+    )
+    # The representation is part of the key too
+    assert anna != ResponseCache.key(
+        "GET", URL, {"Cookie": "QXLSESSID=anna", "Accept": "v3"}
+    )
+
+
+def test_client_revalidates_stale_entries(tmp_path: Path) -> None:
+    """A stale entry is revalidated with ``If-None-Match`` and served on ``304``."""
+    cache = ResponseCache(str(tmp_path / "cache.db"), ttls={})
+    try:
+        with StandIn.synthetic(30) as standin, requests.Session() as session:
+            anna = AllegroApiClient("anna", session, base_url=standin.url, cache=cache)
+            first = anna.get_orders()
+            second = anna.get_orders()
+            assert standin.requests == 2 and standin.not_modified == 1
+            assert [o.order_id for o in second.orders] == [
+                o.order_id for o in first.orders
+            ]
+            # Another account's request is not conditional
+            jan = AllegroApiClient("jan", session, base_url=standin.url, cache=cache)
+            jan.get_orders()
+            assert standin.requests == 3 and standin.not_modified == 1
+        assert cache.stats == {"miss": 2, "stored": 2, "revalidated": 1}
+    finally:
+        cache.close()
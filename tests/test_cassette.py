@@ -0,0 +1,36 @@
+"""Recording and replaying HTTP traffic."""
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests  # type: ignore[import-untyped]
+
+import cassette
+from benchmarks.standin import StandIn
+
+
+def test_recorded_traffic_replays_without_server(tmp_path: Path) -> None:
+    """Responses come back from the cassette once the server is gone."""
+    path = str(tmp_path / "run.jsonl.gz")
+    assert cassette.active_cassette() is None
+    with StandIn.synthetic(30) as standin:
+        url = f"{standin.url}/myorder-api/myorders?limit=25&offset=0"
+        started = datetime.now(timezone.utc)
+        with cassette.use_cassette(path, cassette.RECORD) as tape:
+            assert cassette.active_cassette() is tape
+            recorded = requests.get(
+                url, headers={"Cookie": "QXLSESSID=secret"}, timeout=10
+            )
+    finished = datetime.now(timezone.utc)
+    assert cassette.active_cassette() is None
+    with cassette.use_cassette(path, cassette.REPLAY) as tape:
+        assert cassette.active_cassette() is tape
+        # The clock stands still at the first recorded request
+        assert tape.recorded_at is not None
+        assert started <= tape.recorded_at <= finished
+        assert cassette.now() == tape.recorded_at
+        replayed = requests.get(url, timeout=10)
+    assert replayed.status_code == 200
+    assert replayed.json() == recorded.json()
+    assert cassette.active_cassette() is None
+    assert cassette.now() > finished
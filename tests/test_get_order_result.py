@@ -0,0 +1,77 @@
+"""Lazy parsing of ``get_orders`` results against eager parsing."""
+
+from datetime import date
+from typing import Any
+
+import pytest
+
+from allegro_api.get_order_result import (
+    GetOrdersResult,
+    Offer,
+    SimplifiedPayment,
+    simplify_title,
+)
+from benchmarks.datagen import orders_payload
+
+# Titles and their simplified forms
+TITLES = {
+    "": "",
+    "!!!": "",
+    "Etui na telefon - czarne, 2 szt.": "Etui na Telefon",
+    "ŁADOWARKA usb-c 65W do laptopa": "Ładowarka Usb-c 65w",
+    "ab-cd-efgh x-y zzz": "ab-cd-Efgh x-y Zzz",
+    "Superdługiesłowo" * 3 + " krótkie": "",
+    "Kabel   HDMI\t2.1 (8K) 3m": "Kabel Hdmi 21",
+}
+# The function behind the ``lru_cache``
+eager_title = simplify_title.__wrapped__
+
+
+def eager_details(raw_orders: list[dict[str, Any]]) -> str:
+    """Return payment details built from offers parsed up front."""
+    return "\n".join(
+        "\n".join(
+            f"{eager_title(offer.title)} ({offer.unit_price} "
+            f"{offer.price_currency})"
+            for offer in [Offer.from_dict(item) for item in raw["offers"]]
+        )
+        for raw in raw_orders
+    )
+
+
+@pytest.mark.parametrize("title", TITLES)
+def test_cached_titles_match_eager_simplification(title: str) -> None:
+    """Cached and repeated simplification gives the uncached result."""
+    assert eager_title(title) == TITLES[title]
+    assert simplify_title(title) == TITLES[title]
+    hits = simplify_title.cache_info().hits
+    assert simplify_title(title) == TITLES[title]
+    assert simplify_title.cache_info().hits == hits + 1
+
+
+def test_lazy_details_match_eager_parsing() -> None:
+    """Offers and details parsed on first access equal eager parsing."""
+    payload = orders_payload(120, seed=3)
+    result = GetOrdersResult(payload)
+    raw = {group["groupId"]: group["myorders"][0] for group in payload["orderGroups"]}
+    for order in result.orders:
+        assert order.offers == [
+            Offer.from_dict(o) for o in raw[order.order_id]["offers"]
+        ]
+        assert order.simplified_titles() == [
+            eager_title(offer.title) for offer in order.offers
+        ]
+    payments = SimplifiedPayment.from_payments(result.payments)
+    for payment, source in zip(payments, result.payments):
+        expected = eager_details([raw[order.order_id] for order in source.orders])
+        assert payment.details == expected
+    combined = SimplifiedPayment.combine(payments[:3])
+    assert combined.details == "\n".join(p.details for p in payments[:3])
+
+
+def test_details_can_be_given_to_init() -> None:
+    """Payments built directly keep the ``details`` they were given."""
+    day = date(2025, 3, 10)
+    assert SimplifiedPayment(date=day, amount=1.0, details="x").details == "x"
+    assert SimplifiedPayment(day, 1.0, "x").details == "x"
+    assert SimplifiedPayment(date=day, amount=1.0).details == ""
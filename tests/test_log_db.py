@@ -0,0 +1,120 @@
+"""Migrations and retention of the log database."""
+
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+from fireflyiii_enricher_core.firefly_client import simplify_transactions
+
+import log_db
+from benchmarks.datagen import firefly_transactions, orders_payload
+from processor_gui import TxMatchResult
+
+
+def legacy_log(rows: list[tuple[str, int, int, str, object]]) -> sqlite3.Connection:
+    """Return a database with ``(tx_id, count, applied, date, details)`` attempts."""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(log_db.LEGACY_SCHEMA)
+    with conn:
+        conn.executemany(
+            "INSERT INTO matched_tx (tx_id, tx_date, tx_amount, matched_count, "
+            "applied, match_date, details) VALUES (?, '2025-03-10', -10.0, ?, ?, ?, ?)",
+            [
+                (tx_id, count, applied, when, json.dumps(details))
+                for tx_id, count, applied, when, details in rows
+            ],
+        )
+    return conn
+
+
+def test_legacy_log_is_folded_into_latest_states() -> None:
+    """Repeated attempts become one latest state and the changes of state."""
+    conn = legacy_log(
+        [
+            ("1", 2, 0, "2025-03-10T10:00:00", ["a", "b"]),
+            ("1", 2, 0, "2025-03-10T11:00:00", ["a", "b"]),
+            ("2", 0, 0, "2025-03-10T11:00:00", []),
+            ("1", 1, 1, "2025-03-10T12:00:00", ["a"]),
+        ]
+    )
+    log_db.init_db(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == log_db.SCHEMA_VERSION
+    latest = conn.execute(
+        "SELECT tx_id, matched_count, applied, match_date, attempts, first_seen, "
+        "body FROM matched_tx JOIN match_detail ON hash = details_hash ORDER BY tx_id"
+    ).fetchall()
+    assert [row[:6] for row in latest] == [
+        ("1", 1, 1, "2025-03-10T12:00:00", 3, "2025-03-10T10:00:00"),
+        ("2", 0, 0, "2025-03-10T11:00:00", 1, "2025-03-10T11:00:00"),
+    ]
+    assert [json.loads(log_db.decompress_details(row[6]) or "") for row in latest] == [
+        ["a"],
+        [],
+    ]
+    # The repeated state of transaction 1 is not a change
+    assert conn.execute(
+        "SELECT tx_id, matched_count, match_date FROM match_attempt ORDER BY rowid"
+    ).fetchall() == [
+        ("1", 2, "2025-03-10T10:00:00"),
+        ("2", 0, "2025-03-10T11:00:00"),
+        ("1", 1, "2025-03-10T12:00:00"),
+    ]
+    assert conn.execute("SELECT count(*) FROM match_detail").fetchone()[0] == 3
+    # Opening a migrated database again changes nothing
+    log_db.init_db(conn)
+    assert conn.execute("SELECT count(*) FROM match_attempt").fetchone()[0] == 3
+
+
+def test_prune_drops_checkpoints_of_pruned_unapplied_transactions() -> None:
+    """A pruned ambiguous transaction is evaluated again, not skipped forever."""
+    old = (datetime.now() - timedelta(days=400)).isoformat()
+    recent = datetime.now().isoformat()
+    conn = legacy_log(
+        [
+            ("applied", 1, 1, old, ["a"]),
+            ("ambiguous", 2, 0, old, ["a", "b"]),
+            ("recent", 2, 0, recent, ["c", "d"]),
+        ]
+    )
+    log_db.init_db(conn)
+    with log_db.LogWriter(conn) as writer:
+        for tx_id in ("applied", "ambiguous", "recent"):
+            writer.checkpoint(tx_id, "fingerprint")
+    deleted = log_db.prune_log(conn, 365)
+    assert deleted["matched_tx"] == 2
+    assert deleted["match_attempt"] == 2
+    assert deleted["tx_checkpoint"] == 1
+    assert set(log_db.load_checkpoints(conn)) == {"applied", "recent"}
+    assert [row[0] for row in conn.execute("SELECT tx_id FROM matched_tx")] == [
+        "recent"
+    ]
+    assert conn.execute("SELECT count(*) FROM match_detail").fetchone()[0] == 1
+
+
+def test_attempt_ids_survive_migration_and_are_not_reused() -> None:
+    """Export marks stay valid across the id migration and an emptying prune."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE match_attempt (tx_id TEXT, match_date TEXT, "
+        "matched_count INTEGER, applied INTEGER, details_hash BLOB)"
+    )
+    old = (datetime.now() - timedelta(days=400)).isoformat()
+    with conn:
+        conn.executemany(
+            "INSERT INTO match_attempt VALUES (?, ?, 1, 1, x'00')",
+            [(str(tx_id), old) for tx_id in range(5)],
+        )
+        conn.execute("DELETE FROM match_attempt WHERE tx_id = '0'")
+    log_db.init_db(conn)
+    assert conn.execute("SELECT id, tx_id FROM match_attempt").fetchall() == [
+        (2, "1"),
+        (3, "2"),
+        (4, "3"),
+        (5, "4"),
+    ]
+    log_db.prune_log(conn, 365)
+    assert conn.execute("SELECT count(*) FROM match_attempt").fetchone()[0] == 0
+    transactions = simplify_transactions(firefly_transactions(orders_payload(2)))
+    with log_db.LogWriter(conn) as writer:
+        writer.add(TxMatchResult(tx=transactions[0], matches=[]), 0, False, [])
+    assert [row[0] for row in conn.execute("SELECT id FROM match_attempt")] == [6]
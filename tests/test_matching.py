@@ -0,0 +1,64 @@
+"""Parity of the indexed and batch matchers with ``TransactionMatcher``."""
+
+import random
+from datetime import date, timedelta
+
+from fireflyiii_enricher_core.firefly_client import SimplifiedItem
+from fireflyiii_enricher_core.matcher import TransactionMatcher
+
+from allegro_api.get_order_result import SimplifiedPayment
+from matching import PaymentIndex, batch_match
+
+
+def random_data(
+    seed: int, payments: int, transactions: int
+) -> tuple[list[SimplifiedPayment], list[SimplifiedItem]]:
+    """Return payments and transactions with many near and exact matches.
+
+    Transactions copy a payment amount, shifted by -1, 0 or +1 cent and
+    sometimes negated, and are dated around the payment date, so amount and
+    date window edges are both exercised.
+    """
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    # Few distinct amounts keep several payments competing for a transaction
+    amounts = [round(rng.uniform(1, 300), 2) for _ in range(payments // 4)]
+    pays = [
+        SimplifiedPayment(
+            date=start + timedelta(days=rng.randint(0, 90)),
+            amount=rng.choice(amounts),
+            payment_id=f"pay-{index}",
+        )
+        for index in range(payments)
+    ]
+    txs = []
+    for _ in range(transactions):
+        base = rng.choice(pays)
+        cents = round(base.amount * 100) + rng.choice([-2, -1, 0, 0, 0, 1, 2])
+        amount = cents / 100 * rng.choice([1, -1])
+        when = base.date + timedelta(days=rng.randint(-2, 8))
+        txs.append(SimplifiedItem(date=when, amount=amount))
+    return pays, txs
+
+
+def test_index_and_batch_match_like_transaction_matcher() -> None:
+    """All matchers return the same payments in the same order."""
+    pays, txs = random_data(seed=1, payments=2000, transactions=3000)
+    index = PaymentIndex(pays)
+    batched = batch_match(txs, pays)
+    matched = 0
+    for tx, from_batch in zip(txs, batched):
+        expected = TransactionMatcher.match(tx, pays)
+        assert index.match(tx) == expected
+        assert from_batch == expected
+        matched += bool(expected)
+    # The data must exercise both outcomes
+    assert 0 < matched < len(txs)
+
+
+def test_matchers_on_empty_inputs() -> None:
+    """No payments or no transactions give no matches."""
+    pays, txs = random_data(seed=2, payments=10, transactions=10)
+    assert not PaymentIndex([]).match(txs[0])
+    assert batch_match(txs, []) == [[] for _ in txs]
+    assert not batch_match([], pays)
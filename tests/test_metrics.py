@@ -0,0 +1,42 @@
+"""OpenMetrics textfile written for node_exporter."""
+
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import metrics as metrics_module
+from allegro_api.api import RequestTrace
+from metrics import RunMetrics
+
+# Expected textfile of the run recorded by the test
+GOLDEN = Path(__file__).parent / "data" / "worker.prom"
+
+
+def test_textfile_matches_golden_output(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Every metric family is written with its help, type and samples."""
+    clock = iter([100.0, 112.5])
+    monkeypatch.setattr(
+        metrics_module, "time", SimpleNamespace(perf_counter=lambda: next(clock))
+    )
+    metrics = RunMetrics()
+    metrics.started_at = datetime(2025, 3, 10, 10, 0, tzinfo=timezone.utc)
+    metrics.observe("fetch_orders", 1.5, 25)
+    metrics.observe("fetch_orders", 0.5, 25)
+    metrics.observe('match "all"', 0.25, 3)
+    url = "https://allegro.pl/myorder-api/myorders"
+    metrics.observe_request(RequestTrace("GET", url, 200, 0.1, 0, 2048, "miss"))
+    # Cache hits are counted as cache requests only
+    metrics.observe_request(RequestTrace("GET", url, 200, 0.0, 0, 2048, "hit"))
+    metrics.observe_request(
+        RequestTrace("PUT", "http://firefly.local/api/v1/transactions/1", None, 1, 3, 0)
+    )
+    metrics.observe_matches([0, 1, 1, 4])
+    metrics.finish()
+    path = tmp_path / "worker.prom"
+    metrics.write_textfile(str(path))
+    assert path.read_text(encoding="utf-8") == GOLDEN.read_text(encoding="utf-8")
+    assert [p.name for p in tmp_path.iterdir()] == ["worker.prom"]
@@ -0,0 +1,78 @@
+"""Orders and payments persisted across worker runs."""
+
+import copy
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import log_db
+from allegro_api.get_order_result import GetOrdersResult, Order
+from benchmarks.datagen import orders_payload
+from order_store import OrderStore
+
+
+def open_store() -> OrderStore:
+    """Return a store on a fresh in-memory log database."""
+    conn = sqlite3.connect(":memory:")
+    log_db.init_db(conn)
+    store = OrderStore(conn)
+    store.init()
+    return store
+
+
+def test_oldest_open_order_skips_applied_and_old_orders() -> None:
+    """Applied payments and orders before ``since`` do not widen the window."""
+    store = open_store()
+    conn = store.conn
+    orders = GetOrdersResult(orders_payload(50)).orders
+    store.upsert_orders(orders)
+    # Newest first: applying the oldest payment moves the bound forward
+    oldest = orders[-1]
+    with log_db.LogWriter(conn) as writer:
+        writer.consume(oldest.payment_id, "1")
+    open_orders = [o for o in orders if o.payment_id != oldest.payment_id]
+    since = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    assert store.oldest_open_order_date(since) == min(o.order_date for o in open_orders)
+    # Orders older than the lookback are given up on
+    cutoff = open_orders[10].order_date
+    assert store.oldest_open_order_date(cutoff) == cutoff
+    assert store.oldest_open_order_date(orders[0].order_date + timedelta(1)) is None
+
+
+def test_upserts_refresh_payments_split_across_runs() -> None:
+    """Orders of one payment fetched in different runs form one payment."""
+    store = open_store()
+    orders = GetOrdersResult(orders_payload(50)).orders
+    first, second = next(
+        (a, b) for a, b in zip(orders, orders[1:]) if a.payment_id == b.payment_id
+    )
+    assert store.upsert_orders([o for o in orders if o is not second]) == 49
+    # A later run stores the second order, placed a day before the first one
+    raw = copy.deepcopy(second.raw)
+    raw["orderDate"] = (first.order_date - timedelta(days=1)).strftime(
+        "%Y-%m-%dT%H:%M:%S.000Z"
+    )
+    late = Order(second.order_id, raw)
+    assert store.upsert_orders([late, first]) == 2
+    (row,) = store.conn.execute(
+        "SELECT amount, order_count, payment_date FROM allegro_payment "
+        "WHERE payment_id = ?",
+        (first.payment_id,),
+    )
+    assert row == (
+        float(first.payment_amount["amount"]),
+        2,
+        first.order_date.isoformat(),
+    )
+    assert store.conn.execute("SELECT COUNT(*) FROM allegro_order").fetchone() == (50,)
+    # The payment is loaded whole although its older order precedes ``since``
+    (payment,) = [
+        p
+        for p in store.load_payments(first.order_date)
+        if p.payment_id == first.payment_id
+    ]
+    assert [o.order_id for o in payment.orders] == [first.order_id, late.order_id]
+    assert {p.payment_id for p in store.load_payments()} == {
+        o.payment_id for o in orders
+    }
+    newer = store.load_payments(first.order_date + timedelta(seconds=1))
+    assert first.payment_id not in {p.payment_id for p in newer}
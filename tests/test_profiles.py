@@ -0,0 +1,72 @@
+"""Profiles loaded from a TOML config file."""
+
+from pathlib import Path
+
+import pytest
+
+from profiles import load_profiles
+
+CONFIG = """
+[defaults]
+firefly_url = "https://firefly.example"
+tag = "allegro"
+description_filter = "allegro"
+
+[profiles.anna]
+allegro_cookie = "$QXLSESSID_ANNA"
+firefly_token = "${FIREFLY_TOKEN_ANNA}"
+"""
+
+
+def write_config(tmp_path: Path, text: str = CONFIG) -> str:
+    """Write ``text`` as a config file and return its path."""
+    path = tmp_path / "profiles.toml"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_variables_are_expanded(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Secrets come from the environment and defaults fill the rest."""
+    monkeypatch.setenv("QXLSESSID_ANNA", "cookie")
+    monkeypatch.setenv("FIREFLY_TOKEN_ANNA", "token")
+    profiles = load_profiles(write_config(tmp_path))
+    assert [profile.name for profile in profiles] == ["anna"]
+    profile = profiles[0]
+    assert profile.allegro_cookie == "cookie"
+    assert profile.firefly_token == "token"
+    assert profile.db_file == "log-anna.db"
+
+
+@pytest.mark.parametrize("missing", ["QXLSESSID_ANNA", "FIREFLY_TOKEN_ANNA"])
+def test_unset_variable_names_profile_and_variable(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, missing: str
+) -> None:
+    """An unset variable fails loading instead of being sent literally."""
+    monkeypatch.setenv("QXLSESSID_ANNA", "cookie")
+    monkeypatch.setenv("FIREFLY_TOKEN_ANNA", "token")
+    monkeypatch.delenv(missing)
+    with pytest.raises(ValueError, match=f"{missing} .*profile anna"):
+        load_profiles(write_config(tmp_path))
+
+
+def test_dollar_signs_without_variables_are_kept(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """``$$`` escapes ``$``, and other dollar signs stay literal."""
+    monkeypatch.setenv("QXLSESSID_ANNA", "co$OKIE")
+    monkeypatch.delenv("FIREFLY_TOKEN_ANNA", raising=False)
+    config = CONFIG.replace("${FIREFLY_TOKEN_ANNA}", "$$FIREFLY_TOKEN_ANNA")
+    config += 'tag = "zakupy $ ${} 100$"\n'
+    profile = load_profiles(write_config(tmp_path, config))[0]
+    # Values from the environment are not expanded again
+    assert profile.allegro_cookie == "co$OKIE"
+    assert profile.firefly_token == "$FIREFLY_TOKEN_ANNA"
+    assert profile.tag == "zakupy $ ${} 100$"
+
+
+def test_unknown_setting_is_rejected(tmp_path: Path) -> None:
+    """Typos in setting names are reported."""
+    with pytest.raises(ValueError, match="firefly_tokn"):
+        load_profiles(write_config(tmp_path, CONFIG + 'firefly_tokn = "x"\n'))
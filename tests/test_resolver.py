@@ -0,0 +1,70 @@
+"""One-to-one resolution of transactions with several candidate payments."""
+
+from datetime import date, timedelta
+
+from fireflyiii_enricher_core.firefly_client import SimplifiedItem
+
+from allegro_api.get_order_result import SimplifiedPayment
+from matching import Resolution, resolve_one_to_one
+
+DAY = date(2025, 3, 10)
+
+
+def tx(days: int) -> SimplifiedItem:
+    """Return a transaction booked ``days`` after ``DAY``."""
+    return SimplifiedItem(date=DAY + timedelta(days=days), amount=-10.0)
+
+
+def payment(name: str, days: int = 0) -> SimplifiedPayment:
+    """Return a payment made ``days`` after ``DAY``."""
+    return SimplifiedPayment(
+        date=DAY + timedelta(days=days), amount=10.0, payment_id=name
+    )
+
+
+def assigned(resolutions: list[Resolution | None]) -> list[tuple[str, bool] | None]:
+    """Return ``(payment_id, forced)`` of every resolution."""
+    return [
+        None if found is None else (found.payment.payment_id, found.forced)
+        for found in resolutions
+    ]
+
+
+def test_single_candidates_are_forced_and_eliminated() -> None:
+    """A sole candidate is taken and removed from the other transactions."""
+    p1, p2, p3 = payment("p1"), payment("p2"), payment("p3")
+    result = resolve_one_to_one(
+        [tx(1), tx(1), tx(1)], [[p1, p2], [p2], [p1, p2, p3]], prefer_closest=False
+    )
+    # p2 is forced to the second, then p1 to the first, leaving p3
+    assert assigned(result) == [("p1", True), ("p2", True), ("p3", True)]
+
+
+def test_shared_sole_candidate_is_left_unassigned() -> None:
+    """Two transactions competing for their only payment get neither."""
+    p1, p2 = payment("p1"), payment("p2", 1)
+    result = resolve_one_to_one([tx(1), tx(1), tx(2)], [[p1], [p1], [p1, p2]])
+    # The blocked payment is not handed to the third, closer p2 is
+    assert assigned(result) == [None, None, ("p2", False)]
+
+
+def test_closest_pairs_only_with_preference() -> None:
+    """Mutually closest pairs are assigned, not forced, with ``prefer_closest``."""
+    early, late = payment("early", 0), payment("late", 2)
+    # Gaps: first to early 2 and late 0 days, second 3 and 1 days
+    transactions = [tx(2), tx(3)]
+    candidates = [[early, late], [early, late]]
+    assert assigned(resolve_one_to_one(transactions, candidates, False)) == [
+        None,
+        None,
+    ]
+    assert assigned(resolve_one_to_one(transactions, candidates)) == [
+        ("late", False),
+        ("early", False),
+    ]
+
+
+def test_tied_gaps_are_left_unassigned() -> None:
+    """Equally close payments are not guessed between."""
+    p1, p2 = payment("p1"), payment("p2")
+    assert assigned(resolve_one_to_one([tx(2)], [[p1, p2]])) == [None]
@@ -0,0 +1,79 @@
+"""Combined charges matched to several payments by subset-sum search."""
+
+from datetime import date, timedelta
+
+from fireflyiii_enricher_core.firefly_client import SimplifiedItem
+
+from allegro_api.get_order_result import SimplifiedPayment
+from matching import SubsetMatcher, resolve_one_to_one
+from processor_gui import TxMatchResult, match_combined_payments
+
+DAY = date(2025, 3, 10)
+
+
+def payment(name: str, amount: float, days: int = 0) -> SimplifiedPayment:
+    """Return a payment of ``amount`` made ``days`` after ``DAY``."""
+    return SimplifiedPayment(
+        date=DAY + timedelta(days=days), amount=amount, payment_id=name
+    )
+
+
+def tx(amount: float, days: int = 1) -> SimplifiedItem:
+    """Return a withdrawal of ``amount`` booked ``days`` after ``DAY``."""
+    return SimplifiedItem(date=DAY + timedelta(days=days), amount=-amount)
+
+
+def ids(found: list[list[SimplifiedPayment]]) -> list[set[str]]:
+    """Return payment ids of every found set."""
+    return [{p.payment_id for p in parts} for parts in found]
+
+
+def test_finds_exact_sums_of_two_and_three_payments() -> None:
+    """Sets are found in integer cents, so float rounding cannot break them."""
+    payments = [payment("a", 10.10), payment("b", 20.20), payment("c", 0.7)]
+    matcher = SubsetMatcher(payments)
+    assert ids(matcher.find(tx(30.30))) == [{"a", "b"}]
+    assert ids(matcher.find(tx(31.00))) == [{"a", "b", "c"}]
+    # A single payment or a sum one cent off is not a combined charge
+    assert not matcher.find(tx(10.10))
+    assert not matcher.find(tx(30.31))
+
+
+def test_respects_size_and_date_window() -> None:
+    """Too many parts and payments outside the match window are ignored."""
+    parts = [payment(f"p{i}", 1.0) for i in range(4)]
+    assert not SubsetMatcher(parts).find(tx(4.0))
+    late = [payment("a", 5.0), payment("b", 5.0, days=2)]
+    assert not SubsetMatcher(late).find(tx(10.0, days=1))
+    old = [payment("a", 5.0, days=-30), payment("b", 5.0)]
+    assert not SubsetMatcher(old).find(tx(10.0))
+
+
+def test_combined_match_needs_unclaimed_payments() -> None:
+    """Transactions claiming the same payments are left for review."""
+    a, b, c = payment("a", 4.0), payment("b", 6.0), payment("c", 11.0)
+    results = [
+        TxMatchResult(tx=tx(10.0), matches=[]),
+        TxMatchResult(tx=tx(10.0, days=2), matches=[]),
+        TxMatchResult(tx=tx(11.0), matches=[]),
+    ]
+    results[2].matches = [c]
+    assert match_combined_payments(results, [a, b, c]) == 0
+    assert not results[0].matches and not results[1].matches
+
+    single = [TxMatchResult(tx=tx(10.0), matches=[])]
+    assert match_combined_payments(single, [a, b, c]) == 1
+    (combined,) = single[0].matches
+    assert sorted(combined.payment_ids) == ["a", "b"]
+    assert combined.amount == 10.0
+
+
+def test_combined_match_is_never_forced() -> None:
+    """A sole combined candidate is assigned but not applied automatically."""
+    combined = SimplifiedPayment.combine([payment("a", 4.0), payment("b", 6.0)])
+    single = payment("c", 3.0)
+    (first, second) = resolve_one_to_one(
+        [tx(10.0), tx(3.0)], [[combined], [single]], prefer_closest=False
+    )
+    assert first is not None and first.payment is combined and not first.forced
+    assert second is not None and second.forced
@@ -0,0 +1,87 @@
+"""Token bucket and per-host limits of outgoing API calls."""
+
+from types import SimpleNamespace
+
+import pytest
+
+import throttle
+from throttle import HostLimiter, TokenBucket
+
+
+class FakeClock:
+    """Monotonic clock advanced only by sleeping."""
+
+    def __init__(self) -> None:
+        """Start at an arbitrary time with no sleeps."""
+        self.now = 500.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        """Return the current fake time."""
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """Advance the clock instead of blocking."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    """Replace the clock of the throttle module."""
+    clock = FakeClock()
+    monkeypatch.setattr(
+        throttle, "time", SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep)
+    )
+    return clock
+
+
+def test_burst_then_steady_rate(clock: FakeClock) -> None:
+    """A full bucket allows ``capacity`` calls at once, then ``rate`` per second."""
+    bucket = TokenBucket(rate=10.0, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert not clock.sleeps
+    started = clock.now
+    for _ in range(20):
+        bucket.acquire()
+    assert clock.now - started == pytest.approx(2.0)
+    assert clock.sleeps == pytest.approx([0.1] * 20)
+
+
+def test_idle_time_refills_up_to_capacity(clock: FakeClock) -> None:
+    """Tokens saved while idle never exceed the burst size."""
+    bucket = TokenBucket(rate=2.0)
+    assert bucket.capacity == 2.0
+    bucket.acquire(2)
+    clock.now += 60
+    bucket.acquire(2)
+    assert not clock.sleeps
+    bucket.acquire()
+    assert clock.sleeps == pytest.approx([0.5])
+
+
+def test_slow_rates_keep_a_burst_of_one(clock: FakeClock) -> None:
+    """Rates below one call per second still allow a single call at once."""
+    bucket = TokenBucket(rate=0.25)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == pytest.approx([4.0])
+
+
+def test_invalid_limits_are_rejected() -> None:
+    """Non-positive rates and limits raise ``ValueError``."""
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+    with pytest.raises(ValueError):
+        HostLimiter(0)
+
+
+def test_hosts_share_slots_regardless_of_path() -> None:
+    """Calls to one host share a semaphore, other hosts get their own."""
+    limiter = HostLimiter(2)
+    slots = limiter.slots("https://Firefly.example/api/v1/transactions")
+    assert limiter.slots("https://firefly.example/api/v1/about") is slots
+    assert limiter.slots("https://other.example/") is not slots
+    assert slots.acquire(blocking=False) and slots.acquire(blocking=False)
+    assert not slots.acquire(blocking=False)
@@ -0,0 +1,180 @@
+"""Worker runs against the Allegro and Firefly III stand-in."""
+
+import dataclasses
+import gzip
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+
+import cassette
+import log_db
+import worker
+from benchmarks.standin import StandIn
+from profiles import Profile
+
+
+@pytest.fixture(name="standin")
+def fixture_standin(monkeypatch: pytest.MonkeyPatch) -> Iterator[StandIn]:
+    """Return a running stand-in with a synthetic account."""
+    # Synthetic orders are years old, keep all of them open
+    monkeypatch.setattr(worker, "OPEN_ORDER_LOOKBACK", timedelta(days=36500))
+    with StandIn.synthetic(200) as standin:
+        yield standin
+
+
+@pytest.fixture(name="profile")
+def fixture_profile(tmp_path: Path, standin: StandIn) -> Profile:
+    """Return a profile of the stand-in account."""
+    return Profile(
+        name="test",
+        tag="allegro",
+        description_filter="allegro",
+        allegro_cookie="cookie",
+        firefly_url=standin.url,
+        firefly_token="token",
+        allegro_api_url=standin.url,
+        db_file=str(tmp_path / "log.db"),
+        max_pages=100,
+        apply_rate_limit=0.0,
+    )
+
+
+@pytest.fixture(name="ctx")
+def fixture_ctx(profile: Profile) -> Iterator[worker.WorkerContext]:
+    """Return a worker context for the stand-in account, closed afterwards."""
+    ctx = worker.WorkerContext(profile)
+    try:
+        yield ctx
+    finally:
+        ctx.close()
+
+
+def unapplied(ctx: worker.WorkerContext) -> set[str]:
+    """Return ids of logged transactions left for review."""
+    rows = ctx.log_writer.conn.execute("SELECT tx_id FROM matched_tx WHERE applied = 0")
+    return {row[0] for row in rows}
+
+
+def test_pruned_transactions_are_evaluated_again(ctx: worker.WorkerContext) -> None:
+    """Transactions whose history was pruned are not skipped by the daemon."""
+    first = worker.run_once(ctx)
+    assert first.applied > 0 and unapplied(ctx)
+    # Applied transactions are tagged, the rest is skipped by checkpoint
+    second = worker.run_once(ctx)
+    assert second.transactions == second.unchanged > 0
+    # Age the history past the retention and let the next run prune it
+    old = (datetime.now() - timedelta(days=400)).isoformat()
+    with ctx.log_writer.conn as conn:
+        conn.execute("UPDATE matched_tx SET match_date = ?", (old,))
+        conn.execute("UPDATE match_attempt SET match_date = ?", (old,))
+        conn.execute("DELETE FROM worker_state WHERE key = 'last_prune'")
+    worker.run_once(ctx)
+    assert not unapplied(ctx)
+    # The same context evaluates and logs them again
+    fourth = worker.run_once(ctx)
+    assert fourth.transactions == second.transactions
+    assert fourth.unchanged == 0
+    assert len(unapplied(ctx)) == fourth.transactions
+
+
+def test_recorded_run_sends_every_request(
+    tmp_path: Path, standin: StandIn, profile: Profile
+) -> None:
+    """A warm response cache is bypassed while traffic is recorded."""
+    profile = dataclasses.replace(profile, allegro_cache=str(tmp_path / "cache.db"))
+    warm = worker.WorkerContext(profile)
+    try:
+        worker.run_once(warm)
+        assert warm.cache is not None and warm.cache.stats["stored"] > 0
+    finally:
+        warm.close()
+    requests_before = standin.requests
+    path = str(tmp_path / "run.jsonl.gz")
+    with cassette.use_cassette(path, cassette.RECORD) as tape:
+        ctx = worker.WorkerContext(profile)
+        try:
+            assert ctx.cache is None
+            worker.run_once(ctx)
+        finally:
+            ctx.close()
+    # Every request reached the server unconditionally and was recorded
+    assert tape.interactions == standin.requests - requests_before > 0
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        entries = [json.loads(line) for line in handle]
+    assert len(entries) == tape.interactions
+    assert all(
+        "If-None-Match" not in entry["request"]["headers"]
+        and entry["response"]["status"] != 304
+        for entry in entries
+    )
+    assert any("/myorder-api/" in entry["request"]["url"] for entry in entries)
+
+
+def test_unchanged_transactions_leave_log_untouched(ctx: worker.WorkerContext) -> None:
+    """A run skipping everything by checkpoint writes only its metrics."""
+    conn = ctx.log_writer.conn
+
+    def snapshot() -> tuple[int, list[tuple[int, int]]]:
+        counts = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM match_attempt), "
+            "(SELECT SUM(attempts) FROM matched_tx)"
+        ).fetchall()
+        return log_db.get_log_version(conn), counts
+
+    worker.run_once(ctx)
+    before = snapshot()
+    runs = conn.execute("SELECT COUNT(DISTINCT run_started_at) FROM run_metric")
+    assert runs.fetchone() == (1,)
+    second = worker.run_once(ctx)
+    assert second.transactions == second.unchanged > 0
+    assert snapshot() == before
+    runs = conn.execute("SELECT COUNT(DISTINCT run_started_at) FROM run_metric")
+    assert runs.fetchone() == (2,)
+
+
+def test_replay_repeats_recorded_run_on_scratch_db(
+    tmp_path: Path, profile: Profile
+) -> None:
+    """A replay starts from the recorded database and leaves the real one alone."""
+    path = str(tmp_path / "run.jsonl.gz")
+    with cassette.use_cassette(path, cassette.RECORD):
+        ctx = worker.WorkerContext(profile)
+        try:
+            recorded = worker.run_once(ctx)
+        finally:
+            ctx.close()
+    assert recorded.applied > 0
+    conn = log_db.connect(profile.db_file)
+    state = conn.execute("SELECT * FROM matched_tx ORDER BY tx_id").fetchall()
+    with cassette.use_cassette(path, cassette.REPLAY) as tape:
+        assert cassette.now() == tape.recorded_at
+        ctx = worker.WorkerContext(profile, replay=True)
+        scratch = ctx.profile.db_file
+        try:
+            assert scratch != profile.db_file
+            replayed = worker.run_once(ctx)
+        finally:
+            ctx.close()
+    assert replayed == dataclasses.replace(recorded, duration=replayed.duration)
+    assert conn.execute("SELECT * FROM matched_tx ORDER BY tx_id").fetchall() == state
+    conn.close()
+    assert not Path(scratch).exists()
+
+
+def test_firefly_pages_use_the_context_session(
+    ctx: worker.WorkerContext, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Transaction pages go through the session closed with the context."""
+    urls: list[str] = []
+    send = ctx.firefly_session.send
+
+    def record(request: Any, **kwargs: Any) -> Any:
+        urls.append(request.url)
+        return send(request, **kwargs)
+
+    monkeypatch.setattr(ctx.firefly_session, "send", record)
+    worker.run_once(ctx)
+    assert any("/api/v1/transactions?" in url for url in urls)
@@ -0,0 +1,56 @@
+"""Thread-safe rate limiting helpers for outgoing API calls."""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """Token bucket allowing ``rate`` calls per second with bursts of ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        """Create a full bucket refilled at ``rate`` tokens per second."""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Take ``tokens``, blocking until the bucket has refilled enough.
+
+        Callers reserve tokens in arrival order, letting the bucket go into
+        debt, and sleep once for their share of it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+class HostLimiter:  # pylint: disable=too-few-public-methods
+    """Per-host semaphores limiting concurrent calls across many clients."""
+
+    def __init__(self, limit: int) -> None:
+        """Allow at most ``limit`` concurrent calls to each host."""
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.limit = limit
+        self._slots: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def slots(self, url: str) -> threading.BoundedSemaphore:
+        """Return the semaphore shared by all calls to the host of ``url``."""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.limit)
+            return self._slots[host]
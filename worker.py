@@ -1,21 +1,51 @@
 """Background worker for matching Allegro payments to Firefly III transactions."""
 
+import argparse
+import contextvars
 import os
+import random
+import signal
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, replace
+from datetime import date, datetime, time, timedelta, timezone
+from time import perf_counter
+from types import FrameType
+from typing import Iterator
 
 import requests  # type: ignore[import-untyped]
 from dotenv import load_dotenv
 from fireflyiii_enricher_core.firefly_client import FireflyClient
 from loguru import logger
 
+import analytics
+import cassette
 import log_db
-from allegro_api.api import AllegroApiClient
+from allegro_api.api import AllegroApiClient, RequestTrace, RetryPolicy
+from allegro_api.cache import ResponseCache
+from allegro_api.const import MATCH_WINDOW_DAYS
 from allegro_api.get_order_result import SimplifiedPayment
-from processor_gui import TransactionProcessorGUI, TxMatchResult, match_transactions
+from matching import match_fingerprint
+from metrics import RunMetrics, StageTimer
+from order_store import OrderStore
+from processor_gui import (
+    TransactionProcessorGUI,
+    TxMatchResult,
+    match_combined_payments,
+    match_transactions,
+    resolve_matches,
+    use_batch_matching,
+)
+from profiles import Profile, load_profiles
+from throttle import HostLimiter
 
 # ---------------------------------------------------
 # Configure logging with Loguru
 # ---------------------------------------------------
 logger.remove()
+logger.configure(extra={"profile": "default"})
 logger.add(
     sink="worker.log",
     level="DEBUG",
@@ -25,6 +55,7 @@ logger.add(
     format=(
         "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
         "<level>{level: <8}</level> | "
+        "<magenta>{extra[profile]}</magenta> | "
         "<cyan>{module}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
         "<level>{message}</level>"
     ),
@@ -32,81 +63,699 @@ logger.add(
 logger.add(
     sink=lambda msg: print(msg, end=""),
     level="INFO",
-    format="{time:HH:mm:ss} | {level} | {message}",
+    format="{time:HH:mm:ss} | {level} | {extra[profile]} | {message}",
 )
 # ---------------------------------------------------
 # Environment and constants
 # ---------------------------------------------------
 load_dotenv()
 
-TAG = os.environ["TAG"]
-DESCRIPTION_FILTER = os.environ['DESCRIPTION_FILTER']
-ALLEGRO_COOKIE = os.environ["QXLSESSID"]
-FIREFLY_URL = os.environ["FIREFLY_URL"]
-FIREFLY_TOKEN = os.environ["FIREFLY_TOKEN"]
+# Concurrent Firefly III requests per host, shared by all profiles
+FIREFLY_HOST_CONCURRENCY = int(os.environ.get("FIREFLY_HOST_CONCURRENCY", "8"))
+
+# Stored orders re-fetched on every run to pick up late status changes
+ORDER_REFRESH_OVERLAP = timedelta(days=1)
+
+# Orders still unapplied after this long are no longer expected to be charged
+OPEN_ORDER_LOOKBACK = timedelta(
+    days=int(os.environ.get("OPEN_ORDER_LOOKBACK_DAYS", "90"))
+)
+
+# Minimum time between two log retention runs of a profile
+PRUNE_INTERVAL = timedelta(days=1)
+
+# Replayed responses are retried immediately
+REPLAY_RETRY = RetryPolicy(max_backoff=0.0, honor_retry_after=False)
+
+# Transaction, payment resolved for it, if any, and its match fingerprint
+PendingMatch = tuple[TxMatchResult, SimplifiedPayment | None, str]
 
 
 # ---------------------------------------------------
 # Main workflow
 # ---------------------------------------------------
-def main() -> None:
-    """Entry point for the worker script."""
+
+
+def orders_since(transactions: list[TxMatchResult]) -> datetime | None:
+    """Return the oldest order date that may still match ``transactions``."""
+    if not transactions:
+        return None
+    oldest = min(txr.tx.date for txr in transactions)
+    return datetime.combine(
+        oldest - timedelta(days=MATCH_WINDOW_DAYS), time.min, tzinfo=timezone.utc
+    )
+
+
+def firefly_start(store: OrderStore) -> date | None:
+    """Return the earliest booking date of transactions that can still match.
+
+    Only orders not applied yet can match, and orders older than
+    ``OPEN_ORDER_LOOKBACK`` are given up on. Orders arriving in the concurrent
+    fetch are at most ``ORDER_REFRESH_OVERLAP`` older than the newest stored.
+    """
+    newest = store.newest_order_date()
+    if newest is None:
+        return None
+    oldest_open = store.oldest_open_order_date(cassette.now() - OPEN_ORDER_LOOKBACK)
+    start = newest - ORDER_REFRESH_OVERLAP
+    if oldest_open is not None:
+        start = min(start, oldest_open)
+    return start.date()
+
+
+@contextmanager
+def stage(metrics: RunMetrics, name: str) -> Iterator[StageTimer]:
+    """Record and log start, end and wall-clock duration of a pipeline stage."""
+    started = perf_counter()
+    logger.debug(f"Stage {name} started")
+    try:
+        with metrics.stage(name) as timer:
+            yield timer
+    finally:
+        logger.info(f"Stage {name} took {perf_counter() - started:.2f}s")
+
+
+def fetch_firefly_stage(
+    metrics: RunMetrics,
+    processor: TransactionProcessorGUI,
+    description_filter: str,
+    start: date | None,
+) -> list[TxMatchResult]:
+    """Fetch unmatched transactions from Firefly III booked since ``start``."""
+    with stage(metrics, "fetch_unmatched_transactions") as timer:
+        logger.info(f"Fetching transactions from Firefly III (since {start})")
+        transactions = processor.fetch_unmatched_transactions(
+            description_filter, exact_match=False, start=start
+        )
+        timer.items = len(transactions)
+    logger.debug(f"Fetched {len(transactions)} transactions from Firefly III")
+    return transactions
+
+
+def fetch_allegro_stage(
+    metrics: RunMetrics, store: OrderStore, allegro: AllegroApiClient, max_pages: int
+) -> int:
+    """Fetch Allegro orders newer than the local store and upsert them."""
+    with stage(metrics, "get_orders") as timer:
+        newest = store.newest_order_date()
+        since = None if newest is None else newest - ORDER_REFRESH_OVERLAP
+        logger.info(f"Fetching orders from Allegro (since {since})")
+        stored = store.upsert_orders(
+            allegro.iter_orders(since=since, max_pages=max_pages)
+        )
+        timer.items = stored
+    logger.info(f"Stored {stored} new or updated orders from Allegro")
+    return stored
+
+
+@dataclass
+class RunSummary:  # pylint: disable=too-many-instance-attributes
+    """Outcome of one reconciliation run of a profile."""
+
+    profile: str
+    transactions: int = 0
+    matched: int = 0
+    applied: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    duration: float = 0.0
+    error: str | None = None
+
+
+def replay_profile(profile: Profile, scratch_dir: str) -> Profile:
+    """Return ``profile`` writing only to a scratch log database in ``scratch_dir``.
+
+    The scratch database starts as a copy of the snapshot saved with the
+    replayed cassette, or of the profile's database if there is none. The
+    Parquet export and the metrics textfile are not written.
+    """
+    tape = cassette.active_cassette()
+    snapshot = "" if tape is None else tape.snapshot_path(profile.name)
+    db_file = os.path.join(scratch_dir, "log.db")
+    log_db.copy_db(snapshot if os.path.exists(snapshot) else profile.db_file, db_file)
+    return replace(profile, db_file=db_file, export_dir="", metrics_textfile="")
+
+
+class WorkerContext:  # pylint: disable=too-many-instance-attributes
+    """Clients, connections and caches shared by consecutive runs of a profile."""
+
+    def __init__(
+        self,
+        profile: Profile,
+        replay: bool = False,
+        host_limiter: HostLimiter | None = None,
+    ) -> None:
+        """Open the log database, HTTP sessions and API clients of ``profile``.
+
+        With ``replay`` set, retries and Firefly III writes are not delayed
+        and the log database is a scratch copy, see :func:`replay_profile`.
+        Recording saves a snapshot of the log database next to the cassette.
+        Firefly III requests hold a slot of ``host_limiter`` if given. The
+        Allegro response cache is not used while a cassette is active.
+        """
+        tape = cassette.active_cassette()
+        # Removed by close() together with the other resources of the context
+        self.scratch = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+            if replay
+            else None
+        )
+        if self.scratch is not None:
+            profile = replay_profile(profile, self.scratch.name)
+        self.profile = profile
+        logger.info(f"Initializing Log_db ({profile.db_file})")
+        self.log_writer = log_db.LogWriter(db_file=profile.db_file)
+        log_db.init_db(self.log_writer.conn)
+        self.store = OrderStore(self.log_writer.conn)
+        self.store.init()
+        if tape is not None and tape.mode == cassette.RECORD:
+            log_db.copy_db(profile.db_file, tape.snapshot_path(profile.name))
+        self.checkpoints = log_db.load_checkpoints(self.log_writer.conn)
+        self.applied_payments = log_db.load_applied_payments(self.log_writer.conn)
+        self.metrics = RunMetrics()
+        retry = REPLAY_RETRY if replay else None
+        self.apply_rate_limit = None if replay else profile.apply_rate_limit
+
+        self.session = requests.Session()
+        # A cassette must hold every response: recorded runs fetch them all,
+        # replayed runs see the recorded ones instead of cached ones
+        self.cache = (
+            ResponseCache(profile.allegro_cache)
+            if profile.allegro_cache and tape is None
+            else None
+        )
+        self.allegro = AllegroApiClient(
+            profile.allegro_cookie,
+            self.session,
+            retry=retry,
+            observer=self.observe_request,
+            base_url=profile.allegro_api_url,
+            cache=self.cache,
+        )
+
+        # Initialize Firefly III client
+        logger.info("Initializing FireflyClient")
+        self.firefly_session = requests.Session()
+        self.processor = TransactionProcessorGUI(
+            FireflyClient(profile.firefly_url, profile.firefly_token),
+            profile.tag,
+            http_observer=self.observe_request,
+            retry=retry,
+            host_slots=(
+                None
+                if host_limiter is None
+                else host_limiter.slots(profile.firefly_url)
+            ),
+            session=self.firefly_session,
+        )
+
+    def observe_request(self, trace: RequestTrace) -> None:
+        """Forward an HTTP trace to the metrics of the current run."""
+        self.metrics.observe_request(trace)
+
+    def close(self) -> None:
+        """Flush pending log rows and release connections."""
+        self.log_writer.close()
+        self.session.close()
+        self.firefly_session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.scratch is not None:
+            self.scratch.cleanup()
+
+
+def run_once(ctx: WorkerContext) -> RunSummary:
+    """Fetch, match, apply and log a single reconciliation run."""
     logger.info("===== Worker started =====")
+    started = perf_counter()
+    ctx.metrics = RunMetrics()
 
-    logger.info("Initializing Log_db")
-    log_db.init_db()
+    transactions = fetch_stages(ctx)
+    logger.info(f"Fetch stages finished after {perf_counter() - started:.2f}s")
+    payments = load_payments_stage(ctx, transactions)
+    matched = match_stage(ctx, transactions, payments)
+    pending = resolve_stage(ctx, matched)
+    errors = apply_stage(ctx, pending)
+    applied = log_stage(ctx, pending, errors)
+    export_stage(ctx)
+    prune_stage(ctx)
+
+    # Summary
+    unchanged = len(matched) - len(pending)
+    logger.info(f"Skipped {unchanged} transactions unchanged since the last run")
+    logger.info(f"Automatically applied to {applied} transactions")
+    if ctx.cache is not None:
+        stats = ", ".join(
+            f"{key}={value}" for key, value in sorted(ctx.cache.stats.items())
+        )
+        logger.info(f"Allegro response cache since start: {stats or 'unused'}")
+    logger.info(f"Worker run took {perf_counter() - started:.2f}s")
+    export_metrics(ctx)
+    logger.info("===== Worker finished =====")
+    return RunSummary(
+        profile=ctx.profile.name,
+        transactions=len(matched),
+        matched=sum(1 for txr in matched if txr.matches),
+        applied=applied,
+        unchanged=unchanged,
+        failed=sum(1 for error in errors.values() if error is not None),
+        duration=perf_counter() - started,
+    )
 
-    # Initialize Firefly III client
-    logger.info("Initializing FireflyClient")
-    ff = FireflyClient(FIREFLY_URL, FIREFLY_TOKEN)
 
-    # Fetch Firefly III transactions
-    logger.info("Fetching transactions from Firefly III")
-    processor = TransactionProcessorGUI(ff, TAG)
-    transactions = processor.fetch_unmatched_transactions(
-        DESCRIPTION_FILTER, exact_match=False
+def fetch_stages(ctx: WorkerContext) -> list[TxMatchResult]:
+    """Fetch Firefly III transactions and new Allegro orders concurrently.
+
+    Only transactions booked after the oldest open order can match; the
+    window stays open-ended because newer orders arrive in the concurrent
+    fetch. An empty order store is filled first to bound the window.
+    """
+    profile, metrics, store = ctx.profile, ctx.metrics, ctx.store
+    store_was_empty = store.newest_order_date() is None
+    if store_was_empty:
+        logger.info("Order store is empty, fetching Allegro orders first")
+        fetch_allegro_stage(metrics, store, ctx.allegro, profile.max_pages)
+    start = firefly_start(store)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # Stages run in a copy of the context to keep the profile log field
+        firefly_future = executor.submit(
+            contextvars.copy_context().run,
+            fetch_firefly_stage,
+            metrics,
+            ctx.processor,
+            profile.description_filter,
+            start,
+        )
+        allegro_future = (
+            None
+            if store_was_empty
+            else executor.submit(
+                contextvars.copy_context().run,
+                fetch_allegro_stage,
+                metrics,
+                store,
+                ctx.allegro,
+                profile.max_pages,
+            )
+        )
+        transactions = firefly_future.result()
+        if allegro_future is not None:
+            allegro_future.result()
+    return transactions
+
+
+def load_payments_stage(
+    ctx: WorkerContext, transactions: list[TxMatchResult]
+) -> list[SimplifiedPayment]:
+    """Load stored payments that may still match ``transactions``.
+
+    Payments applied in earlier runs cannot match another transaction.
+    """
+    with stage(ctx.metrics, "from_payments") as timer:
+        payments = [
+            payment
+            for payment in SimplifiedPayment.from_payments(
+                ctx.store.load_payments(orders_since(transactions))
+            )
+            if payment.payment_id not in ctx.applied_payments
+        ]
+        timer.items = len(payments)
+    logger.info(f"Loaded {len(payments)} orders/payments from the local store")
+    return payments
+
+
+def match_stage(
+    ctx: WorkerContext,
+    transactions: list[TxMatchResult],
+    payments: list[SimplifiedPayment],
+) -> list[TxMatchResult]:
+    """Match transactions to single payments, then to payments charged together."""
+    metrics = ctx.metrics
+    batch = use_batch_matching(transactions)
+    logger.info(
+        f"Matching transactions with payments ({'batch' if batch else 'indexed'})"
     )
-    logger.debug(f"Fetched {len(transactions)} transactions from Firefly III")
+    with stage(metrics, "match_transactions") as timer:
+        matched = match_transactions(transactions, payments, batch=batch)
+        timer.items = len(matched)
+    with stage(metrics, "match_combined") as timer:
+        timer.items = match_combined_payments(matched, payments)
+    logger.info(f"Matched {timer.items} transactions to combined payments")
+    metrics.observe_matches([len(txr.matches) for txr in matched])
+    return matched
 
-    # Fetch Allegro payments
-    logger.info("Fetching payments from Allegro")
-    with requests.Session() as session:
-        allegro = AllegroApiClient(ALLEGRO_COOKIE, session)
-        orders_data = allegro.get_orders()
-    payments = SimplifiedPayment.from_payments(orders_data.payments)
-    logger.info(f"Fetched {len(payments)} orders/payments from Allegro")
-
-    # Match transactions
-    logger.info("Matching transactions with payments")
-    matched: list[TxMatchResult] = match_transactions(transactions, payments)
-
-    # Apply matches and log results
-    auto_applied = 0
-    for txr in matched:
+
+def resolve_stage(
+    ctx: WorkerContext, matched: list[TxMatchResult]
+) -> list[PendingMatch]:
+    """Resolve ambiguous matches and return transactions changed since last run.
+
+    Unforced pairs, found by date preference or as combined payments, are
+    resolved only when the profile enables ``auto_apply_closest``.
+    Transactions evaluated with the same fingerprint before are skipped.
+    """
+    closest = ctx.profile.auto_apply_closest
+    with stage(ctx.metrics, "resolve_matches") as timer:
+        resolutions = resolve_matches(matched, prefer_closest=closest)
+        timer.items = sum(
+            1
+            for txr, resolution in zip(matched, resolutions)
+            if resolution is not None and len(txr.matches) > 1
+        )
+    logger.info(f"Resolved {timer.items} ambiguous transactions")
+    pending: list[PendingMatch] = []
+    for txr, resolution in zip(matched, resolutions):
+        resolved = (
+            resolution.payment
+            if resolution is not None and (resolution.forced or closest)
+            else None
+        )
+        fingerprint = match_fingerprint(txr.tx, txr.matches, resolved)
+        if ctx.checkpoints.get(str(txr.tx.id)) != fingerprint:
+            pending.append((txr, resolved, fingerprint))
+    return pending
+
+
+def apply_stage(
+    ctx: WorkerContext, pending: list[PendingMatch]
+) -> dict[int, Exception | None]:
+    """Apply resolved matches in Firefly III and return the error of each."""
+    metrics = ctx.metrics
+    to_apply = [
+        (int(txr.tx.id), resolved.details)
+        for txr, resolved, _ in pending
+        if resolved is not None
+    ]
+    logger.info(f"Applying {len(to_apply)} matches")
+    with stage(metrics, "apply_matches") as timer:
+        errors = ctx.processor.apply_matches(
+            to_apply,
+            max_workers=ctx.profile.apply_concurrency,
+            rate_limit=ctx.apply_rate_limit,
+            on_result=lambda _tx_id, seconds, _error: metrics.observe(
+                "apply_match", seconds, 1
+            ),
+        )
+        timer.items = len(to_apply)
+    return errors
+
+
+def log_stage(
+    ctx: WorkerContext,
+    pending: list[PendingMatch],
+    errors: dict[int, Exception | None],
+) -> int:
+    """Log and checkpoint evaluated transactions and return the applied count.
+
+    Failed applies are not checkpointed, so the next run retries them.
+    """
+    log_writer = ctx.log_writer
+    applied_count = 0
+    for txr, resolved, fingerprint in pending:
         applied = False
         logger.info(
             f"Processing transaction ID {txr.tx.id} - matches: {len(txr.matches)} "
         )
-        if len(txr.matches) == 1:
-            try:
-                logger.info(f"Applying match for transaction ID {txr.tx.id}")
-                processor.apply_match(int(txr.tx.id), txr.matches[0].details)
+        if resolved is not None:
+            error = errors[int(txr.tx.id)]
+            if error is None:
                 applied = True
-                auto_applied += 1
+                applied_count += 1
                 logger.success(f"Transaction {txr.tx.id} processed successfully")
-            except RuntimeError as e:
-                logger.error(f"Failed to processed transaction {txr.tx.id}: {e}")
-                applied = False
+            else:
+                logger.error(f"Failed to processed transaction {txr.tx.id}: {error}")
         else:
             logger.info("Conditions not met skipping")
 
-        details_list = [m.details for m in txr.matches]
-        log_db.log_matched_transaction(txr, len(txr.matches), applied, details_list)
+        details_list = (
+            [resolved.details]
+            if resolved is not None
+            else [m.details for m in txr.matches]
+        )
+        log_writer.add(txr, len(txr.matches), applied, details_list)
+        if applied and resolved is not None:
+            for payment_id in filter(None, resolved.payment_ids):
+                log_writer.consume(payment_id, txr.tx.id)
+                ctx.applied_payments.add(payment_id)
+        if applied or resolved is None:
+            log_writer.checkpoint(txr.tx.id, fingerprint)
+            ctx.checkpoints[str(txr.tx.id)] = fingerprint
+    with stage(ctx.metrics, "log_db_write") as timer:
+        timer.items = log_writer.flush()
+        logger.debug(f"Wrote {timer.items} log rows")
+    return applied_count
 
-        # Summary
-    logger.info(f"Automatically applied to {auto_applied} transactions")
-    logger.info("===== Worker finished =====")
+
+def export_stage(ctx: WorkerContext) -> None:
+    """Append new log rows and orders to the Parquet export, if configured."""
+    directory = ctx.profile.export_dir
+    if not directory:
+        return
+    with stage(ctx.metrics, "export_parquet") as timer:
+        written = analytics.export_history(ctx.log_writer.conn, directory)
+        timer.items = sum(written.values())
+    logger.info(
+        f"Exported {written[analytics.MATCHES]} match attempts and "
+        f"{written[analytics.ORDERS]} orders to {directory}"
+    )
+
+
+def prune_stage(ctx: WorkerContext) -> None:
+    """Apply the log retention of the profile at most once per interval."""
+    days = ctx.profile.log_retention_days
+    conn = ctx.log_writer.conn
+    last = log_db.get_state(conn, "last_prune")
+    if days <= 0 or (
+        last is not None
+        and datetime.fromisoformat(last) > datetime.now() - PRUNE_INTERVAL
+    ):
+        return
+    with stage(ctx.metrics, "prune_log") as timer:
+        deleted = log_db.prune_log(conn, days)
+        timer.items = sum(deleted.values())
+    if deleted["tx_checkpoint"]:
+        # Pruned transactions are evaluated again by later runs of the context
+        ctx.checkpoints = log_db.load_checkpoints(conn)
+    logger.info(
+        f"Pruned log rows older than {days} days: "
+        + ", ".join(f"{key}={value}" for key, value in deleted.items())
+    )
+
+
+def export_metrics(ctx: WorkerContext) -> None:
+    """Persist run metrics and write the Prometheus textfile if configured."""
+    metrics = ctx.metrics
+    metrics.finish()
+    log_db.log_run_metrics(
+        ctx.log_writer.conn, metrics.started_at.isoformat(), metrics.samples()
+    )
+    textfile = ctx.profile.metrics_textfile
+    if textfile:
+        metrics.write_textfile(textfile)
+        logger.debug(f"Wrote metrics to {textfile}")
+
+
+def open_contexts(profiles: list[Profile], replay: bool = False) -> list[WorkerContext]:
+    """Open a context per profile sharing one Firefly III host limiter."""
+    host_limiter = HostLimiter(FIREFLY_HOST_CONCURRENCY)
+    contexts: list[WorkerContext] = []
+    try:
+        for profile in profiles:
+            with logger.contextualize(profile=profile.name):
+                contexts.append(WorkerContext(profile, replay, host_limiter))
+    except BaseException:
+        for ctx in contexts:
+            ctx.close()
+        raise
+    return contexts
+
+
+def run_profile(ctx: WorkerContext) -> RunSummary:
+    """Run ``ctx`` once, logging and returning a failure instead of raising."""
+    with logger.contextualize(profile=ctx.profile.name):
+        started = perf_counter()
+        try:
+            return run_once(ctx)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logger.exception(f"Worker run failed: {exc}")
+            return RunSummary(
+                profile=ctx.profile.name,
+                duration=perf_counter() - started,
+                error=str(exc) or type(exc).__name__,
+            )
+
+
+def run_profiles(
+    contexts: list[WorkerContext], max_workers: int | None = None
+) -> list[RunSummary]:
+    """Run all profiles concurrently and log a combined summary.
+
+    Profiles spend most of a run waiting on HTTP, so threads are enough to
+    overlap them; each keeps its own session and log database.
+    """
+    started = perf_counter()
+    if len(contexts) == 1:
+        summaries = [run_profile(contexts[0])]
+    else:
+        with ThreadPoolExecutor(
+            max_workers=max_workers or len(contexts),
+            thread_name_prefix="profile",
+        ) as executor:
+            summaries = list(executor.map(run_profile, contexts))
+    log_summary(summaries, perf_counter() - started)
+    return summaries
+
+
+def log_summary(summaries: list[RunSummary], elapsed: float) -> None:
+    """Log per-profile results and their totals."""
+    if len(summaries) < 2:
+        return
+    with logger.contextualize(profile="all"):
+        _log_summary(summaries, elapsed)
+
+
+def _log_summary(summaries: list[RunSummary], elapsed: float) -> None:
+    """Log the summary lines of :func:`log_summary`."""
+    logger.info("===== Summary =====")
+    for summary in summaries:
+        if summary.error is not None:
+            logger.error(f"{summary.profile}: failed - {summary.error}")
+            continue
+        logger.info(
+            f"{summary.profile}: {summary.transactions} transactions, "
+            f"{summary.matched} matched, {summary.applied} applied, "
+            f"{summary.failed} failed, {summary.unchanged} unchanged "
+            f"in {summary.duration:.2f}s"
+        )
+    failed_profiles = sum(1 for summary in summaries if summary.error is not None)
+    logger.info(
+        f"Total: {len(summaries)} profiles ({failed_profiles} failed), "
+        f"{sum(s.transactions for s in summaries)} transactions, "
+        f"{sum(s.applied for s in summaries)} applied in {elapsed:.2f}s "
+        f"(sequential {sum(s.duration for s in summaries):.2f}s)"
+    )
+
+
+def main(
+    profiles: list[Profile] | None = None,
+    replay: bool = False,
+    max_workers: int | None = None,
+) -> None:
+    """Entry point for the worker script.
+
+    Without ``profiles`` a single profile is read from the environment.
+    Exits with status 1 if any profile failed.
+    """
+    contexts = open_contexts(profiles or [Profile.from_env()], replay)
+    try:
+        summaries = run_profiles(contexts, max_workers)
+    finally:
+        for ctx in contexts:
+            ctx.close()
+    if any(summary.error is not None for summary in summaries):
+        raise SystemExit(1)
+
+
+def daemon(
+    interval: float,
+    jitter: float,
+    replay: bool = False,
+    profiles: list[Profile] | None = None,
+    max_workers: int | None = None,
+) -> None:
+    """Run the worker every ``interval`` seconds until SIGTERM or SIGINT."""
+    stop = threading.Event()
+
+    def request_stop(signum: int, _frame: FrameType | None) -> None:
+        logger.info(f"Received {signal.Signals(signum).name}, shutting down")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    logger.info(f"Daemon started (interval {interval:.0f}s, jitter {jitter:.0f}s)")
+    contexts = open_contexts(profiles or [Profile.from_env()], replay)
+    try:
+        while not stop.is_set():
+            tick_started = perf_counter()
+            run_profiles(contexts, max_workers)
+            elapsed = perf_counter() - tick_started
+            delay = max(0.0, interval - elapsed) + random.uniform(0, jitter)
+            logger.info(f"Tick took {elapsed:.2f}s, next run in {delay:.0f}s")
+            stop.wait(delay)
+    finally:
+        for ctx in contexts:
+            ctx.close()
+        logger.info("Daemon stopped")
+
+
+def run(argv: list[str] | None = None) -> None:
+    """Parse command line arguments and run once or as a daemon."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--daemon", action="store_true", help="keep running on an interval"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=float(os.environ.get("WORKER_INTERVAL", "3600")),
+        help="seconds between daemon runs",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=float(os.environ.get("WORKER_JITTER", "60")),
+        help="maximum random delay added to each interval",
+    )
+    parser.add_argument(
+        "--config",
+        default=os.environ.get("WORKER_CONFIG"),
+        help="TOML file with account profiles (default: single profile from env)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        help="run only the named profile of --config (repeatable)",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="profiles reconciled concurrently (default: all)",
+    )
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument(
+        "--record", metavar="CASSETTE", help="save sanitised HTTP traffic to a file"
+    )
+    recording.add_argument(
+        "--replay", metavar="CASSETTE", help="answer HTTP requests from a file"
+    )
+    args = parser.parse_args(argv)
+    profiles = None
+    if args.config:
+        profiles = load_profiles(args.config)
+        if args.profile:
+            unknown = set(args.profile) - {profile.name for profile in profiles}
+            if unknown:
+                parser.error(f"unknown profiles: {', '.join(sorted(unknown))}")
+            profiles = [p for p in profiles if p.name in args.profile]
+    elif args.profile:
+        parser.error("--profile requires --config")
+    replay = args.replay is not None
+    tape = (
+        cassette.use_cassette(args.replay, cassette.REPLAY)
+        if replay
+        else (
+            cassette.use_cassette(args.record, cassette.RECORD)
+            if args.record
+            else nullcontext()
+        )
+    )
+    with tape:
+        if args.daemon:
+            daemon(args.interval, args.jitter, replay, profiles, args.max_workers)
+        else:
+            main(profiles, replay, args.max_workers)
 
 
 if __name__ == "__main__":
-    main()
+    run()